@@ -1,4 +1,12 @@
-from typing import Dict, Any, Tuple, Optional
+from typing import Dict, Any, Tuple, Optional, Callable, Iterable, List
+import copy
+import itertools
+import json
+import os
+import queue
+import threading
+from collections import OrderedDict
+from multiprocessing import Pool
 import chess
 import traceback
 
@@ -14,6 +22,7 @@ except ImportError:
             move = random.choice(list(board.legal_moves)) if list(board.legal_moves) else None
             return move, {"info": "fallback_random"}
 
+from .batching import BatchInferenceQueue
 from .minimax.minimax_agent import (
     MinimaxAgent,
     # Import các factory functions nếu có trong file minimax_agent.py
@@ -25,6 +34,35 @@ from .minimax.minimax_agent import (
 # 1. FACTORY TẠO AGENT
 # ============================================================
 
+def _thread_budget(agent_spec: Dict[str, Any]) -> Optional[int]:
+    """
+    Đọc cấu hình thread của agent_spec (chỉ với agent dùng torch):
+    - "threads": số thread intra-op cho riêng agent này (trả về để truyền vào agent)
+    - "interop_threads", "cpu_affinity": cấp process, áp dụng ngay (xem ai/ml/threads.py);
+      biến môi trường CHESS_AI_* được áp dụng trước nên luôn thắng với interop threads
+    """
+    if "interop_threads" in agent_spec or "cpu_affinity" in agent_spec:
+        from .ml.threads import configure_from_env, configure_process
+
+        configure_from_env()
+        configure_process(
+            interop_threads=agent_spec.get("interop_threads"),
+            cpu_affinity=agent_spec.get("cpu_affinity"),
+        )
+    return agent_spec.get("threads")
+
+
+def model_files_available(agent_spec: Dict[str, Any]) -> bool:
+    """
+    agent_spec chỉ định model riêng ("model_path", VD tier student) có file model trên đĩa không
+    (checkpoint hoặc bản int8). Không có "model_path" -> True (model mặc định tự fallback).
+    """
+    if "model_path" not in agent_spec:
+        return True
+    paths = [agent_spec["model_path"], agent_spec.get("quantized_path")]
+    return any(path and os.path.exists(path) for path in paths)
+
+
 def _create_agent(agent_spec: Dict[str, Any]):
     """
     Tạo đối tượng Agent dựa trên dictionary cấu hình.
@@ -32,6 +70,10 @@ def _create_agent(agent_spec: Dict[str, Any]):
     """
     agent_type = agent_spec.get("type", "random")
     level = agent_spec.get("level", "medium")
+
+    # Model chỉ định rõ mà thiếu file: báo lỗi thay vì âm thầm đánh ngẫu nhiên
+    if agent_type in ("transformer", "mcts") and not model_files_available(agent_spec):
+        raise FileNotFoundError(f"model file not found: {agent_spec['model_path']}")
     
     # --- RANDOM AGENT ---
     if agent_type == "random":
@@ -78,22 +120,116 @@ def _create_agent(agent_spec: Dict[str, Any]):
         # Time limit logic (nếu có class TimeLimited, ở đây dùng Minimax thường làm nền)
         # time_limit = agent_spec.get("time_limit_ms") 
         
+        # Eval bằng value head của ChessTransformer (lá được đánh giá theo batch)
+        eval_fn = None
+        if agent_spec.get("eval") == "neural":
+            from .ml.value_eval import NeuralEvaluator
+
+            eval_fn = NeuralEvaluator.from_paths(
+                agent_spec.get("model_path", "models/transformer_chess.pth"),
+                agent_spec.get("vocab_path", "models/vocab.pkl"),
+                threads=_thread_budget(agent_spec),
+            )
+        elif agent_spec.get("eval") == "nnue":
+            # NNUE NumPy (ai/minimax/nnue.py): đủ nhanh để gọi ở mọi lá alpha-beta
+            nnue_path = agent_spec.get("nnue_path", "models/nnue.npz")
+            if os.path.exists(nnue_path):
+                from .minimax.nnue import NNUEEvaluator
+
+                eval_fn = NNUEEvaluator.from_file(nnue_path)
+            else:
+                print(f"[API] Warning: NNUE weights '{nnue_path}' not found, using handcrafted eval.")
+
         # Tạo Agent
         # Lưu ý: constructor phải khớp với định nghĩa __init__ trong minimax_agent.py
         return MinimaxAgent(
             depth=depth,
             use_advanced_eval=use_advanced,
             use_quiescence=use_quiescence,
-            use_move_ordering=use_ordering
+            use_move_ordering=use_ordering,
+            eval_fn=eval_fn,
+            verbose=agent_spec.get("verbose", True),
         )
     if agent_type == "transformer":
+        model_path = agent_spec.get("model_path", "models/transformer_chess.pth")
+        vocab_path = agent_spec.get("vocab_path", "models/vocab.pkl")
+        quantized_path = agent_spec.get("quantized_path", "models/transformer_chess_int8.pt")
+        use_quantized = agent_spec.get("use_quantized", True)
+        threads = _thread_budget(agent_spec)
+
+        if agent_spec.get("batched"):
+            # Dùng chung model + hàng đợi gom batch với mọi agent cùng cấu hình
+            backend, queue = get_transformer_service(
+                model_path=model_path,
+                vocab_path=vocab_path,
+                quantized_path=quantized_path,
+                use_quantized=use_quantized,
+                max_batch=agent_spec.get("max_batch", 32),
+                max_wait_ms=agent_spec.get("max_wait_ms", 5.0),
+                threads=threads,
+            )
+            agent = copy.copy(backend)
+            agent.inference_queue = queue
+            return agent
+
         from .ml.agent import TransformerAgent   
         
+        return TransformerAgent(
+            model_path=model_path,
+            vocab_path=vocab_path,
+            quantized_path=quantized_path,
+            use_quantized=use_quantized,
+            threads=threads,
+        )
+
+    if agent_type == "mcts":
+        from .ml.mcts import MCTSAgent
+
         model_path = agent_spec.get("model_path", "models/transformer_chess.pth")
         vocab_path = agent_spec.get("vocab_path", "models/vocab.pkl")
-        
-        return TransformerAgent(model_path=model_path, vocab_path=vocab_path)
-            
+        quantized_path = agent_spec.get("quantized_path", "models/transformer_chess_int8.pt")
+        use_quantized = agent_spec.get("use_quantized", True)
+
+        # Budget theo level, override bằng "nodes" / "time_limit_ms"
+        nodes_by_level = {"easy": 100, "medium": 400, "hard": 1600, "expert": 4000, "master": 10000}
+        max_nodes = agent_spec.get("nodes", nodes_by_level.get(level, 400))
+
+        threads = _thread_budget(agent_spec)
+        net, queue = None, None
+        if agent_spec.get("batched"):
+            net, queue = get_transformer_service(
+                model_path=model_path,
+                vocab_path=vocab_path,
+                quantized_path=quantized_path,
+                use_quantized=use_quantized,
+                max_batch=agent_spec.get("max_batch", 32),
+                max_wait_ms=agent_spec.get("max_wait_ms", 5.0),
+                threads=threads,
+            )
+
+        # Mặc định value lấy từ value head (nếu checkpoint có); "material" = eval handcrafted
+        value_fn = None
+        if agent_spec.get("value") == "material":
+            from .ml.mcts import material_value
+            value_fn = material_value
+
+        return MCTSAgent(
+            model_path=model_path,
+            vocab_path=vocab_path,
+            quantized_path=quantized_path,
+            use_quantized=use_quantized,
+            max_nodes=max_nodes,
+            time_limit_ms=agent_spec.get("time_limit_ms"),
+            c_puct=agent_spec.get("c_puct", 1.5),
+            batch_size=agent_spec.get("batch_size", 16),
+            virtual_loss=agent_spec.get("virtual_loss", 1.0),
+            reuse_tree=agent_spec.get("reuse_tree", True),
+            value_fn=value_fn,
+            net=net,
+            inference_queue=queue,
+            threads=threads,
+        )
+
     # Fallback
     print(f"[API] Warning: Unknown type '{agent_type}', defaulting to Random.")
     return RandomAgent()
@@ -108,7 +244,20 @@ def choose_move_from_fen(fen: str, agent_spec: Dict[str, Any]) -> Dict[str, Any]
     Hàm chính được gọi bởi Game/Server.
     
     Flow: FEN String -> Board Object -> AI Calculate -> Result Dictionary
+
+    MCTS giữ cây tìm kiếm giữa các nước: agent được dùng lại theo agent_spec (get_cached_agent)
+    để subtree của nước trước được tái dùng và model chỉ load 1 lần; lock giữ cho 2 lời gọi
+    không chạy đồng thời trên cùng 1 cây.
     """
+    if agent_spec.get("type") == "mcts":
+        with _mcts_lock:
+            return _choose_move_with_agent(fen, agent_spec, get_cached_agent)
+    return _choose_move_with_agent(fen, agent_spec, _create_agent)
+
+
+def _choose_move_with_agent(
+    fen: str, agent_spec: Dict[str, Any], agent_factory: Callable[[Dict[str, Any]], Any]
+) -> Dict[str, Any]:
     try:
         # 1. Tạo bàn cờ từ FEN
         board = chess.Board(fen)
@@ -121,7 +270,7 @@ def choose_move_from_fen(fen: str, agent_spec: Dict[str, Any]) -> Dict[str, Any]
             }
 
         # 3. Khởi tạo AI Agent
-        agent = _create_agent(agent_spec)
+        agent = agent_factory(agent_spec)
         
         # 4. AI Tính toán (Phần debug in console sẽ chạy ở đây)
         move, info = agent.choose_move(board)
@@ -157,17 +306,165 @@ def choose_move_from_fen(fen: str, agent_spec: Dict[str, Any]) -> Dict[str, Any]
         return {"uci": None, "info": {"error": f"Internal Error: {str(e)}"}}
 
 
+# ============================================================
+# 2b. PHÂN TÍCH HÀNG LOẠT (PROCESS POOL)
+# ============================================================
+
+# Agent đã khởi tạo trong process hiện tại (worker pool / self-play), key = json agent_spec.
+# LRU tối đa MAX_CACHED_AGENTS: spec có thể đến từ client (server/bots.py), không để cache phình vô hạn
+MAX_CACHED_AGENTS = 16
+_cached_agents: "OrderedDict[str, Any]" = OrderedDict()
+_cached_agents_lock = threading.Lock()
+# choose_move_from_fen với agent MCTS dùng chung (xem docstring)
+_mcts_lock = threading.Lock()
+
+
+def get_cached_agent(agent_spec: Dict[str, Any]):
+    """
+    Agent dùng lại theo agent_spec trong process này (model chỉ load 1 lần).
+    Cache LRU: vượt MAX_CACHED_AGENTS thì bỏ agent lâu nhất không dùng.
+    """
+    key = json.dumps(agent_spec, sort_keys=True)
+    with _cached_agents_lock:
+        agent = _cached_agents.get(key)
+        if agent is not None:
+            _cached_agents.move_to_end(key)
+            return agent
+    # Tạo agent ngoài lock (load model có thể lâu); 2 thread cùng tạo thì giữ bản vào trước
+    agent = _create_agent(agent_spec)
+    with _cached_agents_lock:
+        agent = _cached_agents.setdefault(key, agent)
+        _cached_agents.move_to_end(key)
+        while len(_cached_agents) > MAX_CACHED_AGENTS:
+            _cached_agents.popitem(last=False)
+    return agent
+
+
+# Số chunk tối đa đang nằm trong pool cho mỗi worker (analyze_positions)
+ANALYSIS_INFLIGHT_PER_WORKER = 4
+
+
+def _init_analysis_worker() -> None:
+    # Nhiều process cùng chạy torch: mặc định 1 thread/process để không tranh core
+    os.environ.setdefault("CHESS_AI_THREADS", "1")
+
+
+def _analyze_one(job: Tuple[int, str, Dict[str, Any]]) -> Tuple[int, Dict[str, Any]]:
+    index, fen, agent_spec = job
+    result = _choose_move_with_agent(fen, agent_spec, get_cached_agent)
+    info = result.get("info") or {}
+    pv = info.get("pv") or ([result["uci"]] if result.get("uci") else [])
+    return index, {
+        "index": index,
+        "fen": fen,
+        "uci": result.get("uci"),
+        "score": info.get("score"),
+        "pv": pv,
+        "info": info,
+    }
+
+
+def _analyze_chunk(chunk: List[Tuple[int, str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    return [_analyze_one(job)[1] for job in chunk]
+
+
+def analyze_positions(
+    fens: Iterable[str],
+    agent_spec: Dict[str, Any],
+    workers: Optional[int] = None,
+    stream: bool = False,
+    chunksize: int = 4,
+):
+    """
+    Phân tích nhiều FEN song song bằng process pool; mỗi worker giữ agent "ấm"
+    (tạo 1 lần theo agent_spec, dùng cho mọi thế cờ của worker đó).
+
+    - stream=False: trả về list kết quả theo ĐÚNG thứ tự input.
+    - stream=True: generator yield từng kết quả ngay khi xong (thứ tự hoàn thành),
+      mỗi kết quả có "index" để ghép lại với input.
+    Mỗi kết quả: {"index", "fen", "uci", "score", "pv", "info"}.
+    `fens` được đọc dần (tối đa ANALYSIS_INFLIGHT_PER_WORKER * workers chunk trong pool)
+    nên generator hàng triệu FEN không bị nạp hết vào bộ nhớ.
+    """
+    # Minimax mặc định in log mỗi nước -> tắt khi chạy hàng loạt
+    spec = {"verbose": False, **agent_spec}
+    jobs = ((i, fen, spec) for i, fen in enumerate(fens))
+    workers = workers or os.cpu_count() or 1
+
+    def run():
+        if workers <= 1:
+            for job in jobs:
+                yield _analyze_one(job)[1]
+            return
+        # Backpressure: tối đa ANALYSIS_INFLIGHT_PER_WORKER chunk / worker trong pool, FEN chỉ
+        # được đọc từ `fens` khi có chunk xong (imap_unordered đọc cạn generator ngay từ đầu)
+        done: "queue.Queue" = queue.Queue()
+        limit = ANALYSIS_INFLIGHT_PER_WORKER * workers
+        with Pool(workers, initializer=_init_analysis_worker) as pool:
+            inflight, exhausted = 0, False
+            while True:
+                while not exhausted and inflight < limit:
+                    chunk = list(itertools.islice(jobs, chunksize))
+                    if not chunk:
+                        exhausted = True
+                        break
+                    pool.apply_async(_analyze_chunk, (chunk,), callback=done.put, error_callback=done.put)
+                    inflight += 1
+                if inflight == 0:
+                    return
+                results = done.get()
+                inflight -= 1
+                if isinstance(results, BaseException):
+                    raise results
+                yield from results
+
+    if stream:
+        return run()
+    results = list(run())
+    results.sort(key=lambda r: r["index"])
+    return results
+
+
 # ============================================================
 # 3. TIỆN ÍCH HỖ TRỢ UI
 # ============================================================
 
+def _load_distill_report(path: str = "models/distill_report.json") -> Dict[str, Any]:
+    """Bảng latency/accuracy do ai/ml/distill.py sinh ra (rỗng nếu chưa chạy distill)."""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
 def get_available_agents() -> Dict[str, Any]:
-    return {
+    """Danh sách agent cho UI / server; tier cần file model chưa có (VD student) bị ẩn."""
+    report = _load_distill_report()
+    agents = {
         "transformer": {
             "name": "Neural Net (Transformer)",
             "description": "AI học sâu",
             "config": {"type": "transformer"},
             "recommended": True,
+            "metrics": report.get("teacher", {}),
+        },
+        "transformer_fast": {
+            "name": "Neural Net Fast (Student)",
+            "description": "Transformer nhỏ (2 layer, distill từ model chính) cho tier casual, độ trễ thấp.",
+            "config": {
+                "type": "transformer",
+                "model_path": "models/transformer_student.pth",
+                "quantized_path": "models/transformer_student_int8.pt",
+            },
+            "metrics": report.get("student", {}),
+        },
+        "mcts": {
+            "name": "Neural MCTS (Transformer + PUCT)",
+            "description": "Tìm kiếm Monte-Carlo với prior từ Transformer, mạnh dần theo số node.",
+            "config": {"type": "mcts", "level": "medium"},
         },
 
         # === CLASSIC MINIMAX BOTS ===
@@ -195,16 +492,95 @@ def get_available_agents() -> Dict[str, Any]:
             "warning": "Check Console"
         },
     }
+    return {name: agent for name, agent in agents.items() if model_files_available(agent["config"])}
+
+# Mapping đơn giản từ string -> config (tên lạ -> "medium")
+DIFFICULTY_CONFIGS: Dict[str, Dict[str, Any]] = {
+    "easy": {"type": "minimax", "level": "easy"},
+    "medium": {"type": "minimax", "level": "medium"},
+    "hard": {"type": "minimax", "level": "hard"},
+    "transformer": {"type": "transformer"},
+    "neural": {"type": "transformer"},
+    "casual": {
+        "type": "transformer",
+        "model_path": "models/transformer_student.pth",
+        "quantized_path": "models/transformer_student_int8.pt",
+    },
+    "mcts": {"type": "mcts", "level": "medium"},
+    "debug": {"type": "minimax", "level": "hard", "use_advanced_eval": True}
+}
+
 
 def create_ai_for_difficulty(difficulty: str) -> Dict[str, Any]:
     """Mapping đơn giản từ string -> config"""
-    mapping = {
-        "easy": {"type": "minimax", "level": "easy"},
-        "medium": {"type": "minimax", "level": "medium"},
-        "hard": {"type": "minimax", "level": "hard"},
-        "transformer": {"type": "transformer"},
-        "neural": {"type": "transformer"},
-        "debug": {"type": "minimax", "level": "hard", "use_advanced_eval": True}
-        
-    }
-    return mapping.get(difficulty, mapping["medium"])
\ No newline at end of file
+    return dict(DIFFICULTY_CONFIGS.get(difficulty, DIFFICULTY_CONFIGS["medium"]))
+
+
+# ============================================================
+# 4. BATCHED INFERENCE SERVICE
+# ============================================================
+
+_batch_queues: Dict[str, BatchInferenceQueue] = {}
+_transformer_backends: Dict[str, Any] = {}
+_batch_queues_lock = threading.Lock()
+
+
+def get_batch_queue(
+    name: str,
+    batch_fn: Callable[[List[Any]], List[Any]],
+    max_batch: int = 32,
+    max_wait_ms: float = 5.0,
+) -> BatchInferenceQueue:
+    """
+    Lấy (hoặc tạo) hàng đợi gom batch dùng chung trong process.
+    Agent bất kỳ đăng ký batch_fn(items) -> results theo tên; lần gọi sau
+    cùng tên sẽ nhận lại đúng queue đó (batch_fn mới bị bỏ qua).
+    """
+    with _batch_queues_lock:
+        q = _batch_queues.get(name)
+        if q is None:
+            q = BatchInferenceQueue(batch_fn, max_batch=max_batch, max_wait_ms=max_wait_ms, name=name)
+            _batch_queues[name] = q
+        return q
+
+
+def get_transformer_service(
+    model_path: str = "models/transformer_chess.pth",
+    vocab_path: str = "models/vocab.pkl",
+    quantized_path: str = "models/transformer_chess_int8.pt",
+    use_quantized: bool = True,
+    max_batch: int = 32,
+    max_wait_ms: float = 5.0,
+    threads: Optional[int] = None,
+):
+    """
+    Trả về (backend_agent, queue): 1 TransformerAgent load model duy nhất và
+    queue gom các lịch sử nước đi -> xác suất nước đi, chạy 1 forward mỗi batch.
+    threads: số thread intra-op của worker thread chạy forward.
+    """
+    key = f"transformer:{model_path}:{vocab_path}:{quantized_path if use_quantized else ''}:{threads or ''}"
+    with _batch_queues_lock:
+        backend = _transformer_backends.get(key)
+        if backend is None:
+            from .ml.agent import TransformerAgent
+
+            backend = TransformerAgent(
+                model_path=model_path,
+                vocab_path=vocab_path,
+                quantized_path=quantized_path,
+                use_quantized=use_quantized,
+                threads=threads,
+            )
+            _transformer_backends[key] = backend
+
+    return backend, get_batch_queue(key, backend.predict_batch, max_batch, max_wait_ms)
+
+
+def shutdown_batch_queues() -> None:
+    """Đóng mọi queue (gọi khi tắt server / simulator)."""
+    with _batch_queues_lock:
+        queues = list(_batch_queues.values())
+        _batch_queues.clear()
+        _transformer_backends.clear()
+    for q in queues:
+        q.close()
@@ -0,0 +1,119 @@
+# ai/batching.py
+"""
+Hàng đợi inference gom batch (in-process).
+
+Nhiều luồng (phòng online, simulator, bot server...) cùng gọi submit(item);
+một worker thread gom tối đa `max_batch` item hoặc chờ tối đa `max_wait_ms`
+rồi gọi batch_fn(items) MỘT lần, sau đó trả kết quả về từng Future.
+
+Không phụ thuộc torch: batch_fn do agent cung cấp (VD: forward ChessTransformer).
+"""
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Tuple
+
+BatchFn = Callable[[List[Any]], List[Any]]
+
+
+class BatchInferenceQueue:
+    def __init__(
+        self,
+        batch_fn: BatchFn,
+        max_batch: int = 32,
+        max_wait_ms: float = 5.0,
+        name: str = "inference",
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait_sec = max(0.0, max_wait_ms) / 1000.0
+        self.name = name
+
+        self._queue: "queue.Queue[Tuple[Any, Future] | None]" = queue.Queue()
+        self._closed = False
+
+        # Thống kê đơn giản để benchmark / debug
+        self.stats: Dict[str, int] = {"requests": 0, "batches": 0, "max_batch_seen": 0}
+
+        self._thread = threading.Thread(target=self._worker_loop, name=f"{name}-batcher", daemon=True)
+        self._thread.start()
+
+    # --------- Public API ----------
+
+    def submit(self, item: Any) -> Future:
+        """Đưa 1 item vào hàng đợi, trả về Future chứa kết quả của item đó."""
+        if self._closed:
+            raise RuntimeError(f"BatchInferenceQueue '{self.name}' is closed")
+        fut: Future = Future()
+        self._queue.put((item, fut))
+        return fut
+
+    def __call__(self, item: Any, timeout: float | None = None) -> Any:
+        """Tiện ích: submit rồi chờ kết quả (blocking)."""
+        return self.submit(item).result(timeout=timeout)
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout=1.0)
+
+    # --------- Worker ----------
+
+    def _collect_batch(self, first: Tuple[Any, Future]) -> Tuple[List[Tuple[Any, Future]], bool]:
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait_sec
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is None:
+                return batch, True
+            batch.append(entry)
+        return batch, False
+
+    def _worker_loop(self) -> None:
+        stop = False
+        while not stop:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch, stop = self._collect_batch(first)
+
+            # Bỏ các Future đã bị cancel trước khi chạy
+            batch = [(item, fut) for item, fut in batch if fut.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            self.stats["requests"] += len(batch)
+            self.stats["batches"] += 1
+            self.stats["max_batch_seen"] = max(self.stats["max_batch_seen"], len(batch))
+
+            try:
+                results = self.batch_fn([item for item, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(
+                        f"batch_fn returned {len(results)} results for {len(batch)} items"
+                    )
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+
+            for (_, fut), res in zip(batch, results):
+                fut.set_result(res)
+
+        # Huỷ các request còn sót lại sau khi close()
+        while True:
+            try:
+                entry = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is not None and entry[1].set_running_or_notify_cancel():
+                entry[1].set_exception(RuntimeError(f"BatchInferenceQueue '{self.name}' is closed"))
@@ -11,6 +11,13 @@ PIECE_VALUES = {
     chess.PAWN: 100, chess.KNIGHT: 320, chess.BISHOP: 330, 
     chess.ROOK: 500, chess.QUEEN: 900, chess.KING: 20000
 }
+MOBILITY_WEIGHT = 5
+
+# Tham số đã tune (sinh bởi ai/minimax/tuning.py) nếu có, không thì giữ giá trị tay ở trên
+try:
+    from .eval_params import PIECE_VALUES, MOBILITY_WEIGHT
+except ImportError:
+    pass
 
 def evaluate(board: chess.Board) -> int:
     """Normal eval wrapper"""
@@ -108,7 +115,7 @@ def _evaluate_normal_logic(board: chess.Board) -> int:
     score += _eval_material(board)
     
     # Vị trí quân cơ bản (Mobility / Control Center)
-    score += board.legal_moves.count() * 5 if board.turn == chess.WHITE else -board.legal_moves.count() * 5
+    score += board.legal_moves.count() * MOBILITY_WEIGHT if board.turn == chess.WHITE else -board.legal_moves.count() * MOBILITY_WEIGHT
     
     return score
 
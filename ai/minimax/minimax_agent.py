@@ -1,10 +1,10 @@
 from __future__ import annotations
-from typing import Tuple, Dict, Any
+from typing import Tuple, Dict, Any, Optional
 import time
 import chess
 
 from ai.agent_base import Agent
-from .search import negamax_search
+from .search import negamax_search, EvalFn
 from .eval import evaluate, evaluate_advanced
 
 class MinimaxAgent(Agent):
@@ -14,28 +14,39 @@ class MinimaxAgent(Agent):
         use_advanced_eval: bool = True,
         use_quiescence: bool = True,
         use_move_ordering: bool = True,
+        eval_fn: Optional[EvalFn] = None,
+        verbose: bool = True,
     ):
         self.name = f"minimax_d{depth}"
         self.depth = depth
         self.use_advanced_eval = use_advanced_eval
         self.use_quiescence = use_quiescence
         self.use_move_ordering = use_move_ordering
+        # eval_fn tuỳ chỉnh (VD: NeuralEvaluator) thay cho eval handcrafted
+        self.eval_fn = eval_fn
+        # verbose=False: tắt log mỗi nước (self-play / server chạy hàng nghìn ván)
+        self.verbose = verbose
 
     def choose_move(self, board: chess.Board) -> Tuple[chess.Move, Dict[str, Any]]:
         start = time.time()
 
         # Sử dụng hàm evaluate_advanced chứa script mở màn
         eval_fn = evaluate_advanced if self.use_advanced_eval else evaluate
+        if self.eval_fn is not None:
+            eval_fn = self.eval_fn
 
         # Debug: Báo hiện tại đang ở nước thứ mấy (Fullmove)
-        print(f"--- Turn: {board.turn} (White=True/Black=False) | Move Number: {board.fullmove_number} | Ply: {board.ply()} ---")
+        if self.verbose:
+            print(f"--- Turn: {board.turn} (White=True/Black=False) | Move Number: {board.fullmove_number} | Ply: {board.ply()} ---")
 
+        pv: list = []
         best_move, best_score, nodes = negamax_search(
             board=board,
             depth=self.depth,
             eval_fn=eval_fn,
             use_quiescence=self.use_quiescence,
-            use_move_ordering=self.use_move_ordering
+            use_move_ordering=self.use_move_ordering,
+            pv=pv,
         )
 
         # Tự động phong hậu nếu tốt đi đến cuối
@@ -57,13 +68,15 @@ class MinimaxAgent(Agent):
         elapsed_ms = int((time.time() - start) * 1000)
         
         # Debug output
-        print(f"[AGENT] Picked Move: {best_move} | Score: {best_score} | Nodes: {nodes} | Time: {elapsed_ms}ms")
+        if self.verbose:
+            print(f"[AGENT] Picked Move: {best_move} | Score: {best_score} | Nodes: {nodes} | Time: {elapsed_ms}ms")
 
         info: Dict[str, Any] = {
             "agent": "minimax_scripted",
             "depth": self.depth,
             "score": best_score,
             "nodes": nodes,
+            "pv": [m.uci() for m in pv],
             "time_ms": elapsed_ms
         }
         return best_move, info
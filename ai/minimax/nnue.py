@@ -0,0 +1,445 @@
+# ai/minimax/nnue.py
+"""
+NNUE (efficiently updatable neural network) bằng NumPy cho minimax.
+
+Input HalfKP: với mỗi góc nhìn (trắng / đen), feature = (ô vua của mình,
+loại + màu quân không phải vua, ô của quân) -> 64 * 10 * 64 = 40960 feature,
+mỗi thế cờ chỉ ~30 feature bật. Góc nhìn đen được lật dọc (sq ^ 56) nên 2 góc
+nhìn dùng chung 1 ma trận W1.
+
+Network (theo góc nhìn bên tới lượt):
+    acc_p = b1 + sum W1[f]               (M=128, mỗi góc nhìn)
+    x     = [acc_stm, acc_other]         (2M) -> clipped ReLU
+    -> Linear(2M, 32) -> clipped ReLU -> Linear(32, 32) -> clipped ReLU -> Linear(32, 1)
+    output = điểm (pawn) theo góc nhìn bên tới lượt.
+
+Suy luận lượng tử hoá: W1/b1 int16 (x127), dense int16 (x64), tích luỹ int32.
+Accumulator cập nhật tăng dần: negamax gọi push(board, move) trước board.push
+và pop() sau board.pop(); chỉ khi vua của 1 góc nhìn di chuyển thì góc nhìn
+đó mới tính lại toàn bộ (lười, lúc cần).
+
+Train từ self-play (ai/selfplay.py), cũng bằng NumPy:
+    python -m ai.minimax.nnue extract --selfplay data/selfplay --out data/nnue_data.npz
+    python -m ai.minimax.nnue train --data data/nnue_data.npz --out models/nnue.npz --epochs 5
+"""
+import argparse
+import os
+import time
+from multiprocessing import Pool
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import chess
+import numpy as np
+
+DEFAULT_NNUE_PATH = "models/nnue.npz"
+
+NUM_FEATURES = 64 * 10 * 64
+MAX_ACTIVE = 32            # tối đa 30 quân không phải vua (+ dư)
+PAD_FEATURE = NUM_FEATURES  # hàng W1 toàn 0 dùng để pad khi train
+ACC_SIZE = 128
+HIDDEN = 32
+
+QA = 127                   # scale accumulator / activation
+QB = 64                    # scale trọng số dense
+WDL_SCALE = 410.0          # cp -> xác suất thắng: sigmoid(cp / WDL_SCALE)
+MATE_SCORE = 9999999
+
+
+# ============================================================
+# 1. FEATURES
+# ============================================================
+
+def feature_index(perspective: chess.Color, king_sq: int, piece: chess.Piece, sq: int) -> int:
+    if perspective == chess.BLACK:
+        king_sq ^= 56
+        sq ^= 56
+    kind = (piece.piece_type - 1) + (0 if piece.color == perspective else 5)
+    return king_sq * 640 + kind * 64 + sq
+
+
+def active_features(board: chess.Board, perspective: chess.Color) -> List[int]:
+    king_sq = board.king(perspective)
+    return [
+        feature_index(perspective, king_sq, piece, sq)
+        for sq, piece in board.piece_map().items()
+        if piece.piece_type != chess.KING
+    ]
+
+
+def _move_deltas(board: chess.Board, move: chess.Move, perspective: chess.Color) -> Tuple[List[int], List[int]]:
+    """Feature bị bỏ / thêm với góc nhìn `perspective` khi đi `move` (board trước nước đi)."""
+    king_sq = board.king(perspective)
+    piece = board.piece_at(move.from_square)
+    removed = [feature_index(perspective, king_sq, piece, move.from_square)]
+    placed = chess.Piece(move.promotion, piece.color) if move.promotion else piece
+    added = [feature_index(perspective, king_sq, placed, move.to_square)]
+
+    if board.is_en_passant(move):
+        cap_sq = move.to_square + (-8 if piece.color == chess.WHITE else 8)
+        removed.append(feature_index(perspective, king_sq, chess.Piece(chess.PAWN, not piece.color), cap_sq))
+    else:
+        captured = board.piece_at(move.to_square)
+        if captured is not None:
+            removed.append(feature_index(perspective, king_sq, captured, move.to_square))
+    return removed, added
+
+
+def _castling_rook_deltas(board: chess.Board, move: chess.Move, perspective: chess.Color) -> Tuple[List[int], List[int]]:
+    rank = chess.square_rank(move.from_square)
+    if board.is_kingside_castling(move):
+        rook_from, rook_to = chess.square(7, rank), chess.square(5, rank)
+    else:
+        rook_from, rook_to = chess.square(0, rank), chess.square(3, rank)
+    king_sq = board.king(perspective)
+    rook = chess.Piece(chess.ROOK, board.turn)
+    return [feature_index(perspective, king_sq, rook, rook_from)], [feature_index(perspective, king_sq, rook, rook_to)]
+
+
+# ============================================================
+# 2. EVALUATOR (LƯỢNG TỬ HOÁ, TĂNG DẦN)
+# ============================================================
+
+class NNUEEvaluator:
+    """
+    eval_fn cho negamax_search: __call__(board) -> centipawn góc nhìn trắng.
+    Hook accumulator: begin(board) ở gốc, push(board, move) / pop() quanh mỗi nước.
+    """
+
+    def __init__(self, weights: Dict[str, np.ndarray]):
+        self.w1 = weights["w1"].astype(np.int32)
+        self.b1 = weights["b1"].astype(np.int32)
+        self.w2 = weights["w2"].astype(np.int32)
+        self.b2 = weights["b2"].astype(np.int32)
+        self.w3 = weights["w3"].astype(np.int32)
+        self.b3 = weights["b3"].astype(np.int32)
+        self.w4 = weights["w4"].astype(np.int32)
+        self.b4 = int(weights["b4"])
+        # Stack accumulator: mỗi phần tử [acc_white, acc_black], None = cần tính lại
+        self._stack: List[List[Optional[np.ndarray]]] = []
+        self._base_ply = 0
+
+    @classmethod
+    def from_file(cls, path: str = DEFAULT_NNUE_PATH) -> "NNUEEvaluator":
+        with np.load(path) as data:
+            return cls({k: data[k] for k in data.files})
+
+    # --------- Accumulator ----------
+
+    def _refresh(self, board: chess.Board, perspective: chess.Color) -> np.ndarray:
+        idx = active_features(board, perspective)
+        return self.b1 + self.w1[idx].sum(axis=0) if idx else self.b1.copy()
+
+    def _top(self, board: chess.Board) -> List[np.ndarray]:
+        entry = self._stack[-1]
+        for p in (chess.WHITE, chess.BLACK):
+            i = 0 if p == chess.WHITE else 1
+            if entry[i] is None:
+                entry[i] = self._refresh(board, p)
+        return entry
+
+    def begin(self, board: chess.Board) -> None:
+        self._stack = [[self._refresh(board, chess.WHITE), self._refresh(board, chess.BLACK)]]
+        self._base_ply = len(board.move_stack)
+
+    def push(self, board: chess.Board, move: chess.Move) -> None:
+        """Gọi TRƯỚC board.push(move)."""
+        if not self._stack or len(board.move_stack) != self._base_ply + len(self._stack) - 1:
+            self.begin(board)
+        parent = self._top(board)
+        piece = board.piece_at(move.from_square)
+        castling = piece.piece_type == chess.KING and board.is_castling(move)
+
+        entry: List[Optional[np.ndarray]] = [None, None]
+        for p in (chess.WHITE, chess.BLACK):
+            i = 0 if p == chess.WHITE else 1
+            if piece.piece_type == chess.KING and piece.color == p:
+                continue  # vua góc nhìn này đổi ô -> tính lại lười
+            if piece.piece_type == chess.KING:
+                # Vua đối phương đi: không phải feature, chỉ xét quân bị ăn / xe nhập thành
+                removed, added = [], []
+                captured = board.piece_at(move.to_square)
+                if captured is not None:
+                    removed.append(feature_index(p, board.king(p), captured, move.to_square))
+            else:
+                removed, added = _move_deltas(board, move, p)
+            if castling:
+                r, a = _castling_rook_deltas(board, move, p)
+                removed += r
+                added += a
+            acc = parent[i].copy()
+            for f in removed:
+                acc -= self.w1[f]
+            for f in added:
+                acc += self.w1[f]
+            entry[i] = acc
+        self._stack.append(entry)
+
+    def pop(self) -> None:
+        """Gọi SAU board.pop()."""
+        if len(self._stack) > 1:
+            self._stack.pop()
+
+    # --------- Forward ----------
+
+    def _forward_cp(self, acc_stm: np.ndarray, acc_other: np.ndarray) -> int:
+        x = np.clip(np.concatenate((acc_stm, acc_other)), 0, QA)
+        h = np.clip((x @ self.w2 + self.b2) >> 6, 0, QA)
+        h = np.clip((h @ self.w3 + self.b3) >> 6, 0, QA)
+        out = int(h @ self.w4) + self.b4
+        return out * 100 // (QA * QB)
+
+    def evaluate_stm(self, board: chess.Board) -> int:
+        if not self._stack or len(board.move_stack) != self._base_ply + len(self._stack) - 1:
+            # Gọi ngoài search (không có hook) -> tính lại từ đầu
+            self.begin(board)
+        acc_w, acc_b = self._top(board)
+        if board.turn == chess.WHITE:
+            return self._forward_cp(acc_w, acc_b)
+        return self._forward_cp(acc_b, acc_w)
+
+    def __call__(self, board: chess.Board) -> int:
+        if board.is_check() and board.is_checkmate():
+            return -MATE_SCORE if board.turn == chess.WHITE else MATE_SCORE
+        cp = self.evaluate_stm(board)
+        return cp if board.turn == chess.WHITE else -cp
+
+
+# ============================================================
+# 3. TRAINING DATA (SELF-PLAY)
+# ============================================================
+
+def _pad(idx: List[int]) -> List[int]:
+    return (idx + [PAD_FEATURE] * MAX_ACTIVE)[:MAX_ACTIVE]
+
+
+def game_samples(job: Tuple[Sequence[str], Sequence[Optional[int]], float, int]):
+    """1 ván self-play -> list (features trắng, features đen, stm, score cp trắng, result trắng)."""
+    moves, scores, result, min_ply = job
+    board = chess.Board()
+    out = []
+    for i, uci in enumerate(moves):
+        score = scores[i] if i < len(scores) else None
+        if (
+            i >= min_ply
+            and score is not None
+            and abs(score) < 50_000  # bỏ điểm chiếu hết / script khai cuộc
+            and not board.is_check()
+        ):
+            out.append((
+                _pad(active_features(board, chess.WHITE)),
+                _pad(active_features(board, chess.BLACK)),
+                int(board.turn == chess.WHITE),
+                float(score),
+                result,
+            ))
+        move = chess.Move.from_uci(uci)
+        if move not in board.legal_moves:
+            break
+        board.push(move)
+    return out
+
+
+def extract_dataset(selfplay_dir: str, out_path: str, workers: int = 4, min_ply: int = 8) -> int:
+    from ai.selfplay import iter_selfplay_games
+
+    targets = {"1-0": 1.0, "0-1": 0.0, "1/2-1/2": 0.5}
+
+    def jobs():
+        for game in iter_selfplay_games(selfplay_dir):
+            yield game["moves"], game["scores"], targets[game["result"]], max(min_ply, game.get("opening_plies", 0))
+
+    fw, fb, stm, score, result = [], [], [], [], []
+    with Pool(workers) as pool:
+        for samples in pool.imap_unordered(game_samples, jobs(), chunksize=16):
+            for s in samples:
+                fw.append(s[0])
+                fb.append(s[1])
+                stm.append(s[2])
+                score.append(s[3])
+                result.append(s[4])
+
+    np.savez_compressed(
+        out_path,
+        feat_white=np.asarray(fw, dtype=np.int32).reshape(-1, MAX_ACTIVE),
+        feat_black=np.asarray(fb, dtype=np.int32).reshape(-1, MAX_ACTIVE),
+        stm_white=np.asarray(stm, dtype=np.int8),
+        score=np.asarray(score, dtype=np.float32),
+        result=np.asarray(result, dtype=np.float32),
+    )
+    print(f"[NNUE] {len(stm)} positions -> {out_path}")
+    return len(stm)
+
+
+# ============================================================
+# 4. TRAINER (NUMPY, FLOAT32)
+# ============================================================
+
+def init_float_weights(seed: int = 0, acc_size: int = ACC_SIZE, hidden: int = HIDDEN) -> Dict[str, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    w1 = (rng.standard_normal((NUM_FEATURES + 1, acc_size)) * 0.01).astype(np.float32)
+    w1[PAD_FEATURE] = 0.0
+    return {
+        "w1": w1,
+        "b1": np.full(acc_size, 0.1, dtype=np.float32),
+        "w2": (rng.standard_normal((2 * acc_size, hidden)) / np.sqrt(2 * acc_size)).astype(np.float32),
+        "b2": np.zeros(hidden, dtype=np.float32),
+        "w3": (rng.standard_normal((hidden, hidden)) / np.sqrt(hidden)).astype(np.float32),
+        "b3": np.zeros(hidden, dtype=np.float32),
+        "w4": (rng.standard_normal(hidden) / np.sqrt(hidden)).astype(np.float32),
+        "b4": np.zeros((), dtype=np.float32),
+    }
+
+
+def _sigmoid(z: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -40.0, 40.0)))
+
+
+def train_step(params: Dict[str, np.ndarray], adam: Dict[str, list], batch, lr: float, lam: float, step: int) -> float:
+    """1 bước: forward float + backprop tay. W1 cập nhật thưa (chỉ các hàng được dùng)."""
+    fw, fb, stm_white, score, result = batch
+    B = len(score)
+    w1 = params["w1"]
+
+    acc_w = params["b1"] + w1[fw].sum(axis=1)
+    acc_b = params["b1"] + w1[fb].sum(axis=1)
+    stm = stm_white.astype(bool)[:, None]
+    x = np.concatenate([np.where(stm, acc_w, acc_b), np.where(stm, acc_b, acc_w)], axis=1)
+    c0 = np.clip(x, 0.0, 1.0)
+    z1 = c0 @ params["w2"] + params["b2"]
+    c1 = np.clip(z1, 0.0, 1.0)
+    z2 = c1 @ params["w3"] + params["b3"]
+    c2 = np.clip(z2, 0.0, 1.0)
+    out = c2 @ params["w4"] + params["b4"]  # pawn, góc nhìn bên tới lượt
+
+    # Target theo góc nhìn bên tới lượt: trộn điểm search và kết quả ván
+    sign = np.where(stm_white.astype(bool), 1.0, -1.0)
+    score_stm = score * sign
+    result_stm = np.where(stm_white.astype(bool), result, 1.0 - result)
+    target = lam * _sigmoid(score_stm / WDL_SCALE) + (1.0 - lam) * result_stm
+
+    p = _sigmoid(out * 100.0 / WDL_SCALE)
+    loss = float(np.mean((p - target) ** 2))
+
+    d_out = 2.0 * (p - target) / B * p * (1.0 - p) * (100.0 / WDL_SCALE)
+    grads = {"w4": c2.T @ d_out, "b4": np.sum(d_out)}
+    d_c2 = np.outer(d_out, params["w4"]) * ((z2 > 0) & (z2 < 1))
+    grads["w3"] = c1.T @ d_c2
+    grads["b3"] = d_c2.sum(axis=0)
+    d_c1 = (d_c2 @ params["w3"].T) * ((z1 > 0) & (z1 < 1))
+    grads["w2"] = c0.T @ d_c1
+    grads["b2"] = d_c1.sum(axis=0)
+    d_x = (d_c1 @ params["w2"].T) * ((x > 0) & (x < 1))
+
+    M = acc_w.shape[1]
+    d_first, d_second = d_x[:, :M], d_x[:, M:]
+    d_acc_w = np.where(stm, d_first, d_second)
+    d_acc_b = np.where(stm, d_second, d_first)
+    grads["b1"] = d_acc_w.sum(axis=0) + d_acc_b.sum(axis=0)
+
+    # Adam cho các tham số dense / bias
+    beta1, beta2, eps = 0.9, 0.999, 1e-8
+    for name, g in grads.items():
+        m, v = adam.setdefault(name, [np.zeros_like(params[name]), np.zeros_like(params[name])])
+        m *= beta1
+        m += (1 - beta1) * g
+        v *= beta2
+        v += (1 - beta2) * g * g
+        params[name] = params[name] - lr * (m / (1 - beta1 ** step)) / (np.sqrt(v / (1 - beta2 ** step)) + eps)
+
+    # W1: SGD thưa (np.add.at) trên các feature có mặt trong batch
+    rows = np.concatenate([fw.ravel(), fb.ravel()])
+    upd = np.concatenate([np.repeat(d_acc_w, MAX_ACTIVE, axis=0), np.repeat(d_acc_b, MAX_ACTIVE, axis=0)])
+    np.add.at(w1, rows, -lr * 50.0 * upd)
+    w1[PAD_FEATURE] = 0.0
+    return loss
+
+
+def quantize(params: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    def q16(a, scale):
+        return np.clip(np.round(a * scale), -32767, 32767).astype(np.int16)
+
+    return {
+        "w1": q16(params["w1"][:NUM_FEATURES], QA),
+        "b1": q16(params["b1"], QA),
+        "w2": q16(params["w2"], QB),
+        "b2": np.round(params["b2"] * QA * QB).astype(np.int32),
+        "w3": q16(params["w3"], QB),
+        "b3": np.round(params["b3"] * QA * QB).astype(np.int32),
+        "w4": q16(params["w4"], QB),
+        "b4": np.asarray(np.round(params["b4"] * QA * QB), dtype=np.int32),
+    }
+
+
+def train(
+    data_path: str,
+    out_path: str = DEFAULT_NNUE_PATH,
+    epochs: int = 5,
+    batch_size: int = 1024,
+    lr: float = 1e-3,
+    lam: float = 0.7,
+    resume: bool = False,
+    seed: int = 0,
+) -> Dict[str, np.ndarray]:
+    """Train NNUE float32 rồi ghi bản lượng tử hoá (out_path) + bản float (*.float.npz) để train tiếp."""
+    with np.load(data_path) as d:
+        data = (d["feat_white"], d["feat_black"], d["stm_white"], d["score"], d["result"])
+    n = len(data[3])
+    if n == 0:
+        raise ValueError(f"No training positions in {data_path}")
+
+    float_path = os.path.splitext(out_path)[0] + ".float.npz"
+    if resume and os.path.exists(float_path):
+        with np.load(float_path) as f:
+            params = {k: f[k].copy() for k in f.files}
+        print(f"[NNUE] Resume từ {float_path}")
+    else:
+        params = init_float_weights(seed)
+
+    rng = np.random.default_rng(seed)
+    adam: Dict[str, list] = {}
+    step = 0
+    for epoch in range(epochs):
+        order = rng.permutation(n)
+        t0, total, batches = time.time(), 0.0, 0
+        for s in range(0, n, batch_size):
+            idx = order[s:s + batch_size]
+            step += 1
+            total += train_step(params, adam, tuple(a[idx] for a in data), lr, lam, step)
+            batches += 1
+        print(f"[NNUE] epoch {epoch} loss {total / max(1, batches):.5f} ({time.time() - t0:.1f}s)")
+
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    np.savez(float_path, **params)
+    np.savez(out_path, **quantize(params))
+    print(f"[NNUE] Saved {out_path} (+ {float_path})")
+    return params
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NNUE cho minimax: trích dữ liệu self-play / train")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    ex = sub.add_parser("extract")
+    ex.add_argument("--selfplay", required=True)
+    ex.add_argument("--out", required=True)
+    ex.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ex.add_argument("--min-ply", type=int, default=8)
+
+    tr = sub.add_parser("train")
+    tr.add_argument("--data", required=True)
+    tr.add_argument("--out", default=DEFAULT_NNUE_PATH)
+    tr.add_argument("--epochs", type=int, default=5)
+    tr.add_argument("--batch-size", type=int, default=1024)
+    tr.add_argument("--lr", type=float, default=1e-3)
+    tr.add_argument("--lam", type=float, default=0.7, help="Trọng số điểm search so với kết quả ván")
+    tr.add_argument("--resume", action="store_true")
+    args = parser.parse_args()
+
+    if args.cmd == "extract":
+        extract_dataset(args.selfplay, args.out, args.workers, args.min_ply)
+    else:
+        train(args.data, args.out, args.epochs, args.batch_size, args.lr, args.lam, args.resume)
+
+
+if __name__ == "__main__":
+    main()
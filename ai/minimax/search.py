@@ -1,20 +1,28 @@
 from __future__ import annotations
-from typing import Callable, Tuple, List
+from typing import Callable, Tuple, List, Optional
 import chess
 import random
 
 EvalFn = Callable[[chess.Board], int]
 INFINITY = 10**9
 
+# eval_fn có thể có thêm hook tuỳ chọn:
+# - prefetch_children(board, moves): đánh giá trước (theo batch) mọi lá con
+#   của node depth 1, VD NeuralEvaluator trong ai/ml/value_eval.py.
+# - begin(board) ở gốc, push(board, move) trước board.push và pop() sau board.pop:
+#   cập nhật accumulator tăng dần, VD NNUEEvaluator trong ai/minimax/nnue.py.
+
 def negamax_search(
     board: chess.Board,
     depth: int,
     eval_fn: EvalFn,
     use_quiescence: bool = True,
     use_move_ordering: bool = True,
+    pv: Optional[List[chess.Move]] = None,
 ) -> Tuple[chess.Move, int, int]:
     """
     Root search function.
+    pv: nếu truyền list vào thì được ghi principal variation (bắt đầu bằng best_move).
     """
     alpha = -INFINITY
     beta = INFINITY
@@ -32,22 +40,39 @@ def negamax_search(
         # Prioritize captures, promotion, checks
         moves.sort(key=lambda m: _move_score_guess(board, m), reverse=True)
 
+    prefetch = getattr(eval_fn, "prefetch_children", None)
+    if prefetch is not None and depth == 1:
+        prefetch(board, moves)
+
+    begin = getattr(eval_fn, "begin", None)
+    if begin is not None:
+        begin(board)
+    push_hook = getattr(eval_fn, "push", None)
+    pop_hook = getattr(eval_fn, "pop", None)
+
     for move in moves:
+        if push_hook is not None:
+            push_hook(board, move)
         board.push(move)
         
         # Đệ quy
+        child_line = [] if pv is not None else None
         score, sub_nodes = _negamax_worker(
-            board, depth - 1, -beta, -alpha, -1 if board.turn == chess.BLACK else 1, eval_fn
+            board, depth - 1, -beta, -alpha, -1 if board.turn == chess.BLACK else 1, eval_fn, child_line
         )
         
         # Đảo dấu score vì Negamax
         score = -score
         nodes_searched += sub_nodes
         board.pop()
+        if pop_hook is not None:
+            pop_hook()
 
         if score > best_val:
             best_val = score
             best_move = move
+            if pv is not None:
+                pv[:] = [move] + child_line
         
         alpha = max(alpha, score)
         if alpha >= beta:
@@ -56,7 +81,8 @@ def negamax_search(
     return best_move, best_val, nodes_searched
 
 def _negamax_worker(
-    board: chess.Board, depth: int, alpha: int, beta: int, color: int, eval_fn: EvalFn
+    board: chess.Board, depth: int, alpha: int, beta: int, color: int, eval_fn: EvalFn,
+    line: Optional[List[chess.Move]] = None,
 ) -> Tuple[int, int]:
     
     # Node đếm
@@ -78,17 +104,35 @@ def _negamax_worker(
     # Simple sorting
     moves.sort(key=lambda m: _move_score_guess(board, m), reverse=True)
 
+    # Lá con ở depth 0 -> cho eval_fn đánh giá cả loạt trong 1 lần (nếu hỗ trợ)
+    if depth == 1:
+        prefetch = getattr(eval_fn, "prefetch_children", None)
+        if prefetch is not None:
+            prefetch(board, moves)
+
+    push_hook = getattr(eval_fn, "push", None)
+    pop_hook = getattr(eval_fn, "pop", None)
+
     found_pv = False
     for move in moves:
+        if push_hook is not None:
+            push_hook(board, move)
         board.push(move)
         
-        score, sub_nodes = _negamax_worker(board, depth - 1, -beta, -alpha, -color, eval_fn)
+        # Chỉ dựng PV khi được yêu cầu (line không None)
+        child_line = [] if line is not None else None
+        score, sub_nodes = _negamax_worker(board, depth - 1, -beta, -alpha, -color, eval_fn, child_line)
         score = -score
         nodes += sub_nodes
         
         board.pop()
+        if pop_hook is not None:
+            pop_hook()
 
-        best_score = max(best_score, score)
+        if score > best_score:
+            best_score = score
+            if line is not None:
+                line[:] = [move] + child_line
         alpha = max(alpha, score)
         
         if alpha >= beta:
@@ -0,0 +1,352 @@
+# ai/minimax/tuning.py
+"""
+Texel tuning cho eval minimax (ai/minimax/eval.py) bằng NumPy.
+
+Eval thường (_evaluate_normal_logic) tuyến tính theo tham số:
+    eval = sum_pt PIECE_VALUES[pt] * (số quân trắng - số quân đen)
+         + MOBILITY_WEIGHT * (số nước hợp lệ của bên tới lượt, dấu + nếu trắng đi)
+nên mỗi thế cờ chỉ cần trích 1 lần vector đặc trưng x (FEATURES), sau đó
+eval của MỌI bộ tham số w là X @ w -> cả vòng tối ưu chạy vector hoá, không
+gọi lại python-chess.
+
+Các bước:
+  1. extract: thế cờ "yên" (không bị chiếu, nước vừa đi không phải ăn quân /
+     phong cấp, sau ply khai cuộc) từ self-play (ai/selfplay.py) hoặc token
+     shards (ai/ml/pgn_shards.py) -> <prefix>.X.npy (float32, N x F) và
+     <prefix>.y.npy (kết quả ván theo góc nhìn trắng: 1 / 0.5 / 0).
+  2. tune: tìm K cho sigmoid(K * eval) với tham số hiện tại, rồi gradient
+     descent (Adam) trên logistic loss; gradient tính trên các đoạn của X,
+     tuỳ chọn chia cho nhiều process (mỗi process memmap file .npy).
+  3. write: sinh ai/minimax/eval_params.py, eval.py import nếu có.
+
+Usage:
+    python -m ai.minimax.tuning extract --selfplay data/selfplay --out data/texel
+    python -m ai.minimax.tuning tune --features data/texel --workers 4
+"""
+import argparse
+import itertools
+import math
+import os
+import time
+from multiprocessing import Pool
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import chess
+import numpy as np
+
+FEATURES = ["pawn", "knight", "bishop", "rook", "queen", "mobility"]
+_PIECE_TYPES = [chess.PAWN, chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.QUEEN]
+_RESULT_TARGET = {"1-0": 1.0, "0-1": 0.0, "1/2-1/2": 0.5}
+
+DEFAULT_PARAMS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "eval_params.py")
+
+
+# ============================================================
+# 1. FEATURE EXTRACTION
+# ============================================================
+
+def position_features(board: chess.Board) -> List[float]:
+    """Vector đặc trưng khớp với _evaluate_normal_logic (eval = x @ w)."""
+    x = [
+        float(chess.popcount(board.pieces_mask(pt, chess.WHITE)) - chess.popcount(board.pieces_mask(pt, chess.BLACK)))
+        for pt in _PIECE_TYPES
+    ]
+    mobility = board.legal_moves.count()
+    x.append(float(mobility if board.turn == chess.WHITE else -mobility))
+    return x
+
+
+def current_params() -> np.ndarray:
+    """Tham số eval đang dùng (eval_params.py nếu đã tune, không thì giá trị tay)."""
+    from . import eval as ev
+
+    return np.array([ev.PIECE_VALUES[pt] for pt in _PIECE_TYPES] + [ev.MOBILITY_WEIGHT], dtype=np.float64)
+
+
+def game_features(job: Tuple[Sequence[str], float, int]) -> Tuple[List[List[float]], float]:
+    """(uci moves, target, min_ply) -> (features của các thế cờ yên, target)."""
+    moves, target, min_ply = job
+    board = chess.Board()
+    rows = []
+    for uci in moves:
+        try:
+            move = chess.Move.from_uci(uci)
+        except ValueError:
+            break
+        if move not in board.legal_moves:
+            break
+        noisy = board.is_capture(move) or move.promotion is not None
+        board.push(move)
+        if board.ply() < min_ply or noisy or board.is_check() or board.is_game_over():
+            continue
+        rows.append(position_features(board))
+    return rows, target
+
+
+def iter_selfplay_jobs(selfplay_dir: str, min_ply: int) -> Iterable[Tuple[List[str], float, int]]:
+    from ai.selfplay import iter_selfplay_games
+
+    for game in iter_selfplay_games(selfplay_dir):
+        # Ván bị cắt vì max_plies không có kết quả thật -> bỏ
+        if game.get("termination") == "max_plies":
+            continue
+        yield game["moves"], _RESULT_TARGET[game["result"]], max(min_ply, game.get("opening_plies", 0))
+
+
+def iter_shard_jobs(shard_dir: str, vocab_path: str, min_ply: int) -> Iterable[Tuple[List[str], float, int]]:
+    from ai.ml.pgn_shards import ShardedCorpus
+    from ai.ml.utils import ChessVocabulary
+
+    vocab = ChessVocabulary.load(vocab_path)
+    corpus = ShardedCorpus(shard_dir)
+    for i in range(len(corpus)):
+        moves = [vocab.decode(int(t)) for t in corpus.game(i)]
+        yield moves, (corpus.result(i) + 1) / 2.0, min_ply
+
+
+def _windows(jobs: Iterable, size: int) -> Iterable[list]:
+    it = iter(jobs)
+    while True:
+        window = list(itertools.islice(it, size))
+        if not window:
+            return
+        yield window
+
+
+def extract_features(
+    jobs: Iterable[Tuple[Sequence[str], float, int]],
+    out_prefix: str,
+    workers: int = 4,
+    max_positions: Optional[int] = None,
+    window_games: int = 1024,
+) -> int:
+    """
+    Trích đặc trưng (song song theo ván) -> <out_prefix>.X.npy / .y.npy. Trả về số thế cờ.
+    Ván được gửi theo cửa sổ window_games (tối đa 2 cửa sổ trong pool, như build_shards):
+    archive chỉ được đọc trước tối đa 1 cửa sổ, đủ max_positions là dừng đọc.
+    """
+    xs: List[np.ndarray] = []
+    ys: List[np.ndarray] = []
+    total = 0
+    start = time.time()
+    chunksize = max(1, window_games // (workers * 4))
+    with Pool(workers) as pool:
+        pending = None
+        for window in itertools.chain(_windows(jobs, window_games), [None]):
+            # Cửa sổ mới được gửi đi trước khi gom cửa sổ cũ -> worker không phải chờ đọc archive
+            job = pool.map_async(game_features, window, chunksize=chunksize) if window else None
+            if pending is not None:
+                for rows, target in pending.get():
+                    if not rows:
+                        continue
+                    xs.append(np.asarray(rows, dtype=np.float32))
+                    ys.append(np.full(len(rows), target, dtype=np.float32))
+                    total += len(rows)
+                if max_positions and total >= max_positions:
+                    break  # thoát with -> terminate, bỏ cửa sổ đang chạy
+            pending = job
+
+    X = np.concatenate(xs) if xs else np.zeros((0, len(FEATURES)), dtype=np.float32)
+    y = np.concatenate(ys) if ys else np.zeros(0, dtype=np.float32)
+    if max_positions:
+        X, y = X[:max_positions], y[:max_positions]
+
+    os.makedirs(os.path.dirname(os.path.abspath(out_prefix)), exist_ok=True)
+    np.save(out_prefix + ".X.npy", X)
+    np.save(out_prefix + ".y.npy", y)
+    print(f"[TUNE] {len(y)} quiet positions -> {out_prefix}.X.npy ({time.time() - start:.1f}s)")
+    return len(y)
+
+
+# ============================================================
+# 2. LOGISTIC LOSS + GRADIENT (VECTOR HOÁ)
+# ============================================================
+
+def _sigmoid(z: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -40.0, 40.0)))
+
+
+def loss_and_grad(X: np.ndarray, y: np.ndarray, w: np.ndarray, k: float) -> Tuple[float, np.ndarray, int]:
+    """
+    Tổng (không chia N) logistic loss và gradient theo w trên 1 đoạn dữ liệu.
+    p = sigmoid(k * X @ w), loss = -[y log p + (1 - y) log(1 - p)]
+    """
+    p = _sigmoid(k * (X @ w))
+    eps = 1e-12
+    loss = -np.sum(y * np.log(p + eps) + (1.0 - y) * np.log(1.0 - p + eps))
+    grad = k * (X.T @ (p - y))
+    return float(loss), grad, len(y)
+
+
+_worker_arrays: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+
+def _chunk_loss_and_grad(job: Tuple[str, int, int, np.ndarray, float]):
+    prefix, start, end, w, k = job
+    arrays = _worker_arrays.get(prefix)
+    if arrays is None:
+        # memmap: mỗi process chỉ đọc đoạn của mình, page cache dùng chung giữa process
+        arrays = (np.load(prefix + ".X.npy", mmap_mode="r"), np.load(prefix + ".y.npy", mmap_mode="r"))
+        _worker_arrays[prefix] = arrays
+    X, y = arrays
+    return loss_and_grad(np.asarray(X[start:end], dtype=np.float64), np.asarray(y[start:end], dtype=np.float64), w, k)
+
+
+class _GradientEngine:
+    """Tính loss/grad trên toàn bộ dữ liệu: tại chỗ (workers <= 1) hoặc chia đoạn cho Pool."""
+
+    def __init__(self, prefix: str, n: int, workers: int = 1):
+        self.prefix = prefix
+        self.n = n
+        self.pool = Pool(workers) if workers > 1 else None
+        self.bounds = np.linspace(0, n, max(1, workers) + 1, dtype=np.int64)
+        if self.pool is None:
+            self.X = np.load(prefix + ".X.npy").astype(np.float64)
+            self.y = np.load(prefix + ".y.npy").astype(np.float64)
+
+    def __call__(self, w: np.ndarray, k: float) -> Tuple[float, np.ndarray]:
+        if self.pool is None:
+            loss, grad, n = loss_and_grad(self.X, self.y, w, k)
+            return loss / n, grad / n
+        jobs = [(self.prefix, int(a), int(b), w, k) for a, b in zip(self.bounds[:-1], self.bounds[1:]) if b > a]
+        parts = self.pool.map(_chunk_loss_and_grad, jobs)
+        return sum(p[0] for p in parts) / self.n, sum(p[1] for p in parts) / self.n
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+
+
+def fit_k(engine: _GradientEngine, w: np.ndarray, lo: float = 1e-4, hi: float = 0.05, iters: int = 40) -> float:
+    """Golden-section search K (1 / centipawn) tối thiểu loss với tham số hiện tại."""
+    g = (math.sqrt(5) - 1) / 2
+    a, b = lo, hi
+    c, d = b - g * (b - a), a + g * (b - a)
+    fc, fd = engine(w, c)[0], engine(w, d)[0]
+    for _ in range(iters):
+        if fc < fd:
+            b, d, fd = d, c, fc
+            c = b - g * (b - a)
+            fc = engine(w, c)[0]
+        else:
+            a, c, fc = c, d, fd
+            d = a + g * (b - a)
+            fd = engine(w, d)[0]
+    return (a + b) / 2
+
+
+def tune(
+    features_prefix: str,
+    out_path: str = DEFAULT_PARAMS_PATH,
+    workers: int = 1,
+    steps: int = 2000,
+    lr: float = 2.0,
+    fix_pawn: bool = True,
+    k: Optional[float] = None,
+) -> Dict[str, float]:
+    """Tối ưu tham số eval trên features đã trích, ghi module eval_params.py. Trả về tham số."""
+    n = len(np.load(features_prefix + ".y.npy", mmap_mode="r"))
+    if n == 0:
+        raise ValueError(f"No positions in {features_prefix}")
+    engine = _GradientEngine(features_prefix, n, workers)
+    start = time.time()
+    try:
+        w = current_params()
+        k = k or fit_k(engine, w)
+        loss0 = engine(w, k)[0]
+        print(f"[TUNE] {n} positions, K={k:.5f}, loss ban đầu {loss0:.5f}")
+
+        # Adam; pawn giữ cố định = 100 để thang điểm vẫn là centipawn
+        mask = np.ones_like(w)
+        if fix_pawn:
+            mask[0] = 0.0
+        m = np.zeros_like(w)
+        v = np.zeros_like(w)
+        beta1, beta2, eps = 0.9, 0.999, 1e-8
+        loss = loss0
+        for step in range(1, steps + 1):
+            loss, grad = engine(w, k)
+            grad *= mask
+            m = beta1 * m + (1 - beta1) * grad
+            v = beta2 * v + (1 - beta2) * grad * grad
+            m_hat = m / (1 - beta1 ** step)
+            v_hat = v / (1 - beta2 ** step)
+            w = w - lr * m_hat / (np.sqrt(v_hat) + eps)
+            if step % 200 == 0:
+                print(f"[TUNE] step {step} loss {loss:.5f}")
+    finally:
+        engine.close()
+
+    params = {name: float(val) for name, val in zip(FEATURES, w)}
+    write_params_module(params, out_path, {"positions": n, "k": k, "loss_before": loss0, "loss_after": loss})
+    print(f"[TUNE] Done in {time.time() - start:.1f}s: {format_params(params)} -> {out_path}")
+    return params
+
+
+# ============================================================
+# 3. GENERATED MODULE
+# ============================================================
+
+def format_params(params: Dict[str, float]) -> str:
+    return ", ".join(f"{k}={int(round(v))}" for k, v in params.items())
+
+
+def write_params_module(params: Dict[str, float], path: str, meta: Dict[str, float]) -> None:
+    r = {k: int(round(v)) for k, v in params.items()}
+    text = f'''# ai/minimax/eval_params.py
+# FILE SINH TỰ ĐỘNG bởi ai/minimax/tuning.py - không sửa tay, chạy lại tuner để cập nhật.
+# positions={meta["positions"]} K={meta["k"]:.6f} loss {meta["loss_before"]:.5f} -> {meta["loss_after"]:.5f}
+import chess
+
+PIECE_VALUES = {{
+    chess.PAWN: {r["pawn"]}, chess.KNIGHT: {r["knight"]}, chess.BISHOP: {r["bishop"]},
+    chess.ROOK: {r["rook"]}, chess.QUEEN: {r["queen"]}, chess.KING: 20000
+}}
+
+MOBILITY_WEIGHT = {r["mobility"]}
+'''
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Texel tuning cho eval minimax")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    ex = sub.add_parser("extract", help="Trích đặc trưng thế cờ yên -> .npy")
+    ex.add_argument("--selfplay", default=None, help="Thư mục ai.selfplay")
+    ex.add_argument("--shards", default=None, help="Thư mục token shards (ai.ml.pgn_shards)")
+    ex.add_argument("--vocab", default="models/vocab.pkl")
+    ex.add_argument("--out", required=True, help="Prefix file features")
+    ex.add_argument("--min-ply", type=int, default=8)
+    ex.add_argument("--max-positions", type=int, default=None)
+    ex.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ex.add_argument("--window-games", type=int, default=1024, help="Số ván mỗi lần gửi vào pool")
+
+    tu = sub.add_parser("tune", help="Tối ưu tham số + ghi eval_params.py")
+    tu.add_argument("--features", required=True, help="Prefix file features")
+    tu.add_argument("--out", default=DEFAULT_PARAMS_PATH)
+    tu.add_argument("--workers", type=int, default=1)
+    tu.add_argument("--steps", type=int, default=2000)
+    tu.add_argument("--lr", type=float, default=2.0)
+    tu.add_argument("--k", type=float, default=None, help="Bỏ qua bước fit K")
+    tu.add_argument("--tune-pawn", action="store_true", help="Cho phép đổi giá trị tốt (mặc định giữ 100)")
+    args = parser.parse_args()
+
+    if args.cmd == "extract":
+        if args.selfplay:
+            jobs = iter_selfplay_jobs(args.selfplay, args.min_ply)
+        elif args.shards:
+            jobs = iter_shard_jobs(args.shards, args.vocab, args.min_ply)
+        else:
+            parser.error("extract cần --selfplay hoặc --shards")
+        extract_features(jobs, args.out, args.workers, args.max_positions, args.window_games)
+    else:
+        tune(args.features, args.out, args.workers, args.steps, args.lr, not args.tune_pawn, args.k)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,28 @@
-from .model import ChessTransformer
-from .agent import TransformerAgent
-from .utils import ChessVocabulary
+# ai/ml/__init__.py
+# Import lười (PEP 562): `import ai.ml` không kéo theo torch; submodule chỉ được
+# import khi truy cập lần đầu (VD ai.ml.TransformerAgent).
+import importlib
+
+_LAZY = {
+    "ChessTransformer": ".model",
+    "TransformerAgent": ".agent",
+    "ChessVocabulary": ".utils",
+}
 
 __all__ = [
     "ChessTransformer",
-    "TransformerAgent", 
+    "TransformerAgent",
     "ChessVocabulary"
-]
\ No newline at end of file
+]
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -2,24 +2,83 @@ import chess
 import torch
 import random
 import os
+import json
 from ai.agent_base import Agent
-from .model import ChessTransformer
-from .utils import ChessVocabulary
+from .checkpoint import load_checkpoint
+from .threads import apply_thread_budget, configure_from_env
+from .utils import ChessVocabulary, encode_position
+
+
+def _prefer_fast(path, ext):
+    """Dùng file định dạng nhanh (vocab.bin / *.cwt) cạnh file gốc nếu có và không cũ hơn."""
+    from .fast_format import fast_path
+
+    fast = fast_path(path, ext)
+    if fast == path or not os.path.exists(fast):
+        return path
+    if os.path.exists(path) and os.path.getmtime(path) > os.path.getmtime(fast):
+        return path
+    return fast
+
 
 class TransformerAgent(Agent):
     name = "TransformerAI"
 
-    def __init__(self, model_path="models/transformer_chess.pth", vocab_path="models/vocab.pkl"):
+    def __init__(
+        self,
+        model_path="models/transformer_chess.pth",
+        vocab_path="models/vocab.pkl",
+        quantized_path="models/transformer_chess_int8.pt",
+        use_quantized=True,
+        inference_queue=None,
+        threads=None,
+    ):
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.is_ready = False
-        
+        self.quantized = False
+        self.has_value_head = False
+        # "moves" (lịch sử nước đi) hoặc "board" (ChessBoardEncoder, chỉ cần FEN)
+        self.input_mode = "moves"
+        # Nếu có queue (ai.api.get_transformer_service) thì forward được gom batch
+        # với các agent khác thay vì chạy batch-1 riêng lẻ
+        self.inference_queue = inference_queue
+        # Số thread intra-op cho forward của agent này (None = theo process, xem ai/ml/threads.py)
+        self.threads = threads
+        configure_from_env()
+
+        # vocab.bin / *.cwt (python -m ai.ml.fast_format) load nhanh hơn pickle
+        vocab_path = _prefer_fast(vocab_path, ".bin")
+        model_path = _prefer_fast(model_path, ".cwt")
+
+        # Ưu tiên artifact int8 TorchScript (xem ai/ml/export.py) khi chạy CPU
+        if (
+            use_quantized
+            and self.device.type == "cpu"
+            and quantized_path
+            and os.path.exists(quantized_path)
+            and os.path.exists(vocab_path)
+        ):
+            try:
+                self.vocab = ChessVocabulary.load(vocab_path)
+                extra_files = {"config.json": ""}
+                self.model = torch.jit.load(quantized_path, map_location="cpu", _extra_files=extra_files)
+                self.model.eval()
+                if extra_files["config.json"]:
+                    self.input_mode = json.loads(extra_files["config.json"]).get("input_mode", "moves")
+                self.quantized = True
+                self.is_ready = True
+                print("TransformerAgent: Đã load model int8 (TorchScript)!")
+                return
+            except Exception as e:
+                print(f"TransformerAgent Error (int8): {e}")
+
         if os.path.exists(model_path) and os.path.exists(vocab_path):
             try:
                 self.vocab = ChessVocabulary.load(vocab_path)
-                self.model = ChessTransformer(vocab_size=self.vocab.vocab_size)
-                self.model.load_state_dict(torch.load(model_path, map_location=self.device))
-                self.model.to(self.device)
+                self.model = load_checkpoint(model_path, vocab_size=self.vocab.vocab_size, map_location=self.device)
                 self.model.eval() 
+                self.has_value_head = self.model.value_head is not None
+                self.input_mode = self.model.input_mode
                 self.is_ready = True
                 print("TransformerAgent: Đã load model thành công!")
             except Exception as e:
@@ -27,6 +86,39 @@ class TransformerAgent(Agent):
         else:
             print("TransformerAgent: Chưa tìm thấy file model. Sẽ đánh ngẫu nhiên.")
 
+    def encode_board(self, board: chess.Board):
+        """Token input của thế cờ theo input_mode của model."""
+        return encode_position(board, self.vocab, self.input_mode)
+
+    def _to_tensor(self, encoded):
+        input_tensor = torch.tensor(encoded, dtype=torch.long, device=self.device)
+        # Token PAD = 0 ở cả 2 input_mode
+        padding_mask = (input_tensor == 0)
+        return input_tensor, padding_mask
+
+    def predict_batch(self, encoded):
+        """1 forward pass cho cả batch input (từ encode_board) -> list xác suất (vocab_size,)."""
+        input_tensor, padding_mask = self._to_tensor(encoded)
+        apply_thread_budget(self.threads)
+
+        with torch.no_grad():
+            # TorchScript trace chỉ nhận tham số vị trí
+            logits = self.model(input_tensor, padding_mask)
+            probs = torch.softmax(logits, dim=1).cpu()
+
+        return list(probs.unbind(0))
+
+    def predict_batch_with_value(self, encoded):
+        """Như predict_batch nhưng kèm value [-1, 1] của value head (cùng 1 forward)."""
+        input_tensor, padding_mask = self._to_tensor(encoded)
+        apply_thread_budget(self.threads)
+
+        with torch.no_grad():
+            logits, values = self.model.forward_with_value(input_tensor, padding_mask)
+            probs = torch.softmax(logits, dim=1).cpu()
+
+        return list(zip(probs.unbind(0), values.cpu().tolist()))
+
     def choose_move(self, board: chess.Board):
         legal_moves = list(board.legal_moves)
         if not legal_moves:
@@ -35,13 +127,12 @@ class TransformerAgent(Agent):
         if not self.is_ready:
             return random.choice(legal_moves), {"type": "random_fallback"}
 
-        history = [m.uci() for m in board.move_stack]
-        
-        input_tensor, padding_mask = self.vocab.moves_to_tensor(history, self.device)
-        
-        with torch.no_grad():
-            logits = self.model(input_tensor, src_key_padding_mask=padding_mask)
-            probs = torch.softmax(logits, dim=1).squeeze(0) 
+        encoded = self.encode_board(board)
+
+        if self.inference_queue is not None:
+            probs = self.inference_queue.submit(encoded).result()
+        else:
+            probs = self.predict_batch([encoded])[0]
 
         sorted_indices = torch.argsort(probs, descending=True)
         
@@ -61,4 +152,10 @@ class TransformerAgent(Agent):
         if best_move is None:
             best_move = random.choice(legal_moves)
 
-        return best_move, {"type": "transformer", "prob": probs[self.vocab.encode(best_move.uci())].item()}
\ No newline at end of file
+        return best_move, {
+            "type": "transformer",
+            "quantized": self.quantized,
+            "input_mode": self.input_mode,
+            "batched": self.inference_queue is not None,
+            "prob": probs[self.vocab.encode(best_move.uci())].item(),
+        }
\ No newline at end of file
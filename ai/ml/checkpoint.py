@@ -0,0 +1,91 @@
+# ai/ml/checkpoint.py
+"""
+Định dạng checkpoint cho ChessTransformer.
+
+Format mới (dict):
+    {"format": "chess_transformer", "version": 2, "config": {...}, "state_dict": {...}}
+
+Format cũ: state_dict trần (chỉ có policy head, VD models/transformer_chess.pth).
+load_checkpoint đọc được cả hai; khi file cũ được load vào model có value head,
+value head giữ trọng số khởi tạo và chỉ các key "value_head.*" được phép thiếu.
+
+File .cwt (ai/ml/fast_format.py) cũng được nhận: không unpickle, tensor memmap.
+"""
+import os
+from typing import Any, Dict, Optional
+
+import torch
+
+from .model import ChessTransformer
+
+CHECKPOINT_FORMAT = "chess_transformer"
+CHECKPOINT_VERSION = 2
+
+
+def save_checkpoint(model: ChessTransformer, path: str, extra: Optional[Dict[str, Any]] = None) -> None:
+    payload = {
+        "format": CHECKPOINT_FORMAT,
+        "version": CHECKPOINT_VERSION,
+        "config": dict(model.config),
+        "state_dict": model.state_dict(),
+    }
+    if extra:
+        payload.update(extra)
+    # Ghi ra file tạm rồi rename: bị kill giữa chừng vẫn còn checkpoint cũ nguyên vẹn
+    tmp_path = path + ".tmp"
+    torch.save(payload, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def read_checkpoint(path: str, map_location="cpu") -> Dict[str, Any]:
+    """Đọc file -> dict format mới (file cũ được bọc lại, config = None)."""
+    if path.endswith(".cwt"):
+        from .fast_format import load_weights
+
+        state, metadata = load_weights(path)
+        return {"format": CHECKPOINT_FORMAT, "version": CHECKPOINT_VERSION,
+                "config": metadata.get("config"), "state_dict": state}
+    obj = torch.load(path, map_location=map_location)
+    if isinstance(obj, dict) and obj.get("format") == CHECKPOINT_FORMAT:
+        return obj
+    return {"format": CHECKPOINT_FORMAT, "version": 1, "config": None, "state_dict": obj}
+
+
+def load_checkpoint(
+    path: str,
+    vocab_size: Optional[int] = None,
+    map_location="cpu",
+    value_head: Optional[bool] = None,
+    **overrides,
+) -> ChessTransformer:
+    """
+    Tạo ChessTransformer từ checkpoint (cũ hoặc mới).
+    - vocab_size: bắt buộc với file cũ (không lưu config).
+    - value_head: None = theo checkpoint; True = luôn có value head.
+    """
+    if path.endswith(".cwt") and value_head is None and not overrides:
+        from .fast_format import load_model
+
+        return load_model(path, map_location)
+
+    ckpt = read_checkpoint(path, map_location)
+    config = dict(ckpt["config"] or {})
+    if not config:
+        if vocab_size is None:
+            raise ValueError(f"Legacy checkpoint {path} needs vocab_size")
+        config["vocab_size"] = vocab_size
+    config.update(overrides)
+    if value_head is not None:
+        config["value_head"] = value_head
+
+    model = ChessTransformer(**config)
+    missing, unexpected = model.load_state_dict(ckpt["state_dict"], strict=False)
+
+    # Chỉ value head được phép lệch giữa checkpoint và model
+    bad_missing = [k for k in missing if not k.startswith("value_head.")]
+    bad_unexpected = [k for k in unexpected if not k.startswith("value_head.")]
+    if bad_missing or bad_unexpected:
+        raise RuntimeError(
+            f"Checkpoint {path} does not match model: missing={bad_missing}, unexpected={bad_unexpected}"
+        )
+    return model.to(map_location)
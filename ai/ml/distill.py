@@ -0,0 +1,267 @@
+# ai/ml/distill.py
+"""
+Knowledge distillation: teacher ChessTransformer (6 layer, d_model 256) ->
+student nhỏ (mặc định 2 layer, d_model 128) cho tier "casual" cần độ trễ thấp.
+
+Loss = alpha * T^2 * KL(student/T || teacher/T) + (1 - alpha) * CE(student, nước thật)
+
+Sau khi train, tier_report() đo latency (batch 1, CPU, qua TransformerAgent như lúc chơi)
+và độ chính xác top-1 của teacher / student trên shard held-out (--eval-shards, build
+từ PGN không dùng để distill), ghi bảng ra models/distill_report.md và
+models/distill_report.json (ai.api.get_available_agents đọc file json này).
+
+Usage:
+    python -m ai.ml.distill --shards data/shards --eval-shards data/shards_eval \\
+        --teacher models/transformer_chess.pth --out models/transformer_student.pth --epochs 1 --workers 4
+"""
+import argparse
+import json
+import math
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import chess
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from torch.utils.data import DataLoader
+
+from .agent import TransformerAgent
+from .checkpoint import load_checkpoint, save_checkpoint
+from .model import ChessTransformer
+from .pgn_shards import ShardedCorpus
+from .train import PLY_STRIDE, LengthBucketBatchSampler, ShardSampleDataset, collate_left_pad
+from .utils import ChessVocabulary
+
+DEFAULT_STUDENT_PATH = "models/transformer_student.pth"
+DEFAULT_REPORT_PATH = "models/distill_report.json"
+STUDENT_CONFIG = {"d_model": 128, "nhead": 4, "num_layers": 2, "dim_feedforward": 512}
+
+
+def distillation_loss(
+    student_logits: torch.Tensor,
+    teacher_logits: torch.Tensor,
+    targets: torch.Tensor,
+    temperature: float = 2.0,
+    alpha: float = 0.7,
+) -> torch.Tensor:
+    soft = F.kl_div(
+        F.log_softmax(student_logits / temperature, dim=-1),
+        F.softmax(teacher_logits / temperature, dim=-1),
+        reduction="batchmean",
+    ) * (temperature ** 2)
+    hard = F.cross_entropy(student_logits, targets)
+    return alpha * soft + (1.0 - alpha) * hard
+
+
+def distill(
+    shard_dir: str,
+    teacher_path: str,
+    out_path: str = DEFAULT_STUDENT_PATH,
+    vocab_path: str = "models/vocab.pkl",
+    student_config: Optional[Dict] = None,
+    epochs: int = 1,
+    batch_size: int = 256,
+    lr: float = 5e-4,
+    temperature: float = 2.0,
+    alpha: float = 0.7,
+    workers: int = 4,
+    max_steps: Optional[int] = None,
+    seed: int = 0,
+) -> ChessTransformer:
+    torch.manual_seed(seed)
+    vocab = ChessVocabulary.load(vocab_path)
+
+    teacher = load_checkpoint(teacher_path, vocab_size=vocab.vocab_size).eval()
+    for p in teacher.parameters():
+        p.requires_grad_(False)
+
+    config = {**STUDENT_CONFIG, **(student_config or {})}
+    student = ChessTransformer(
+        vocab_size=vocab.vocab_size,
+        input_mode=teacher.input_mode,
+        max_seq_len=teacher.max_seq_len,
+        **config,
+    )
+
+    dataset = ShardSampleDataset(shard_dir, vocab, max_len=vocab.max_len, input_mode=teacher.input_mode)
+    sampler = LengthBucketBatchSampler(
+        shard_dir, batch_size, max_len=vocab.max_len, seed=seed, input_mode=teacher.input_mode
+    )
+    loader = DataLoader(
+        dataset,
+        batch_sampler=sampler,
+        collate_fn=collate_left_pad,
+        num_workers=workers,
+        prefetch_factor=4 if workers > 0 else None,
+        persistent_workers=workers > 0,
+    )
+
+    optimizer = torch.optim.AdamW(student.parameters(), lr=lr, weight_decay=0.01)
+    total = max_steps or epochs * len(sampler)
+    scheduler = torch.optim.lr_scheduler.LambdaLR(
+        optimizer, lambda s: max(0.05, 0.5 * (1.0 + math.cos(math.pi * min(1.0, s / max(1, total)))))
+    )
+
+    step = 0
+    for epoch in range(epochs):
+        sampler.set_epoch(epoch)
+        student.train()
+        t0 = time.time()
+        for inputs, mask, targets, _ in loader:
+            with torch.no_grad():
+                teacher_logits = teacher(inputs, mask)
+            loss = distillation_loss(student(inputs, mask), teacher_logits, targets, temperature, alpha)
+
+            optimizer.zero_grad(set_to_none=True)
+            loss.backward()
+            nn.utils.clip_grad_norm_(student.parameters(), 1.0)
+            optimizer.step()
+            scheduler.step()
+            step += 1
+
+            if step % 50 == 0:
+                print(f"[DISTILL] epoch {epoch} step {step} loss {loss.item():.4f} ({time.time() - t0:.0f}s)")
+            if max_steps and step >= max_steps:
+                break
+        save_checkpoint(student, out_path, extra={"distilled_from": os.path.basename(teacher_path)})
+        print(f"[DISTILL] Epoch {epoch} done -> {out_path}")
+        if max_steps and step >= max_steps:
+            break
+
+    return student.eval()
+
+
+# ============================================================
+# LATENCY / ACCURACY REPORT
+# ============================================================
+
+def report_samples(shard_dir: str, vocab: ChessVocabulary, positions: int, seed: int = 123) -> List[Tuple[chess.Board, int]]:
+    """`positions` thế cờ ngẫu nhiên (dựng lại từ shard) kèm nước thật tiếp theo."""
+    corpus = ShardedCorpus(shard_dir)
+    sampler = LengthBucketBatchSampler(shard_dir, 1, max_len=vocab.max_len, seed=seed)
+    samples = []
+    for batch in sampler:
+        game_idx, ply = divmod(batch[0], PLY_STRIDE)
+        game = corpus.game(game_idx)
+        board = chess.Board()
+        for token in game[:ply]:
+            board.push_uci(vocab.decode(int(token)))
+        samples.append((board, int(game[ply])))
+        if len(samples) >= positions:
+            break
+    return samples
+
+
+def tier_report(
+    agents: Dict[str, TransformerAgent],
+    shard_dir: str,
+    positions: int = 2000,
+    reference: Optional[str] = None,
+    seed: int = 123,
+) -> Dict[str, Dict[str, float]]:
+    """
+    Với mỗi agent: latency trung bình 1 nước (batch 1, qua đúng đường input của
+    TransformerAgent: encode_board + pad đủ max_len), params, top-1 accuracy so với nước thật
+    và tỉ lệ trùng top-1 với agent `reference` (thường là teacher).
+    `shard_dir` phải là shard KHÔNG dùng để train / distill (held-out).
+    """
+    vocab = next(iter(agents.values())).vocab
+    samples = report_samples(shard_dir, vocab, positions, seed)
+
+    preds: Dict[str, list] = {}
+    report: Dict[str, Dict[str, float]] = {}
+    for name, agent in agents.items():
+        correct, elapsed, out = 0, 0.0, []
+        for board, target in samples:
+            t0 = time.perf_counter()
+            probs = agent.predict_batch([agent.encode_board(board)])[0]
+            elapsed += time.perf_counter() - t0
+            pred = int(probs.argmax())
+            out.append(pred)
+            correct += int(pred == target)
+        preds[name] = out
+        report[name] = {
+            "params_m": sum(p.numel() for p in agent.model.parameters()) / 1e6,
+            "latency_ms": elapsed / max(1, len(samples)) * 1000,
+            "top1_acc": correct / max(1, len(samples)),
+        }
+
+    if reference in preds:
+        for name in agents:
+            agree = sum(a == b for a, b in zip(preds[name], preds[reference]))
+            report[name]["agreement"] = agree / max(1, len(samples))
+    return report
+
+
+def format_report(report: Dict[str, Dict[str, float]]) -> str:
+    lines = [
+        "| Model | Params (M) | Latency (ms/move) | Top-1 acc | Agreement w/ teacher |",
+        "|---|---|---|---|---|",
+    ]
+    for name, r in report.items():
+        agreement = f"{r['agreement']:.3f}" if "agreement" in r else "-"
+        lines.append(
+            f"| {name} | {r['params_m']:.2f} | {r['latency_ms']:.2f} | {r['top1_acc']:.3f} | {agreement} |"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distill ChessTransformer -> small student")
+    parser.add_argument("--shards", required=True)
+    parser.add_argument("--eval-shards", required=True, help="shard held-out cho report (không trùng --shards)")
+    parser.add_argument("--teacher", default="models/transformer_chess.pth")
+    parser.add_argument("--out", default=DEFAULT_STUDENT_PATH)
+    parser.add_argument("--vocab", default="models/vocab.pkl")
+    parser.add_argument("--layers", type=int, default=STUDENT_CONFIG["num_layers"])
+    parser.add_argument("--d-model", type=int, default=STUDENT_CONFIG["d_model"])
+    parser.add_argument("--epochs", type=int, default=1)
+    parser.add_argument("--max-steps", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--lr", type=float, default=5e-4)
+    parser.add_argument("--temperature", type=float, default=2.0)
+    parser.add_argument("--alpha", type=float, default=0.7)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--report-positions", type=int, default=2000)
+    parser.add_argument("--report", default=DEFAULT_REPORT_PATH)
+    args = parser.parse_args()
+    if os.path.realpath(args.eval_shards) == os.path.realpath(args.shards):
+        parser.error("--eval-shards must be held out from the distillation shards")
+
+    distill(
+        args.shards,
+        args.teacher,
+        args.out,
+        vocab_path=args.vocab,
+        student_config={"num_layers": args.layers, "d_model": args.d_model},
+        epochs=args.epochs,
+        batch_size=args.batch_size,
+        lr=args.lr,
+        temperature=args.temperature,
+        alpha=args.alpha,
+        workers=args.workers,
+        max_steps=args.max_steps,
+    )
+
+    # Đo đúng model như tier sẽ chạy: TransformerAgent load từ file (checkpoint float)
+    agents = {
+        name: TransformerAgent(model_path=path, vocab_path=args.vocab, use_quantized=False)
+        for name, path in (("teacher", args.teacher), ("student", args.out))
+    }
+    missing = [name for name, agent in agents.items() if not agent.is_ready]
+    if missing:
+        raise SystemExit(f"[DISTILL] Cannot load {', '.join(missing)} for the report")
+    report = tier_report(agents, args.eval_shards, args.report_positions, reference="teacher")
+    table = format_report(report)
+    print(table)
+
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    with open(os.path.splitext(args.report)[0] + ".md", "w", encoding="utf-8") as f:
+        f.write(table + "\n")
+
+
+if __name__ == "__main__":
+    main()
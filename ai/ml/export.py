@@ -0,0 +1,176 @@
+# ai/ml/export.py
+"""
+Export ChessTransformer sang artifact int8 + TorchScript cho máy chỉ có CPU.
+
+- Dynamic quantization: các nn.Linear (FFN + fc_out) chạy int8.
+- TorchScript trace: bỏ overhead Python eager, load lại bằng torch.jit.load
+  mà không cần class ChessTransformer.
+- Parity check: so sánh nước đi top-1 (hợp lệ) giữa bản fp32 và bản int8.
+
+Usage:
+    python -m ai.ml.export --model models/transformer_chess.pth --vocab models/vocab.pkl
+"""
+import argparse
+import json
+import random
+import time
+from typing import List, Optional, Sequence
+
+import chess
+import torch
+import torch.nn as nn
+
+from .checkpoint import load_checkpoint
+from .utils import ChessVocabulary, encode_position
+
+DEFAULT_MODEL_PATH = "models/transformer_chess.pth"
+DEFAULT_VOCAB_PATH = "models/vocab.pkl"
+DEFAULT_QUANTIZED_PATH = "models/transformer_chess_int8.pt"
+DEFAULT_PARITY_THRESHOLD = 0.90
+
+
+def quantize_model(model: nn.Module) -> nn.Module:
+    """Dynamic int8 quantization cho các lớp Linear (chỉ chạy trên CPU)."""
+    model = model.to("cpu").eval()
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+def trace_model(model: nn.Module, vocab: ChessVocabulary) -> torch.jit.ScriptModule:
+    """
+    Trace model với input mẫu (batch 1, độ dài max_len).
+    Fast path của MultiheadAttention không hỗ trợ Linear đã quantize nên phải
+    tắt nó trong lúc trace; graph thu được luôn đi nhánh thường.
+    """
+    board = chess.Board()
+    board.push_uci("e2e4")
+    example_input = torch.tensor([encode_position(board, vocab, model.input_mode)], dtype=torch.long)
+    example_mask = example_input == 0
+    fastpath = torch.backends.mha.get_fastpath_enabled()
+    torch.backends.mha.set_fastpath_enabled(False)
+    try:
+        with torch.no_grad():
+            traced = torch.jit.trace(model, (example_input, example_mask), check_trace=False)
+    finally:
+        torch.backends.mha.set_fastpath_enabled(fastpath)
+    return traced
+
+
+def export_quantized(
+    model_path: str = DEFAULT_MODEL_PATH,
+    vocab_path: str = DEFAULT_VOCAB_PATH,
+    out_path: str = DEFAULT_QUANTIZED_PATH,
+) -> torch.jit.ScriptModule:
+    vocab = ChessVocabulary.load(vocab_path)
+    model = load_checkpoint(model_path, vocab_size=vocab.vocab_size).eval()
+
+    traced = trace_model(quantize_model(model), vocab)
+    # Lưu kèm config để TransformerAgent biết input_mode khi load bằng torch.jit.load
+    traced.save(out_path, _extra_files={"config.json": json.dumps(model.config)})
+    print(f"[EXPORT] Saved int8 TorchScript model -> {out_path}")
+    return traced
+
+
+# ============================================================
+# PARITY CHECK
+# ============================================================
+
+def sample_histories(num_positions: int, max_plies: int = 60, seed: int = 0) -> List[List[str]]:
+    """Sinh lịch sử nước đi bằng các ván random (có seed) để so sánh 2 model."""
+    rng = random.Random(seed)
+    histories: List[List[str]] = []
+    while len(histories) < num_positions:
+        board = chess.Board()
+        for _ in range(rng.randint(0, max_plies)):
+            moves = list(board.legal_moves)
+            if not moves:
+                break
+            board.push(rng.choice(moves))
+        if not board.is_game_over():
+            histories.append([m.uci() for m in board.move_stack])
+    return histories
+
+
+def top1_legal_move(logits: torch.Tensor, vocab: ChessVocabulary, board: chess.Board) -> Optional[str]:
+    legal = {m.uci() for m in board.legal_moves}
+    for idx in torch.argsort(logits, descending=True).tolist():
+        uci = vocab.decode(idx)
+        if uci in legal:
+            return uci
+    return None
+
+
+def parity_check(
+    reference: nn.Module,
+    candidate: nn.Module,
+    vocab: ChessVocabulary,
+    histories: Sequence[List[str]],
+    threshold: float = DEFAULT_PARITY_THRESHOLD,
+    input_mode: str = "moves",
+) -> dict:
+    """
+    Tỉ lệ trùng nước đi top-1 hợp lệ giữa reference (fp32) và candidate (int8).
+    Trả về dict gồm agreement, passed và latency trung bình mỗi model.
+    """
+    device = torch.device("cpu")
+    agree = 0
+    ref_time = cand_time = 0.0
+
+    with torch.no_grad():
+        for history in histories:
+            board = chess.Board()
+            for uci in history:
+                board.push_uci(uci)
+            x = torch.tensor([encode_position(board, vocab, input_mode)], dtype=torch.long, device=device)
+            mask = x == 0
+
+            t0 = time.perf_counter()
+            ref_logits = reference(x, src_key_padding_mask=mask)[0]
+            t1 = time.perf_counter()
+            cand_logits = candidate(x, mask)[0]
+            t2 = time.perf_counter()
+            ref_time += t1 - t0
+            cand_time += t2 - t1
+
+            if top1_legal_move(ref_logits, vocab, board) == top1_legal_move(cand_logits, vocab, board):
+                agree += 1
+
+    n = max(len(histories), 1)
+    agreement = agree / n
+    return {
+        "positions": len(histories),
+        "agreement": agreement,
+        "threshold": threshold,
+        "passed": agreement >= threshold,
+        "ref_ms": ref_time / n * 1000,
+        "quantized_ms": cand_time / n * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export ChessTransformer -> int8 TorchScript")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--vocab", default=DEFAULT_VOCAB_PATH)
+    parser.add_argument("--out", default=DEFAULT_QUANTIZED_PATH)
+    parser.add_argument("--positions", type=int, default=500)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_PARITY_THRESHOLD)
+    args = parser.parse_args()
+
+    traced = export_quantized(args.model, args.vocab, args.out)
+
+    vocab = ChessVocabulary.load(args.vocab)
+    reference = load_checkpoint(args.model, vocab_size=vocab.vocab_size).eval()
+
+    report = parity_check(
+        reference, traced, vocab, sample_histories(args.positions), args.threshold, reference.input_mode
+    )
+    print(
+        f"[PARITY] top-1 agreement {report['agreement']:.3f} "
+        f"(threshold {report['threshold']:.2f}) | "
+        f"fp32 {report['ref_ms']:.2f}ms vs int8 {report['quantized_ms']:.2f}ms"
+    )
+    if not report["passed"]:
+        raise SystemExit("[PARITY] FAILED: quantized model diverges too much from fp32")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+# ai/ml/fast_format.py
+"""
+Định dạng file load nhanh cho vocab và trọng số (thay joblib pickle / torch.load).
+
+Vocab (.bin):
+    magic "CVOCAB01" | u32 count | u32 max_len | u32 offsets[count + 1] | utf-8 blob
+    token id i = blob[offsets[i]:offsets[i + 1]]
+
+Weights (.cwt, kiểu safetensors):
+    u64 header_len | JSON header | padding | raw tensor data (mỗi tensor căn 64 byte)
+    header = {"__metadata__": {"config": {...}}, "<name>": {"dtype", "shape", "offsets": [start, end]}}
+    Load bằng np.memmap (copy-on-write) -> torch.from_numpy: không copy, không unpickle;
+    load_state_dict(assign=True) gắn thẳng tensor memmap vào model.
+
+Usage (convert file cũ):
+    python -m ai.ml.fast_format --vocab models/vocab.pkl --model models/transformer_chess.pth
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import struct
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import torch
+
+VOCAB_MAGIC = b"CVOCAB01"
+ALIGN = 64
+
+# Tên dtype torch (str(dtype) bỏ "torch.") -> (mã trong header, dtype numpy)
+_DTYPES = {
+    "float32": ("F32", np.float32),
+    "float16": ("F16", np.float16),
+    "int64": ("I64", np.int64),
+    "int32": ("I32", np.int32),
+    "int16": ("I16", np.int16),
+    "int8": ("I8", np.int8),
+    "uint8": ("U8", np.uint8),
+    "bool": ("BOOL", np.bool_),
+}
+_NP_BY_CODE = {code: np_dtype for code, np_dtype in _DTYPES.values()}
+
+
+def fast_path(path: str, ext: str) -> str:
+    """models/vocab.pkl -> models/vocab.bin, models/x.pth -> models/x.cwt"""
+    return os.path.splitext(path)[0] + ext
+
+
+# ============================================================
+# 1. VOCAB
+# ============================================================
+
+def save_vocab_table(vocab, path: str) -> None:
+    tokens = [vocab.itos[i].encode("utf-8") for i in range(vocab.vocab_size)]
+    offsets = np.zeros(len(tokens) + 1, dtype=np.uint32)
+    offsets[1:] = np.cumsum([len(t) for t in tokens])
+    with open(path, "wb") as f:
+        f.write(VOCAB_MAGIC)
+        f.write(struct.pack("<II", len(tokens), vocab.max_len))
+        f.write(offsets.tobytes())
+        f.write(b"".join(tokens))
+
+
+def load_vocab_table(path: str):
+    from .utils import ChessVocabulary
+
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:8] != VOCAB_MAGIC:
+        raise ValueError(f"{path} is not a vocab table")
+    count, max_len = struct.unpack_from("<II", data, 8)
+    offsets = np.frombuffer(data, dtype=np.uint32, count=count + 1, offset=16)
+    blob = data[16 + offsets.nbytes:].decode("utf-8")
+
+    vocab = ChessVocabulary(max_len=max_len)
+    if blob.isascii():
+        # UCI toàn ASCII: offset byte == offset ký tự, cắt thẳng trên str
+        itos = [blob[offsets[i]:offsets[i + 1]] for i in range(count)]
+    else:
+        raw = blob.encode("utf-8")
+        itos = [raw[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(count)]
+    vocab.itos = dict(enumerate(itos))
+    vocab.stoi = {s: i for i, s in enumerate(itos)}
+    vocab.vocab_size = count
+    return vocab
+
+
+# ============================================================
+# 2. WEIGHTS
+# ============================================================
+
+def save_weights(state_dict: Dict[str, torch.Tensor], path: str, config: Optional[dict] = None) -> None:
+    header: Dict[str, dict] = {"__metadata__": {"config": config or {}}}
+    blobs = []
+    pos = 0
+    for name, tensor in state_dict.items():
+        tensor = tensor.detach().cpu().contiguous()
+        code, _ = _DTYPES[str(tensor.dtype).replace("torch.", "")]
+        raw = tensor.numpy().tobytes()
+        pad = (-pos) % ALIGN
+        pos += pad
+        blobs.append((pad, raw))
+        header[name] = {"dtype": code, "shape": list(tensor.shape), "offsets": [pos, pos + len(raw)]}
+        pos += len(raw)
+
+    header_bytes = json.dumps(header).encode("utf-8")
+    # Căn phần data về bội số ALIGN tính từ đầu file
+    header_bytes += b" " * ((-(8 + len(header_bytes))) % ALIGN)
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        for pad, raw in blobs:
+            f.write(b"\0" * pad)
+            f.write(raw)
+    os.replace(tmp, path)
+
+
+def load_weights(path: str) -> Tuple[Dict[str, torch.Tensor], dict]:
+    """-> (state_dict gồm tensor trỏ thẳng vào memmap, metadata)."""
+    import torch
+
+    with open(path, "rb") as f:
+        (header_len,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(header_len))
+    data_start = 8 + header_len
+
+    # mode "c": copy-on-write -> tensor ghi được nhưng trang chỉ copy khi bị sửa
+    mm = np.memmap(path, dtype=np.uint8, mode="c", offset=data_start)
+    metadata = header.pop("__metadata__", {})
+    state: Dict[str, torch.Tensor] = {}
+    for name, info in header.items():
+        start, end = info["offsets"]
+        arr = mm[start:end].view(_NP_BY_CODE[info["dtype"]]).reshape(info["shape"])
+        state[name] = torch.from_numpy(arr)
+    return state, metadata
+
+
+def save_model(model, path: str) -> None:
+    save_weights(model.state_dict(), path, config=dict(model.config))
+
+
+def load_model(path: str, map_location="cpu"):
+    from .model import ChessTransformer
+
+    state, metadata = load_weights(path)
+    config = metadata.get("config") or {}
+    # Không dựng trên device "meta": init normal_ trên meta kéo theo import torch._dynamo (~1.5s)
+    model = ChessTransformer(**config)
+    model.load_state_dict(state, assign=True)
+    return model.to(map_location)
+
+
+def convert(vocab_path: Optional[str], model_path: Optional[str], vocab_size: Optional[int] = None) -> None:
+    """Chuyển vocab.pkl -> vocab.bin và checkpoint .pth (cũ hoặc mới) -> .cwt cạnh file gốc."""
+    from .checkpoint import load_checkpoint
+    from .utils import ChessVocabulary
+
+    if vocab_path:
+        vocab = ChessVocabulary.load(vocab_path)
+        vocab_size = vocab.vocab_size
+        out = fast_path(vocab_path, ".bin")
+        save_vocab_table(vocab, out)
+        print(f"[CONVERT] {vocab_path} -> {out}")
+
+    if model_path:
+        model = load_checkpoint(model_path, vocab_size=vocab_size)
+        out = fast_path(model_path, ".cwt")
+        save_model(model, out)
+        print(f"[CONVERT] {model_path} -> {out}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert vocab/weights to fast-loading formats")
+    parser.add_argument("--vocab", default="models/vocab.pkl")
+    parser.add_argument("--model", default=None)
+    args = parser.parse_args()
+    convert(args.vocab, args.model)
+
+
+if __name__ == "__main__":
+    main()
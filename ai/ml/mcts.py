@@ -0,0 +1,322 @@
+# ai/ml/mcts.py
+"""
+MCTS (PUCT) dùng ChessTransformer làm policy prior.
+
+- Prior P(s, a): softmax của ChessTransformer, chuẩn hoá lại trên các nước hợp lệ.
+- Virtual loss: mỗi vòng chọn tối đa `batch_size` lá khác nhau, đánh giá
+  tất cả trong MỘT forward pass (hoặc qua BatchInferenceQueue dùng chung).
+- Value ở lá (theo góc nhìn bên tới lượt, trong [-1, 1]), theo thứ tự ưu tiên:
+  value_fn truyền vào (có evaluate_batch thì gọi theo batch), value head của
+  model (cùng forward với policy), cuối cùng là eval minimax squash bằng tanh.
+- Budget theo số node và/hoặc thời gian; cây được giữ lại giữa các nước đi.
+"""
+from __future__ import annotations
+
+import math
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import chess
+
+from ai.agent_base import Agent
+from ai.minimax.eval import evaluate
+
+ValueFn = Callable[[chess.Board], float]
+
+
+def material_value(board: chess.Board) -> float:
+    """Value mặc định: eval minimax (cp, góc nhìn trắng) -> [-1, 1] theo bên tới lượt."""
+    cp = evaluate(board)
+    if board.turn == chess.BLACK:
+        cp = -cp
+    return math.tanh(cp / 600.0)
+
+
+def terminal_value(board: chess.Board) -> Optional[float]:
+    """-1 nếu bên tới lượt bị chiếu hết, 0 nếu hoà, None nếu ván chưa kết thúc."""
+    if board.is_checkmate():
+        return -1.0
+    if board.is_game_over(claim_draw=False):
+        return 0.0
+    return None
+
+
+class MCTSNode:
+    __slots__ = ("parent", "move", "prior", "children", "visits", "value_sum", "terminal", "expanded")
+
+    def __init__(self, parent: Optional["MCTSNode"], move: Optional[chess.Move], prior: float):
+        self.parent = parent
+        self.move = move
+        self.prior = prior
+        self.children: List[MCTSNode] = []
+        self.visits = 0.0
+        # Tổng value theo góc nhìn người vừa đi nước `move` (tức bên tới lượt ở parent)
+        self.value_sum = 0.0
+        self.terminal: Optional[float] = None
+        self.expanded = False
+
+    def q(self) -> float:
+        return self.value_sum / self.visits if self.visits > 0 else 0.0
+
+    def best_child(self) -> Optional["MCTSNode"]:
+        if not self.children:
+            return None
+        return max(self.children, key=lambda c: c.visits)
+
+
+class MCTSAgent(Agent):
+    name = "MCTS"
+
+    def __init__(
+        self,
+        model_path: str = "models/transformer_chess.pth",
+        vocab_path: str = "models/vocab.pkl",
+        quantized_path: str = "models/transformer_chess_int8.pt",
+        use_quantized: bool = True,
+        max_nodes: int = 800,
+        time_limit_ms: Optional[int] = None,
+        c_puct: float = 1.5,
+        batch_size: int = 16,
+        virtual_loss: float = 1.0,
+        reuse_tree: bool = True,
+        value_fn: Optional[ValueFn] = None,
+        net=None,
+        inference_queue=None,
+        threads: Optional[int] = None,
+    ):
+        if net is None:
+            from .agent import TransformerAgent
+
+            net = TransformerAgent(
+                model_path=model_path,
+                vocab_path=vocab_path,
+                quantized_path=quantized_path,
+                use_quantized=use_quantized,
+                threads=threads,
+            )
+        self.net = net
+        self.inference_queue = inference_queue
+        self.value_fn: Optional[ValueFn] = value_fn
+
+        self.max_nodes = max(1, int(max_nodes))
+        self.time_limit_ms = time_limit_ms
+        self.c_puct = c_puct
+        self.batch_size = max(1, int(batch_size))
+        self.virtual_loss = virtual_loss
+        self.reuse_tree = reuse_tree
+
+        # Cây giữ lại giữa các nước đi
+        self._root: Optional[MCTSNode] = None
+        self._root_fen: Optional[str] = None
+
+    # --------- Network ----------
+
+    def _use_net_value(self) -> bool:
+        return (
+            self.value_fn is None
+            and self.inference_queue is None
+            and self.net.is_ready
+            and getattr(self.net, "has_value_head", False)
+        )
+
+    def _encode(self, board: chess.Board):
+        return self.net.encode_board(board) if self.net.is_ready else None
+
+    def _predict(self, encoded: List[Any]) -> List[Tuple[Any, Optional[float]]]:
+        """-> [(probs | None, value | None)] cho mỗi input (từ net.encode_board)."""
+        if not self.net.is_ready:
+            return [(None, None)] * len(encoded)
+        if self._use_net_value():
+            return self.net.predict_batch_with_value(encoded)
+        if self.inference_queue is not None:
+            futures = [self.inference_queue.submit(e) for e in encoded]
+            return [(f.result(), None) for f in futures]
+        return [(p, None) for p in self.net.predict_batch(encoded)]
+
+    def _leaf_value(self, board: chess.Board) -> Optional[float]:
+        """Value tính ngay lúc chọn lá; None = chờ batch (value head / evaluate_batch)."""
+        if self._use_net_value():
+            return None
+        if self.value_fn is None:
+            return material_value(board)
+        if hasattr(self.value_fn, "evaluate_batch"):
+            return None
+        return self.value_fn(board)
+
+    def _priors(self, probs, moves: List[chess.Move]) -> List[float]:
+        if probs is None:
+            return [1.0 / len(moves)] * len(moves)
+        vocab = self.net.vocab
+        raw = [float(probs[vocab.encode(m.uci())]) for m in moves]
+        total = sum(raw)
+        if total <= 0:
+            return [1.0 / len(moves)] * len(moves)
+        return [p / total for p in raw]
+
+    # --------- Tree reuse ----------
+
+    def _take_root(self, board: chess.Board) -> MCTSNode:
+        fen = board.fen()
+        root = self._root if self.reuse_tree else None
+
+        if root is not None and self._root_fen != fen:
+            # Thử đi xuống 1 ply (nước đối thủ vừa đi)
+            prev = chess.Board(self._root_fen)
+            found = None
+            for child in root.children:
+                prev.push(child.move)
+                if prev.fen() == fen:
+                    found = child
+                prev.pop()
+                if found is not None:
+                    break
+            root = found
+
+        if root is None:
+            root = MCTSNode(None, None, 1.0)
+        root.parent = None
+        return root
+
+    def _promote(self, root: MCTSNode, child: Optional[MCTSNode], board: chess.Board, move: chess.Move):
+        if not self.reuse_tree or child is None:
+            self._root, self._root_fen = None, None
+            return
+        board.push(move)
+        self._root, self._root_fen = child, board.fen()
+        board.pop()
+
+    # --------- Search ----------
+
+    def _select_child(self, node: MCTSNode) -> MCTSNode:
+        sqrt_n = math.sqrt(max(node.visits, 1.0))
+        best, best_score = None, -math.inf
+        for child in node.children:
+            u = self.c_puct * child.prior * sqrt_n / (1.0 + child.visits)
+            score = child.q() + u
+            if score > best_score:
+                best, best_score = child, score
+        return best
+
+    def _apply_virtual_loss(self, path: List[MCTSNode], sign: float):
+        for node in path:
+            node.visits += sign * self.virtual_loss
+            node.value_sum -= sign * self.virtual_loss
+
+    @staticmethod
+    def _backup(path: List[MCTSNode], leaf_value: float):
+        # leaf_value theo góc nhìn bên tới lượt ở lá -> với người vừa đi vào lá là -leaf_value
+        value = -leaf_value
+        for node in reversed(path):
+            node.visits += 1
+            node.value_sum += value
+            value = -value
+
+    def _expand(self, node: MCTSNode, moves: List[chess.Move], probs):
+        node.children = [MCTSNode(node, m, p) for m, p in zip(moves, self._priors(probs, moves))]
+        node.expanded = True
+
+    def _search(self, root: MCTSNode, board: chess.Board, deadline: Optional[float]) -> int:
+        nodes = 0
+
+        if not root.expanded:
+            probs, _ = self._predict([self._encode(board)])[0]
+            self._expand(root, list(board.legal_moves), probs)
+
+        while nodes < self.max_nodes:
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+
+            pending: List[Tuple[MCTSNode, List[MCTSNode], List[chess.Move], Optional[float], Any]] = []
+            deferred_boards: List[chess.Board] = []
+            pending_ids = set()
+
+            for _ in range(min(self.batch_size, self.max_nodes - nodes)):
+                node, path, line = root, [root], []
+                while node.expanded and node.terminal is None and node.children:
+                    node = self._select_child(node)
+                    path.append(node)
+                    line.append(node.move)
+                    board.push(node.move)
+
+                try:
+                    if node.terminal is None:
+                        node.terminal = terminal_value(board)
+                    if node.terminal is not None:
+                        self._backup(path, node.terminal)
+                        nodes += 1
+                        continue
+                    if id(node) in pending_ids:
+                        # Lá này đã được chọn trong batch -> dừng gom, tránh đánh giá trùng
+                        break
+
+                    pending_ids.add(id(node))
+                    self._apply_virtual_loss(path, +1.0)
+                    value = self._leaf_value(board)
+                    if value is None and self.value_fn is not None:
+                        deferred_boards.append(board.copy())
+                    pending.append((
+                        node,
+                        path,
+                        list(board.legal_moves),
+                        value,
+                        self._encode(board),
+                    ))
+                finally:
+                    for _ in line:
+                        board.pop()
+
+            if not pending:
+                continue
+
+            outputs = self._predict([p[4] for p in pending])
+            if deferred_boards:
+                # value_fn hỗ trợ batch (VD NeuralEvaluator): 1 lần gọi cho cả loạt lá
+                batch_values = iter(self.value_fn.evaluate_batch(deferred_boards))
+            for (node, path, moves, value, _), (probs, net_value) in zip(pending, outputs):
+                if value is None:
+                    value = net_value if net_value is not None else next(batch_values)
+                self._apply_virtual_loss(path, -1.0)
+                self._expand(node, moves, probs)
+                self._backup(path, value)
+            nodes += len(pending)
+
+        return nodes
+
+    def _principal_variation(self, root: MCTSNode, max_len: int = 10) -> List[str]:
+        pv, node = [], root
+        while node.children and len(pv) < max_len:
+            node = node.best_child()
+            if node is None or node.visits <= 0:
+                break
+            pv.append(node.move.uci())
+        return pv
+
+    def choose_move(self, board: chess.Board) -> Tuple[Optional[chess.Move], Dict[str, Any]]:
+        legal_moves = list(board.legal_moves)
+        if not legal_moves:
+            return None, {}
+
+        start = time.monotonic()
+        deadline = start + self.time_limit_ms / 1000.0 if self.time_limit_ms else None
+
+        root = self._take_root(board)
+        reused = root.visits
+        nodes = self._search(root, board, deadline)
+
+        best = root.best_child()
+        move = best.move if best is not None else legal_moves[0]
+        value = best.q() if best is not None else 0.0
+        info: Dict[str, Any] = {
+            "agent": "mcts",
+            "nodes": nodes,
+            "reused_visits": int(reused),
+            "visits": int(best.visits) if best is not None else 0,
+            "value": value,
+            # Quy đổi value [-1, 1] -> thang centipawn cho UI/telemetry
+            "score": int(600 * math.atanh(max(-0.999, min(0.999, value)))),
+            "pv": self._principal_variation(root),
+            "time_ms": int((time.monotonic() - start) * 1000),
+        }
+
+        self._promote(root, best, board, move)
+        return move, info
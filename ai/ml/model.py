@@ -3,6 +3,8 @@ import torch
 import torch.nn as nn
 import math
 
+from .utils import ChessBoardEncoder
+
 def get_sinusoidal_positional_encoding(max_seq_len: int, d_model: int, device=None):
     pe = torch.zeros(max_seq_len, d_model, device=device)
     position = torch.arange(0, max_seq_len, dtype=torch.float).unsqueeze(1)
@@ -12,9 +14,40 @@ def get_sinusoidal_positional_encoding(max_seq_len: int, d_model: int, device=No
     return pe.unsqueeze(0)  # (1, seq_len, d_model)
 
 class ChessTransformer(nn.Module):
-    def __init__(self, vocab_size, d_model=256, nhead=8, num_layers=6, max_seq_len=80, dropout=0.1):
+    def __init__(
+        self,
+        vocab_size,
+        d_model=256,
+        nhead=8,
+        num_layers=6,
+        max_seq_len=80,
+        dropout=0.1,
+        dim_feedforward=1024,
+        value_head=False,
+        input_mode="moves",
+        input_vocab_size=None,
+    ):
         super().__init__()
-        self.embedding = nn.Embedding(vocab_size, d_model)
+        if input_mode == "board":
+            input_vocab_size = input_vocab_size or ChessBoardEncoder.VOCAB_SIZE
+            max_seq_len = max(max_seq_len, ChessBoardEncoder.SEQ_LEN)
+        # Lưu lại cấu hình để ghi vào checkpoint (xem ai/ml/checkpoint.py)
+        self.config = {
+            "vocab_size": vocab_size,
+            "d_model": d_model,
+            "nhead": nhead,
+            "num_layers": num_layers,
+            "max_seq_len": max_seq_len,
+            "dropout": dropout,
+            "dim_feedforward": dim_feedforward,
+            "value_head": value_head,
+            "input_mode": input_mode,
+            "input_vocab_size": input_vocab_size,
+        }
+        # input_mode: "moves" = lịch sử nước đi (token = vocab nước đi)
+        #             "board" = ChessBoardEncoder (64 + 7 token, vocab riêng)
+        self.input_mode = input_mode
+        self.embedding = nn.Embedding(input_vocab_size or vocab_size, d_model)
         self.d_model = d_model
         self.max_seq_len = max_seq_len
         
@@ -27,7 +60,7 @@ class ChessTransformer(nn.Module):
         encoder_layer = nn.TransformerEncoderLayer(
             d_model=d_model, 
             nhead=nhead, 
-            dim_feedforward=1024, 
+            dim_feedforward=dim_feedforward, 
             dropout=dropout, 
             batch_first=True,
             activation='gelu'  # small bonus
@@ -36,6 +69,16 @@ class ChessTransformer(nn.Module):
         
         self.dropout = nn.Dropout(dropout)
         self.fc_out = nn.Linear(d_model, vocab_size)
+
+        # Value head (tuỳ chọn): đánh giá thế cờ trong [-1, 1] theo bên tới lượt
+        self.value_head = None
+        if value_head:
+            self.value_head = nn.Sequential(
+                nn.Linear(d_model, d_model // 2),
+                nn.GELU(),
+                nn.Linear(d_model // 2, 1),
+                nn.Tanh(),
+            )
         
         # Weight initialization (helps a lot)
         self._init_weights()
@@ -46,20 +89,30 @@ class ChessTransformer(nn.Module):
         self.fc_out.bias.data.zero_()
         self.fc_out.weight.data.uniform_(-initrange, initrange)
 
-    def forward(self, x, src_key_padding_mask=None):
+    def encode(self, x, src_key_padding_mask=None):
         seq_len = x.size(1)
         
         x = self.embedding(x) * math.sqrt(self.d_model)
         
         # Add positional encoding (automatically broadcasts)
-        x = x + self.pos_encoding[:, :seq_len, :]
+        # "moves": input left-pad, token cuối luôn ở vị trí max_seq_len - 1 như lúc inference
+        # (encode_history pad đủ max_len) -> batch train ngắn hơn (length bucketing) cùng vị trí
+        start = self.max_seq_len - seq_len if self.input_mode == "moves" else 0
+        x = x + self.pos_encoding[:, start:start + seq_len, :]
         
         x = self.dropout(x)
         
         x = self.transformer_encoder(x, src_key_padding_mask=src_key_padding_mask)
         
         # Predict next move from the LAST token
-        x = x[:, -1, :] 
-        
-        x = self.fc_out(x)
-        return x
\ No newline at end of file
+        return x[:, -1, :] 
+
+    def forward(self, x, src_key_padding_mask=None):
+        return self.fc_out(self.encode(x, src_key_padding_mask))
+
+    def forward_with_value(self, x, src_key_padding_mask=None):
+        """(policy logits, value (B,)) từ cùng 1 lần chạy encoder."""
+        if self.value_head is None:
+            raise RuntimeError("ChessTransformer was built without a value head")
+        h = self.encode(x, src_key_padding_mask)
+        return self.fc_out(h), self.value_head(h).squeeze(-1)
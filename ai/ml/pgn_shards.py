@@ -0,0 +1,296 @@
+# ai/ml/pgn_shards.py
+"""
+Pipeline PGN -> token shards (int16) cho việc train ChessTransformer.
+
+- Đọc PGN theo kiểu streaming (từng dòng, hỗ trợ .pgn / .pgn.gz / .pgn.bz2),
+  tách thành text từng ván mà không parse ở process chính.
+- Pool nhiều process parse + encode bằng ChessVocabulary; luôn chỉ có tối đa
+  2 batch ván đang xử lý nên RAM không phụ thuộc kích thước file.
+- Mỗi shard gồm:
+    shard_00000.tokens.int16   token nước đi nối liền (np.int16, raw)
+    shard_00000.index.npy      offsets int64 (n_games + 1), ván i = tokens[off[i]:off[i+1]]
+    shard_00000.results.npy    kết quả int8 theo góc nhìn trắng (1 / 0 / -1)
+  cùng manifest.json mô tả toàn bộ thư mục.
+- Đọc lại bằng np.memmap (TokenShard / ShardedCorpus), không cần parse PGN nữa.
+
+Usage:
+    python -m ai.ml.pgn_shards games.pgn.gz --out data/shards --workers 8
+"""
+import argparse
+import bz2
+import gzip
+import io
+import json
+import os
+import time
+from multiprocessing import Pool
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .utils import ChessVocabulary
+
+TOKEN_DTYPE = np.int16
+MANIFEST_NAME = "manifest.json"
+RESULT_CODES = {"1-0": 1, "0-1": -1, "1/2-1/2": 0}
+
+# Vocab của từng worker process (set trong _init_worker)
+_worker_vocab: Optional[ChessVocabulary] = None
+
+
+# ============================================================
+# 1. STREAMING PGN READER
+# ============================================================
+
+def open_text(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, "r", encoding="utf-8", errors="replace")
+
+
+def iter_game_texts(path: str) -> Iterator[str]:
+    """Yield text PGN của từng ván; chỉ giữ 1 ván trong bộ nhớ tại một thời điểm."""
+    lines: List[str] = []
+    seen_moves = False
+    with open_text(path) as f:
+        for line in f:
+            if line.startswith("[Event ") and seen_moves:
+                yield "".join(lines)
+                lines = []
+                seen_moves = False
+            lines.append(line)
+            if line.strip() and not line.startswith("["):
+                seen_moves = True
+    if lines and seen_moves:
+        yield "".join(lines)
+
+
+def _batched(it: Iterator[str], size: int) -> Iterator[List[str]]:
+    batch: List[str] = []
+    for item in it:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# ============================================================
+# 2. WORKER: PARSE + ENCODE
+# ============================================================
+
+def _init_worker(vocab_path: str) -> None:
+    global _worker_vocab
+    _worker_vocab = ChessVocabulary.load(vocab_path)
+
+
+def encode_game_text(text: str, vocab: Optional[ChessVocabulary] = None) -> Optional[Tuple[bytes, int]]:
+    """
+    Parse 1 ván PGN -> (token int16 dạng bytes, result).
+    Bỏ qua ván rỗng, lỗi parse, hoặc ván bắt đầu từ FEN tuỳ chỉnh.
+    Nước không có trong vocab (<unk>): chỉ giữ phần ván trước nó (sau đó không dựng lại được thế cờ).
+    """
+    import chess.pgn
+
+    vocab = vocab or _worker_vocab
+    try:
+        game = chess.pgn.read_game(io.StringIO(text))
+    except Exception:
+        return None
+    if game is None or game.errors or "FEN" in game.headers:
+        return None
+
+    tokens = [vocab.encode(move.uci()) for move in game.mainline_moves()]
+    unk = vocab.stoi[vocab.UNK_TOKEN]
+    if unk in tokens:
+        tokens = tokens[:tokens.index(unk)]
+    if not tokens:
+        return None
+    result = RESULT_CODES.get(game.headers.get("Result", "*"), 0)
+    return np.asarray(tokens, dtype=TOKEN_DTYPE).tobytes(), result
+
+
+# ============================================================
+# 3. SHARD WRITER
+# ============================================================
+
+class ShardWriter:
+    def __init__(self, out_dir: str, vocab_size: int, shard_tokens: int = 16_000_000):
+        if vocab_size > np.iinfo(TOKEN_DTYPE).max:
+            raise ValueError(f"vocab_size {vocab_size} does not fit in {np.dtype(TOKEN_DTYPE).name}")
+        os.makedirs(out_dir, exist_ok=True)
+        self.out_dir = out_dir
+        self.vocab_size = vocab_size
+        self.shard_tokens = shard_tokens
+
+        self.shards: List[dict] = []
+        self._reset_buffer()
+
+    def _reset_buffer(self):
+        self._chunks: List[bytes] = []
+        self._offsets: List[int] = [0]
+        self._results: List[int] = []
+        self._num_tokens = 0
+
+    def add(self, token_bytes: bytes, result: int) -> None:
+        self._chunks.append(token_bytes)
+        self._num_tokens += len(token_bytes) // np.dtype(TOKEN_DTYPE).itemsize
+        self._offsets.append(self._num_tokens)
+        self._results.append(result)
+        if self._num_tokens >= self.shard_tokens:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._results:
+            return
+        name = f"shard_{len(self.shards):05d}"
+        prefix = os.path.join(self.out_dir, name)
+        with open(prefix + ".tokens.int16", "wb") as f:
+            for chunk in self._chunks:
+                f.write(chunk)
+        np.save(prefix + ".index.npy", np.asarray(self._offsets, dtype=np.int64))
+        np.save(prefix + ".results.npy", np.asarray(self._results, dtype=np.int8))
+        self.shards.append({"name": name, "games": len(self._results), "tokens": self._num_tokens})
+        self._reset_buffer()
+
+    def close(self, extra: Optional[dict] = None) -> dict:
+        self.flush()
+        manifest = {
+            "dtype": np.dtype(TOKEN_DTYPE).name,
+            "vocab_size": self.vocab_size,
+            "games": sum(s["games"] for s in self.shards),
+            "tokens": sum(s["tokens"] for s in self.shards),
+            "shards": self.shards,
+        }
+        if extra:
+            manifest.update(extra)
+        with open(os.path.join(self.out_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        return manifest
+
+
+def build_shards(
+    pgn_paths: List[str],
+    out_dir: str,
+    vocab_path: str = "models/vocab.pkl",
+    workers: int = 4,
+    batch_games: int = 2048,
+    shard_tokens: int = 16_000_000,
+) -> dict:
+    """PGN (1 hoặc nhiều file) -> thư mục shard + manifest. Trả về manifest."""
+    vocab = ChessVocabulary.load(vocab_path)
+    writer = ShardWriter(out_dir, vocab.vocab_size, shard_tokens)
+    start = time.time()
+    seen = kept = 0
+
+    def game_stream():
+        for path in pgn_paths:
+            yield from iter_game_texts(path)
+
+    with Pool(workers, initializer=_init_worker, initargs=(vocab_path,)) as pool:
+        pending = None
+        for batch in _batched(game_stream(), batch_games):
+            # Batch mới được gửi đi trước khi ghi batch cũ -> worker không phải chờ I/O
+            job = pool.map_async(encode_game_text, batch, chunksize=max(1, batch_games // (workers * 4)))
+            seen += len(batch)
+            if pending is not None:
+                kept += _write_results(writer, pending.get())
+            pending = job
+        if pending is not None:
+            kept += _write_results(writer, pending.get())
+
+    manifest = writer.close({"source": [os.path.basename(p) for p in pgn_paths]})
+    elapsed = time.time() - start
+    print(
+        f"[SHARDS] {kept}/{seen} games, {manifest['tokens']} tokens, "
+        f"{len(manifest['shards'])} shards in {elapsed:.1f}s ({seen / max(elapsed, 1e-9):.0f} games/s)"
+    )
+    return manifest
+
+
+def _write_results(writer: ShardWriter, results) -> int:
+    kept = 0
+    for res in results:
+        if res is not None:
+            writer.add(*res)
+            kept += 1
+    return kept
+
+
+# ============================================================
+# 4. READER (np.memmap)
+# ============================================================
+
+class TokenShard:
+    """1 shard đọc bằng memmap: game(i) trả về view int16, không copy."""
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self.offsets = np.load(prefix + ".index.npy", mmap_mode="r")
+        self.results = np.load(prefix + ".results.npy", mmap_mode="r")
+        self.tokens = np.memmap(prefix + ".tokens.int16", dtype=TOKEN_DTYPE, mode="r")
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def game(self, i: int) -> np.ndarray:
+        return self.tokens[self.offsets[i]:self.offsets[i + 1]]
+
+    def game_lengths(self, stop_token: Optional[int] = None) -> np.ndarray:
+        """Số token mỗi ván; có stop_token thì tính tới (không gồm) lần xuất hiện đầu tiên của nó."""
+        lengths = np.diff(self.offsets)
+        if stop_token is None:
+            return lengths
+        hits = np.flatnonzero(self.tokens == stop_token)
+        if len(hits):
+            games = np.searchsorted(self.offsets, hits, side="right") - 1
+            games, first = np.unique(games, return_index=True)
+            lengths = lengths.copy()
+            lengths[games] = hits[first] - self.offsets[games]
+        return lengths
+
+
+class ShardedCorpus:
+    """Toàn bộ thư mục shard (theo manifest.json), truy cập ván theo index toàn cục."""
+
+    def __init__(self, shard_dir: str):
+        with open(os.path.join(shard_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.shard_dir = shard_dir
+        self.shards = [TokenShard(os.path.join(shard_dir, s["name"])) for s in self.manifest["shards"]]
+        self.cum_games = np.cumsum([0] + [len(s) for s in self.shards])
+
+    def __len__(self) -> int:
+        return int(self.cum_games[-1])
+
+    def locate(self, index: int) -> Tuple[int, int]:
+        shard_idx = int(np.searchsorted(self.cum_games, index, side="right")) - 1
+        return shard_idx, index - int(self.cum_games[shard_idx])
+
+    def game(self, index: int) -> np.ndarray:
+        shard_idx, local = self.locate(index)
+        return self.shards[shard_idx].game(local)
+
+    def result(self, index: int) -> int:
+        shard_idx, local = self.locate(index)
+        return int(self.shards[shard_idx].results[local])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PGN -> int16 token shards")
+    parser.add_argument("pgn", nargs="+", help="PGN files (.pgn, .pgn.gz, .pgn.bz2)")
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--vocab", default="models/vocab.pkl")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-games", type=int, default=2048)
+    parser.add_argument("--shard-tokens", type=int, default=16_000_000)
+    args = parser.parse_args()
+
+    build_shards(args.pgn, args.out, args.vocab, args.workers, args.batch_games, args.shard_tokens)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# ai/ml/threads.py
+"""
+Quản lý số thread CPU cho inference torch.
+
+- Intra-op (torch.set_num_threads): với backend OpenMP (bản torch pip mặc định,
+  xem torch.__config__.parallel_info()) giá trị này là THEO THREAD GỌI. Vì vậy
+  mỗi agent gọi apply_thread_budget(self.threads) ngay trước forward -> nhiều
+  agent trong 1 process (simulator, bot server) không tranh nhau hết core.
+- Inter-op (torch.set_num_interop_threads) và CPU affinity là cấp PROCESS;
+  inter-op chỉ set được 1 lần, trước khi torch chạy việc song song đầu tiên.
+
+Cấu hình cấp process qua biến môi trường (đọc 1 lần khi tạo TransformerAgent đầu tiên):
+    CHESS_AI_THREADS=2  CHESS_AI_INTEROP_THREADS=1  CHESS_AI_CPU_AFFINITY=0-3,6
+hoặc qua agent_spec: {"threads": 2, "interop_threads": 1, "cpu_affinity": "0-3"}.
+"""
+import os
+import threading
+from typing import Iterable, List, Optional, Union
+
+ENV_THREADS = "CHESS_AI_THREADS"
+ENV_INTEROP_THREADS = "CHESS_AI_INTEROP_THREADS"
+ENV_CPU_AFFINITY = "CHESS_AI_CPU_AFFINITY"
+
+CpuList = Union[str, Iterable[int]]
+
+_lock = threading.Lock()
+_env_applied = False
+_interop_set: Optional[int] = None
+
+
+def available_cpus() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def parse_cpu_list(spec: CpuList) -> List[int]:
+    """"0-3,6" -> [0, 1, 2, 3, 6]; list/tuple int được giữ nguyên."""
+    if not isinstance(spec, str):
+        return sorted({int(c) for c in spec})
+    cpus = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            lo, hi = part.split("-", 1)
+            cpus.update(range(int(lo), int(hi) + 1))
+        else:
+            cpus.add(int(part))
+    return sorted(cpus)
+
+
+def set_cpu_affinity(cpus: CpuList) -> bool:
+    """Ghim cả process vào các CPU cho trước (chỉ Linux)."""
+    if not hasattr(os, "sched_setaffinity"):
+        print("[THREADS] CPU affinity không hỗ trợ trên hệ điều hành này, bỏ qua.")
+        return False
+    cpu_list = parse_cpu_list(cpus)
+    try:
+        os.sched_setaffinity(0, cpu_list)
+    except OSError as e:
+        print(f"[THREADS] Không set được affinity {cpu_list}: {e}")
+        return False
+    return True
+
+
+def apply_thread_budget(threads: Optional[int]) -> None:
+    """Set số thread intra-op cho thread đang gọi (no-op nếu None hoặc đã đúng)."""
+    if not threads:
+        return
+    import torch
+
+    if torch.get_num_threads() != threads:
+        torch.set_num_threads(int(threads))
+
+
+def configure_process(
+    threads: Optional[int] = None,
+    interop_threads: Optional[int] = None,
+    cpu_affinity: Optional[CpuList] = None,
+) -> None:
+    """Cấu hình cấp process; tham số None = giữ nguyên."""
+    global _interop_set
+    import torch
+
+    with _lock:
+        if cpu_affinity is not None:
+            set_cpu_affinity(cpu_affinity)
+        if interop_threads:
+            interop_threads = int(interop_threads)
+            if _interop_set is None:
+                try:
+                    torch.set_num_interop_threads(interop_threads)
+                    _interop_set = interop_threads
+                except RuntimeError as e:
+                    # torch đã chạy việc inter-op -> không đổi được nữa
+                    _interop_set = torch.get_num_interop_threads()
+                    print(f"[THREADS] Không set được interop threads: {e}")
+            if _interop_set != interop_threads:
+                print(f"[THREADS] interop threads đã cố định = {_interop_set}, bỏ qua {interop_threads}.")
+        if threads:
+            torch.set_num_threads(int(threads))
+
+
+def configure_from_env() -> None:
+    """Áp dụng các biến CHESS_AI_* (chỉ lần gọi đầu tiên có tác dụng)."""
+    global _env_applied
+    if _env_applied:
+        return
+    _env_applied = True
+
+    threads = os.environ.get(ENV_THREADS)
+    interop = os.environ.get(ENV_INTEROP_THREADS)
+    affinity = os.environ.get(ENV_CPU_AFFINITY)
+    if threads or interop or affinity:
+        configure_process(
+            threads=int(threads) if threads else None,
+            interop_threads=int(interop) if interop else None,
+            cpu_affinity=affinity or None,
+        )
+        print(f"[THREADS] env: threads={threads} interop={interop} affinity={affinity}")
@@ -0,0 +1,381 @@
+# ai/ml/train.py
+"""
+Train ChessTransformer trên token shards (xem ai/ml/pgn_shards.py), tối ưu cho CPU.
+
+- ShardSampleDataset: đọc shard bằng np.memmap, mở lười trong từng worker
+  (không pickle memmap), mỗi sample = (prefix nước đi, nước tiếp theo, kết quả).
+  Input "board": thế cờ mọi ply của 1 ván được dựng 1 lần rồi cache (LRU theo ván).
+- LengthBucketBatchSampler: duyệt từng shard (thứ tự ngẫu nhiên), gom sample
+  theo độ dài trong 1 "pool" giới hạn -> padding tối thiểu, RAM không phụ thuộc
+  kích thước corpus. Deterministic theo (seed, epoch) nên resume được giữa epoch.
+  Input "board": batch lấy trong từng block BOARD_BLOCK_GAMES ván để cache ở dataset trúng.
+  Ván có nước <unk> (shard cũ) chỉ dùng phần trước nó.
+- DataLoader nhiều worker + prefetch, gradient accumulation.
+- Checkpoint train (model + optimizer + scheduler + vị trí sampler) ghi atomic,
+  chạy lại với --resume sẽ tiếp tục đúng batch đang dở.
+
+Usage:
+    python -m ai.ml.train --shards data/shards --out models/transformer_chess.pth \\
+        --state models/train_state.pt --epochs 2 --batch-size 256 --accum 4 --workers 4
+"""
+import argparse
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import chess
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader, Dataset, Sampler
+
+from .checkpoint import load_checkpoint, save_checkpoint
+from .model import ChessTransformer
+from .pgn_shards import ShardedCorpus
+from .utils import ChessBoardEncoder, ChessVocabulary
+
+# Sample key = game_index * PLY_STRIDE + ply (1 số int64, không cần bảng index lớn)
+PLY_STRIDE = 1 << 12
+
+# Input "board": sampler trộn sample trong từng block ván, dataset cache thế cờ của ~2 block
+BOARD_BLOCK_GAMES = 64
+BOARD_CACHE_GAMES = 2 * BOARD_BLOCK_GAMES
+
+# Token đặc biệt cố định của ChessVocabulary
+UNK_ID = ChessVocabulary().stoi["<unk>"]
+
+
+# ============================================================
+# 1. DATASET
+# ============================================================
+
+class ShardSampleDataset(Dataset):
+    def __init__(self, shard_dir: str, vocab: ChessVocabulary, max_len: int = 80, input_mode: str = "moves"):
+        self.shard_dir = shard_dir
+        self.vocab = vocab
+        self.max_len = max_len
+        self.input_mode = input_mode
+        self.sos = vocab.stoi[vocab.SOS_TOKEN]
+        self._corpus: Optional[ShardedCorpus] = None
+        # game index -> thế cờ đã encode của mọi ply (input "board")
+        self._positions: "OrderedDict[int, np.ndarray]" = OrderedDict()
+
+    @property
+    def corpus(self) -> ShardedCorpus:
+        # Mở memmap lười: mỗi DataLoader worker tự mở file của mình
+        if self._corpus is None:
+            self._corpus = ShardedCorpus(self.shard_dir)
+        return self._corpus
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_corpus"] = None
+        state["_positions"] = OrderedDict()
+        return state
+
+    def __len__(self) -> int:
+        return int(self.corpus.manifest["tokens"])
+
+    def __getitem__(self, key: int) -> Tuple[List[int], int, float]:
+        game_idx, ply = divmod(int(key), PLY_STRIDE)
+        game = self.corpus.game(game_idx)
+        target = int(game[ply])
+
+        # Kết quả theo góc nhìn bên tới lượt (target cho value head)
+        result = self.corpus.result(game_idx)
+        value = float(result if ply % 2 == 0 else -result)
+
+        if self.input_mode == "board":
+            return self._board_positions(game_idx, game)[ply].tolist(), target, value
+
+        start = max(0, ply - (self.max_len - 1))
+        return [self.sos] + game[start:ply].tolist(), target, value
+
+    def _board_positions(self, game_idx: int, game: np.ndarray) -> np.ndarray:
+        """Thế cờ trước mỗi nước của ván (tới nước <unk> đầu tiên), replay ván 1 lần."""
+        positions = self._positions.get(game_idx)
+        if positions is not None:
+            self._positions.move_to_end(game_idx)
+            return positions
+        board, encoder, rows = chess.Board(), ChessBoardEncoder(), []
+        for tok in game.tolist():
+            if tok == UNK_ID:
+                break
+            rows.append(encoder.encode(board))
+            board.push_uci(self.vocab.decode(tok))
+        positions = np.asarray(rows, dtype=np.int8).reshape(-1, ChessBoardEncoder.SEQ_LEN)
+        self._positions[game_idx] = positions
+        if len(self._positions) > BOARD_CACHE_GAMES:
+            self._positions.popitem(last=False)
+        return positions
+
+
+def collate_left_pad(batch, pad_id: int = 0):
+    """
+    Left-pad tới độ dài lớn nhất trong batch (model đọc token CUỐI).
+    Positional encoding căn phải trong ChessTransformer.encode nên logits khớp input pad
+    đủ max_len lúc inference (kiểm tra: python -m scripts.check_train_inference).
+    """
+    max_len = max(len(x) for x, _, _ in batch)
+    inputs = torch.full((len(batch), max_len), pad_id, dtype=torch.long)
+    for i, (x, _, _) in enumerate(batch):
+        inputs[i, max_len - len(x):] = torch.as_tensor(x, dtype=torch.long)
+    targets = torch.tensor([t for _, t, _ in batch], dtype=torch.long)
+    values = torch.tensor([v for _, _, v in batch], dtype=torch.float)
+    return inputs, inputs == pad_id, targets, values
+
+
+# ============================================================
+# 2. LENGTH-BUCKETED SAMPLER
+# ============================================================
+
+class LengthBucketBatchSampler(Sampler):
+    def __init__(
+        self,
+        shard_dir: str,
+        batch_size: int,
+        max_len: int = 80,
+        pool_games: int = 20_000,
+        seed: int = 0,
+        input_mode: str = "moves",
+    ):
+        self.shard_dir = shard_dir
+        self.batch_size = batch_size
+        self.max_len = max_len
+        self.pool_games = pool_games
+        self.seed = seed
+        self.input_mode = input_mode
+        self.epoch = 0
+        self.skip_batches = 0
+        self._corpus = ShardedCorpus(shard_dir)
+
+    def set_epoch(self, epoch: int, skip_batches: int = 0) -> None:
+        self.epoch = epoch
+        self.skip_batches = skip_batches
+
+    def __len__(self) -> int:
+        return math.ceil(int(self._corpus.manifest["tokens"]) / self.batch_size)
+
+    @staticmethod
+    def _expand(game_ids: np.ndarray, lengths: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Mở rộng (game, ply) bằng numpy, không vòng lặp Python theo sample -> (keys, plies)."""
+        lengths = np.minimum(lengths, PLY_STRIDE - 1)
+        game_rep = np.repeat(game_ids, lengths)
+        starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        plies = np.arange(len(game_rep)) - starts
+        return game_rep * PLY_STRIDE + plies, plies
+
+    def _pool_batches(self, rng: np.random.Generator, game_ids: np.ndarray, lengths: np.ndarray) -> List[np.ndarray]:
+        if self.input_mode == "board":
+            # Độ dài input cố định: chỉ cần trộn trong từng block ván (game_ids đã ngẫu nhiên),
+            # batch của 1 block đi liền nhau để dataset dựng mỗi ván 1 lần
+            batches = []
+            for b in range(0, len(game_ids), BOARD_BLOCK_GAMES):
+                keys, _ = self._expand(game_ids[b:b + BOARD_BLOCK_GAMES], lengths[b:b + BOARD_BLOCK_GAMES])
+                keys = keys[rng.permutation(len(keys))]
+                batches.extend(keys[i:i + self.batch_size] for i in range(0, len(keys), self.batch_size))
+            return batches
+
+        keys, plies = self._expand(game_ids, lengths)
+        seq_len = np.minimum(plies + 1, self.max_len)
+
+        # Sắp theo độ dài (tie-break ngẫu nhiên) rồi cắt batch, xáo thứ tự batch
+        order = np.lexsort((rng.random(len(keys)), seq_len))
+        keys = keys[order]
+        batches = [keys[i:i + self.batch_size] for i in range(0, len(keys), self.batch_size)]
+        rng.shuffle(batches)
+        return batches
+
+    def __iter__(self) -> Iterator[List[int]]:
+        rng = np.random.default_rng((self.seed, self.epoch))
+        corpus = self._corpus
+        emitted = 0
+
+        for shard_idx in rng.permutation(len(corpus.shards)):
+            shard = corpus.shards[shard_idx]
+            base = int(corpus.cum_games[shard_idx])
+            local_order = rng.permutation(len(shard))
+            lengths_all = shard.game_lengths(stop_token=UNK_ID)
+
+            for p in range(0, len(local_order), self.pool_games):
+                local = local_order[p:p + self.pool_games]
+                for batch in self._pool_batches(rng, local + base, lengths_all[local]):
+                    emitted += 1
+                    if emitted <= self.skip_batches:
+                        continue
+                    yield batch.tolist()
+        self.skip_batches = 0
+
+
+# ============================================================
+# 3. TRAIN LOOP
+# ============================================================
+
+def _lr_lambda(warmup: int, total: int):
+    def fn(step: int) -> float:
+        if step < warmup:
+            return (step + 1) / max(1, warmup)
+        progress = (step - warmup) / max(1, total - warmup)
+        return max(0.05, 0.5 * (1.0 + math.cos(math.pi * min(1.0, progress))))
+    return fn
+
+
+def train(
+    shard_dir: str,
+    out_path: str,
+    state_path: str,
+    vocab_path: str = "models/vocab.pkl",
+    init_from: Optional[str] = None,
+    resume: bool = False,
+    epochs: int = 1,
+    batch_size: int = 256,
+    accum_steps: int = 1,
+    lr: float = 3e-4,
+    weight_decay: float = 0.01,
+    warmup_steps: int = 1000,
+    workers: int = 4,
+    prefetch_factor: int = 4,
+    value_weight: float = 0.0,
+    save_every: int = 1000,
+    seed: int = 0,
+    model_kwargs: Optional[Dict] = None,
+) -> ChessTransformer:
+    torch.manual_seed(seed)
+    vocab = ChessVocabulary.load(vocab_path)
+    model_kwargs = dict(model_kwargs or {})
+
+    if init_from:
+        model = load_checkpoint(init_from, vocab_size=vocab.vocab_size, value_head=value_weight > 0 or None)
+    else:
+        model = ChessTransformer(vocab_size=vocab.vocab_size, value_head=value_weight > 0, **model_kwargs)
+    input_mode = model.input_mode
+    max_len = vocab.max_len
+
+    dataset = ShardSampleDataset(shard_dir, vocab, max_len=max_len, input_mode=input_mode)
+    sampler = LengthBucketBatchSampler(shard_dir, batch_size, max_len=max_len, seed=seed, input_mode=input_mode)
+    loader = DataLoader(
+        dataset,
+        batch_sampler=sampler,
+        collate_fn=collate_left_pad,
+        num_workers=workers,
+        prefetch_factor=prefetch_factor if workers > 0 else None,
+        persistent_workers=workers > 0,
+    )
+
+    optimizer = torch.optim.AdamW(model.parameters(), lr=lr, weight_decay=weight_decay)
+    total_steps = epochs * math.ceil(len(sampler) / accum_steps)
+    scheduler = torch.optim.lr_scheduler.LambdaLR(optimizer, _lr_lambda(warmup_steps, total_steps))
+
+    start_epoch, batches_done, step = 0, 0, 0
+    if resume and os.path.exists(state_path):
+        state = torch.load(state_path, map_location="cpu")
+        model.load_state_dict(state["state_dict"])
+        optimizer.load_state_dict(state["optimizer"])
+        scheduler.load_state_dict(state["scheduler"])
+        start_epoch, batches_done, step = state["epoch"], state["batches_done"], state["step"]
+        torch.set_rng_state(state["torch_rng"])
+        print(f"[TRAIN] Resumed from {state_path}: epoch {start_epoch}, batch {batches_done}, step {step}")
+
+    def save_state(epoch: int, done: int):
+        save_checkpoint(model, state_path, extra={
+            "optimizer": optimizer.state_dict(),
+            "scheduler": scheduler.state_dict(),
+            "epoch": epoch,
+            "batches_done": done,
+            "step": step,
+            "torch_rng": torch.get_rng_state(),
+        })
+
+    policy_loss_fn = nn.CrossEntropyLoss()
+    value_loss_fn = nn.MSELoss()
+
+    for epoch in range(start_epoch, epochs):
+        sampler.set_epoch(epoch, skip_batches=batches_done)
+        model.train()
+        t0, seen, running, running_n = time.time(), 0, 0.0, 0
+        optimizer.zero_grad(set_to_none=True)
+
+        for inputs, mask, targets, values in loader:
+            if model.value_head is not None and value_weight > 0:
+                logits, pred_values = model.forward_with_value(inputs, mask)
+                loss = policy_loss_fn(logits, targets) + value_weight * value_loss_fn(pred_values, values)
+            else:
+                loss = policy_loss_fn(model(inputs, mask), targets)
+
+            (loss / accum_steps).backward()
+            batches_done += 1
+            seen += len(targets)
+            running += loss.item()
+            running_n += 1
+
+            if batches_done % accum_steps == 0:
+                torch.nn.utils.clip_grad_norm_(model.parameters(), 1.0)
+                optimizer.step()
+                scheduler.step()
+                optimizer.zero_grad(set_to_none=True)
+                step += 1
+
+                if step % 50 == 0:
+                    rate = seen / max(time.time() - t0, 1e-9)
+                    print(
+                        f"[TRAIN] epoch {epoch} step {step} loss {running / max(running_n, 1):.4f} "
+                        f"lr {scheduler.get_last_lr()[0]:.2e} | {rate:.0f} samples/s"
+                    )
+                    running, running_n = 0.0, 0
+                if step % save_every == 0:
+                    save_state(epoch, batches_done)
+
+        batches_done = 0
+        save_state(epoch + 1, 0)
+        save_checkpoint(model, out_path)
+        print(f"[TRAIN] Epoch {epoch} done -> {out_path}")
+
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train ChessTransformer on token shards")
+    parser.add_argument("--shards", required=True)
+    parser.add_argument("--out", default="models/transformer_chess.pth")
+    parser.add_argument("--state", default="models/train_state.pt")
+    parser.add_argument("--vocab", default="models/vocab.pkl")
+    parser.add_argument("--init-from", default=None, help="Checkpoint để fine-tune (cũ hoặc mới)")
+    parser.add_argument("--resume", action="store_true")
+    parser.add_argument("--epochs", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--accum", type=int, default=1)
+    parser.add_argument("--lr", type=float, default=3e-4)
+    parser.add_argument("--warmup", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--prefetch", type=int, default=4)
+    parser.add_argument("--value-weight", type=float, default=0.0)
+    parser.add_argument("--save-every", type=int, default=1000)
+    parser.add_argument("--input-mode", choices=["moves", "board"], default="moves")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    train(
+        shard_dir=args.shards,
+        out_path=args.out,
+        state_path=args.state,
+        vocab_path=args.vocab,
+        init_from=args.init_from,
+        resume=args.resume,
+        epochs=args.epochs,
+        batch_size=args.batch_size,
+        accum_steps=args.accum,
+        lr=args.lr,
+        warmup_steps=args.warmup,
+        workers=args.workers,
+        prefetch_factor=args.prefetch,
+        value_weight=args.value_weight,
+        save_every=args.save_every,
+        seed=args.seed,
+        model_kwargs={"input_mode": args.input_mode},
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,12 @@
 # ai/ml/utils.py
-import joblib
-import torch
-from typing import List, Dict, Optional, Tuple
+# torch / joblib import lười trong hàm: pgn_shards và game chỉ cần vocab, không cần torch
+from __future__ import annotations
+
+import chess
+from typing import TYPE_CHECKING, List, Dict, Optional, Tuple
+
+if TYPE_CHECKING:
+    import torch
 
 class ChessVocabulary:
     """Quản lý việc ánh xạ nước đi UCI (str) <-> Index (int)."""
@@ -29,9 +34,15 @@ class ChessVocabulary:
 
     @classmethod
     def load(cls, path: str):
+        # vocab.bin: bảng chuỗi phẳng (ai/ml/fast_format.py), load nhanh hơn unpickle
+        if path.endswith(".bin"):
+            from .fast_format import load_vocab_table
+            return load_vocab_table(path)
+        import joblib
         return joblib.load(path)
 
     def save(self, path: str):
+        import joblib
         joblib.dump(self, path)
         
     def encode(self, uci_move: str) -> int:
@@ -40,7 +51,7 @@ class ChessVocabulary:
     def decode(self, index: int) -> str:
         return self.itos.get(index, self.UNK_TOKEN)
 
-    def moves_to_tensor(self, move_history: List[str], device: torch.device) -> Tuple[torch.Tensor, torch.Tensor]:
+    def encode_history(self, move_history: List[str]) -> List[int]:
         # CRITICAL FIX: Always start with <sos>
         sequence = [self.SOS_TOKEN] + move_history[-self.max_len + 1:]  # +1 because we added SOS
         
@@ -49,11 +60,97 @@ class ChessVocabulary:
         # Left-pad to max_len
         padding_needed = self.max_len - len(encoded)
         if padding_needed > 0:
-            padded_encoded = [self.stoi[self.PAD_TOKEN]] * padding_needed + encoded
-        else:
-            padded_encoded = encoded[-self.max_len:]  # truncate old games if any
+            return [self.stoi[self.PAD_TOKEN]] * padding_needed + encoded
+        return encoded[-self.max_len:]  # truncate old games if any
+
+    def moves_to_tensor(self, move_history: List[str], device: torch.device) -> Tuple[torch.Tensor, torch.Tensor]:
+        return self.histories_to_tensor([move_history], device)
 
-        input_tensor = torch.tensor([padded_encoded], dtype=torch.long, device=device)
+    def histories_to_tensor(self, histories: List[List[str]], device: torch.device) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Encode nhiều lịch sử nước đi thành 1 batch (B, max_len) + padding mask."""
+        import torch
+        input_tensor = torch.tensor(
+            [self.encode_history(h) for h in histories], dtype=torch.long, device=device
+        )
         padding_mask = (input_tensor == self.stoi[self.PAD_TOKEN])
         
-        return input_tensor, padding_mask
\ No newline at end of file
+        return input_tensor, padding_mask
+
+
+class ChessBoardEncoder:
+    """
+    Encode thế cờ hiện tại (KHÔNG cần lịch sử) thành dãy token độ dài cố định:
+        64 ô (a1..h8) + bên tới lượt + 4 quyền nhập thành (KQkq) + cột en passant + <cls>
+    Dùng được với thế cờ load từ FEN (save_manager.load_game, message 'state' của server).
+    """
+    PAD = 0
+    EMPTY = 1
+    PIECE_OFFSET = 2          # 2..13: P N B R Q K (trắng), p n b r q k (đen)
+    WHITE_TO_MOVE = 14
+    BLACK_TO_MOVE = 15
+    CASTLE_NO = 16
+    CASTLE_YES = 17
+    EP_NONE = 18              # 19..26: en passant ở cột a..h
+    CLS = 27
+
+    VOCAB_SIZE = 28
+    SEQ_LEN = 64 + 7
+
+    def encode(self, board: chess.Board) -> List[int]:
+        tokens = [self.EMPTY] * 64
+        for square, piece in board.piece_map().items():
+            tokens[square] = self.PIECE_OFFSET + (piece.piece_type - 1) + (0 if piece.color == chess.WHITE else 6)
+
+        tokens.append(self.WHITE_TO_MOVE if board.turn == chess.WHITE else self.BLACK_TO_MOVE)
+        for has_right in (
+            board.has_kingside_castling_rights(chess.WHITE),
+            board.has_queenside_castling_rights(chess.WHITE),
+            board.has_kingside_castling_rights(chess.BLACK),
+            board.has_queenside_castling_rights(chess.BLACK),
+        ):
+            tokens.append(self.CASTLE_YES if has_right else self.CASTLE_NO)
+
+        # Chỉ ghi ô en passant khi thật sự bắt được (chuẩn hoá giống FEN/EPD)
+        if board.ep_square is not None and board.has_legal_en_passant():
+            tokens.append(self.EP_NONE + 1 + chess.square_file(board.ep_square))
+        else:
+            tokens.append(self.EP_NONE)
+
+        tokens.append(self.CLS)
+        return tokens
+
+    def encode_fen(self, fen: str) -> List[int]:
+        return self.encode(chess.Board(fen))
+
+    def boards_to_tensor(self, boards: List[chess.Board], device: torch.device) -> Tuple[torch.Tensor, torch.Tensor]:
+        import torch
+        input_tensor = torch.tensor([self.encode(b) for b in boards], dtype=torch.long, device=device)
+        padding_mask = (input_tensor == self.PAD)
+        return input_tensor, padding_mask
+
+
+def encode_position(board: chess.Board, vocab: ChessVocabulary, input_mode: str = "moves") -> List[int]:
+    """Token input cho ChessTransformer theo input_mode ('moves' = lịch sử, 'board' = thế cờ)."""
+    if input_mode == "board":
+        return ChessBoardEncoder().encode(board)
+    return vocab.encode_history([m.uci() for m in board.move_stack])
+
+
+def game_to_board_samples(
+    move_history: List[str],
+    vocab: ChessVocabulary,
+    start_fen: Optional[str] = None,
+) -> Tuple[List[List[int]], List[int]]:
+    """
+    Sinh dữ liệu train cho input_mode='board' từ 1 ván:
+    mỗi ply -> (token thế cờ trước nước đi, index nước đi tiếp theo).
+    """
+    encoder = ChessBoardEncoder()
+    board = chess.Board(start_fen) if start_fen else chess.Board()
+    inputs: List[List[int]] = []
+    targets: List[int] = []
+    for uci in move_history:
+        inputs.append(encoder.encode(board))
+        targets.append(vocab.encode(uci))
+        board.push_uci(uci)
+    return inputs, targets
@@ -0,0 +1,106 @@
+# ai/ml/value_eval.py
+"""
+Adapter value head ChessTransformer -> eval_fn cho negamax_search / MCTS.
+
+- __call__(board) -> int: centipawn theo góc nhìn TRẮNG (đúng contract EvalFn
+  của ai/minimax/search.py), có cache theo FEN.
+- prefetch_children(board, moves): search gọi ở node depth 1 để đánh giá TẤT CẢ
+  lá con trong một forward duy nhất rồi đưa vào cache.
+- evaluate_batch(boards) -> List[float]: value [-1, 1] theo bên tới lượt (cho MCTS).
+"""
+import math
+from collections import OrderedDict
+from typing import List
+
+import chess
+
+from ai.minimax.eval import evaluate
+
+MATE_SCORE = 9999999
+
+
+class NeuralEvaluator:
+    def __init__(self, net, scale: float = 600.0, cache_size: int = 200_000):
+        """
+        net: TransformerAgent (fp32) đã load checkpoint có value head.
+        scale: hệ số quy đổi value -> centipawn (cp = scale * atanh(v)).
+        """
+        self.net = net
+        self.scale = scale
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, float]" = OrderedDict()
+        self.enabled = bool(getattr(net, "is_ready", False) and getattr(net, "has_value_head", False))
+        if not self.enabled:
+            print("[NeuralEvaluator] Model không có value head -> dùng eval thường.")
+
+    @classmethod
+    def from_paths(cls, model_path: str, vocab_path: str, threads=None, **kwargs) -> "NeuralEvaluator":
+        from .agent import TransformerAgent
+
+        # TorchScript int8 chỉ trace forward (policy) nên ở đây dùng bản fp32
+        net = TransformerAgent(model_path=model_path, vocab_path=vocab_path, use_quantized=False, threads=threads)
+        return cls(net, **kwargs)
+
+    # --------- Batched core ----------
+
+    def _forward_values(self, boards: List[chess.Board]) -> List[float]:
+        encoded = [self.net.encode_board(b) for b in boards]
+        return [v for _, v in self.net.predict_batch_with_value(encoded)]
+
+    def _store(self, key: str, value: float) -> None:
+        self._cache[key] = value
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def evaluate_batch(self, boards: List[chess.Board]) -> List[float]:
+        """Value [-1, 1] theo bên tới lượt cho nhiều thế cờ, 1 forward cho các thế chưa có trong cache."""
+        if not self.enabled:
+            return [self._fallback_value(b) for b in boards]
+
+        keys = [b.fen() for b in boards]
+        missing = [i for i, k in enumerate(keys) if k not in self._cache]
+        if missing:
+            values = self._forward_values([boards[i] for i in missing])
+            for i, v in zip(missing, values):
+                self._store(keys[i], v)
+        return [self._cache[k] for k in keys]
+
+    def prefetch_children(self, board: chess.Board, moves: List[chess.Move]) -> None:
+        """Đánh giá mọi thế cờ con (board + move) trong 1 batch, kết quả vào cache."""
+        if not self.enabled or not moves:
+            return
+        children = []
+        for move in moves:
+            board.push(move)
+            if board.fen() not in self._cache and not board.is_game_over():
+                children.append(board.copy())
+            board.pop()
+        if children:
+            self.evaluate_batch(children)
+
+    # --------- EvalFn (negamax) ----------
+
+    def __call__(self, board: chess.Board) -> int:
+        if board.is_checkmate():
+            return -MATE_SCORE if board.turn == chess.WHITE else MATE_SCORE
+        if not self.enabled:
+            return evaluate(board)
+
+        v = self.evaluate_batch([board])[0]
+        cp = self.to_centipawns(v)
+        return cp if board.turn == chess.WHITE else -cp
+
+    def to_centipawns(self, value: float) -> int:
+        v = max(-0.999, min(0.999, value))
+        return int(self.scale * math.atanh(v))
+
+    def _fallback_value(self, board: chess.Board) -> float:
+        cp = evaluate(board)
+        if board.turn == chess.BLACK:
+            cp = -cp
+        return math.tanh(cp / self.scale)
+
+    def value(self, board: chess.Board) -> float:
+        """value_fn cho MCTS (1 thế cờ)."""
+        return self.evaluate_batch([board])[0]
+
@@ -0,0 +1,255 @@
+# ai/selfplay.py
+"""
+Self-play headless: sinh ván cờ hàng loạt để làm dữ liệu train.
+
+- Mỗi worker process giữ agent đã khởi tạo (cache theo agent_spec) -> model /
+  bảng eval chỉ load 1 lần mỗi process, không phải mỗi ván.
+- Khai cuộc ngẫu nhiên: mỗi ván đi `opening_plies` nước random (seed theo game id,
+  chạy lại cho kết quả giống nhau) rồi 2 agent đánh tiếp; màu đổi lượt mỗi ván.
+- Kết quả stream về process chính (imap_unordered) và ghi ngay vào shard
+  gzip JSON-lines, mỗi dòng 1 ván:
+    {"id", "white", "black", "opening_plies", "moves": [uci...],
+     "scores": [cp theo góc nhìn trắng | null...], "result": "1-0", "termination", "time_ms"}
+  `moves` tính từ thế cờ ban đầu (gồm cả nước khai cuộc random, có score null).
+
+Usage:
+    python -m ai.selfplay --games 2000 --workers 8 --out data/selfplay \\
+        --white '{"type": "minimax", "level": "easy"}' --black '{"type": "minimax", "level": "medium"}'
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import time
+from multiprocessing import Pool
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import chess
+
+MANIFEST_NAME = "manifest.json"
+
+# ============================================================
+# 1. WORKER
+# ============================================================
+
+def _init_worker() -> None:
+    # Nhiều process cùng chạy torch: mặc định 1 thread/process để không tranh core
+    os.environ.setdefault("CHESS_AI_THREADS", "1")
+
+
+def _get_agent(spec: Dict[str, Any]):
+    from ai.api import get_cached_agent
+
+    # Tắt log từng nước của minimax
+    return get_cached_agent({"verbose": False, **spec})
+
+
+def random_opening(board: chess.Board, plies: int, rng: random.Random) -> List[chess.Move]:
+    played = []
+    for _ in range(plies):
+        moves = list(board.legal_moves)
+        if not moves:
+            break
+        move = rng.choice(moves)
+        board.push(move)
+        played.append(move)
+    return played
+
+
+def _game_over(board: chess.Board, max_plies: int) -> Optional[Tuple[str, str]]:
+    """-> (result, termination) hoặc None. Không dùng claim_draw=True (chậm)."""
+    outcome = board.outcome(claim_draw=False)
+    if outcome is not None:
+        return outcome.result(), outcome.termination.name.lower()
+    if board.halfmove_clock >= 100:
+        return "1/2-1/2", "fifty_moves"
+    if board.is_repetition(3):
+        return "1/2-1/2", "threefold_repetition"
+    if board.ply() >= max_plies:
+        return "1/2-1/2", "max_plies"
+    return None
+
+
+def play_game(job: Tuple[int, Dict[str, Any], Dict[str, Any], int, int, int]) -> Dict[str, Any]:
+    game_id, white_spec, black_spec, opening_plies, max_plies, seed = job
+    rng = random.Random(seed)
+    start = time.time()
+
+    board = chess.Board()
+    opening = random_opening(board, opening_plies, rng)
+    moves = [m.uci() for m in opening]
+    scores: List[Optional[int]] = [None] * len(opening)
+
+    try:
+        agents = {chess.WHITE: _get_agent(white_spec), chess.BLACK: _get_agent(black_spec)}
+        ended = _game_over(board, max_plies)
+        while ended is None:
+            turn = board.turn
+            move, info = agents[turn].choose_move(board)
+            if move is None or move not in board.legal_moves:
+                return {"id": game_id, "error": f"illegal move {move} at ply {board.ply()}"}
+            score = info.get("score") if info else None
+            if isinstance(score, (int, float)):
+                # Score của agent theo góc nhìn bên đi -> quy về góc nhìn trắng
+                score = int(score if turn == chess.WHITE else -score)
+            else:
+                score = None
+            board.push(move)
+            moves.append(move.uci())
+            scores.append(score)
+            ended = _game_over(board, max_plies)
+    except Exception as e:
+        return {"id": game_id, "error": f"{type(e).__name__}: {e}"}
+
+    result, termination = ended
+    return {
+        "id": game_id,
+        "white": white_spec,
+        "black": black_spec,
+        "opening_plies": len(opening),
+        "moves": moves,
+        "scores": scores,
+        "result": result,
+        "termination": termination,
+        "time_ms": int((time.time() - start) * 1000),
+    }
+
+
+# ============================================================
+# 2. SHARD WRITER / READER
+# ============================================================
+
+class SelfPlayWriter:
+    """Ghi ván vào selfplay_00000.jsonl.gz, ... (mỗi shard `games_per_shard` ván)."""
+
+    def __init__(self, out_dir: str, games_per_shard: int = 1000):
+        os.makedirs(out_dir, exist_ok=True)
+        self.out_dir = out_dir
+        self.games_per_shard = games_per_shard
+        self.shards: List[Dict[str, Any]] = []
+        self.results = {"1-0": 0, "0-1": 0, "1/2-1/2": 0}
+        self._file = None
+        self._count = 0
+
+    def _open_next(self) -> None:
+        name = f"selfplay_{len(self.shards):05d}.jsonl.gz"
+        self._file = gzip.open(os.path.join(self.out_dir, name), "wt", encoding="utf-8")
+        self.shards.append({"name": name, "games": 0})
+        self._count = 0
+
+    def add(self, game: Dict[str, Any]) -> None:
+        if self._file is None or self._count >= self.games_per_shard:
+            self.close_shard()
+            self._open_next()
+        self._file.write(json.dumps(game, separators=(",", ":")) + "\n")
+        self._count += 1
+        self.shards[-1]["games"] = self._count
+        self.results[game["result"]] = self.results.get(game["result"], 0) + 1
+
+    def close_shard(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self, extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        self.close_shard()
+        manifest = {
+            "games": sum(s["games"] for s in self.shards),
+            "results": self.results,
+            "shards": self.shards,
+        }
+        if extra:
+            manifest.update(extra)
+        with open(os.path.join(self.out_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        return manifest
+
+
+def iter_selfplay_games(out_dir: str) -> Iterator[Dict[str, Any]]:
+    """Đọc lại mọi ván trong thư mục self-play (theo thứ tự shard)."""
+    names = sorted(n for n in os.listdir(out_dir) if n.startswith("selfplay_") and n.endswith(".jsonl.gz"))
+    for name in names:
+        with gzip.open(os.path.join(out_dir, name), "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+# ============================================================
+# 3. DRIVER
+# ============================================================
+
+def run_selfplay(
+    out_dir: str,
+    games: int,
+    white_spec: Dict[str, Any],
+    black_spec: Optional[Dict[str, Any]] = None,
+    workers: int = 4,
+    opening_plies: Tuple[int, int] = (2, 8),
+    max_plies: int = 300,
+    games_per_shard: int = 1000,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """Chạy `games` ván self-play, đổi màu mỗi ván. Trả về manifest."""
+    black_spec = black_spec or white_spec
+    rng = random.Random(seed)
+
+    def jobs():
+        for i in range(games):
+            w, b = (white_spec, black_spec) if i % 2 == 0 else (black_spec, white_spec)
+            yield i, w, b, rng.randint(*opening_plies), max_plies, seed * 1_000_003 + i
+
+    writer = SelfPlayWriter(out_dir, games_per_shard)
+    start = time.time()
+    done = failed = 0
+    with Pool(workers, initializer=_init_worker) as pool:
+        for game in pool.imap_unordered(play_game, jobs(), chunksize=1):
+            if "error" in game:
+                failed += 1
+                print(f"[SELFPLAY] Game {game['id']} lỗi: {game['error']}")
+                continue
+            writer.add(game)
+            done += 1
+            if done % 100 == 0:
+                elapsed = time.time() - start
+                print(f"[SELFPLAY] {done}/{games} games ({done / elapsed * 3600:.0f} games/h)")
+
+    elapsed = time.time() - start
+    manifest = writer.close({"white": white_spec, "black": black_spec, "seed": seed, "failed": failed})
+    print(
+        f"[SELFPLAY] {done} games ({failed} failed) in {elapsed:.1f}s "
+        f"-> {done / max(elapsed, 1e-9) * 3600:.0f} games/h, results {manifest['results']}"
+    )
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless self-play data generator")
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--white", default='{"type": "minimax", "level": "easy"}', help="agent_spec JSON")
+    parser.add_argument("--black", default=None, help="agent_spec JSON (mặc định = --white)")
+    parser.add_argument("--opening-min", type=int, default=2)
+    parser.add_argument("--opening-max", type=int, default=8)
+    parser.add_argument("--max-plies", type=int, default=300)
+    parser.add_argument("--games-per-shard", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    run_selfplay(
+        args.out,
+        args.games,
+        json.loads(args.white),
+        json.loads(args.black) if args.black else None,
+        workers=args.workers,
+        opening_plies=(args.opening_min, args.opening_max),
+        max_plies=args.max_plies,
+        games_per_shard=args.games_per_shard,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -70,6 +70,15 @@ class Board:
             raise ValueError(f"Illegal move: {uci_move}")
         self._board.push(move)
 
+    def replay_uci(self, uci_moves) -> None:
+        """
+        Đi lại chuỗi nước ĐÃ được kiểm tra hợp lệ từ trước (VD khôi phục ván từ journal của server),
+        bỏ qua kiểm tra hợp lệ từng nước cho nhanh.
+        """
+        push = self._board.push
+        for uci_move in uci_moves:
+            push(chess.Move.from_uci(uci_move))
+
     def pop_move(self) -> None:
         """Hoàn tác một nước (nếu có)."""
         if self._board.move_stack:
@@ -0,0 +1,301 @@
+# core/wire.py
+"""
+Wire format dùng chung cho server và client online.
+
+1. JSON lines (mặc định, dễ debug): mỗi message là 1 dòng JSON kết thúc bằng "\n".
+2. Binary (thương lượng): client gửi dòng JSON {"type": "hello", "framing": "binary"},
+   server trả lời {"type": "hello", "framing": "binary"} (vẫn là JSON line) rồi từ
+   byte kế tiếp cả 2 chiều dùng frame:
+
+       u32 length (big-endian, tính từ byte type) | u8 type | body
+
+   Body các message hay gặp được pack bằng struct: nước đi = u16
+   (from | to << 6 | promo << 12), đồng hồ = int32 mili giây, chuỗi = u16 length + utf-8.
+   Message khác (hoặc có key lạ) đi dưới dạng frame MSG_JSON (body = JSON utf-8),
+   nên thêm message mới không cần sửa format.
+
+Reader (JsonLineReader / BinaryFrameReader) gom byte vào 1 bytearray, tách message
+theo offset (không nối / split str) -> không bị O(n^2) khi nhận burst lớn.
+Interface chung: feed(data), next() -> message | None, take_rest(), pending_bytes.
+"""
+import json
+import struct
+from typing import Any, Dict, Optional, Union
+
+FRAMING_JSON = "json"
+FRAMING_BINARY = "binary"
+
+MAX_FRAME_BYTES = 1 << 20
+
+# ----- Message type ids -----
+MSG_JSON = 0
+# client -> server
+MSG_JOIN = 1
+MSG_MOVE = 2
+MSG_LIST_ROOMS = 3
+MSG_RESIGN = 4
+MSG_OFFER_DRAW = 5
+MSG_RESYNC = 6
+# server -> client
+MSG_JOINED = 16
+MSG_JOIN_FAILED = 17
+MSG_STATE = 18
+MSG_DELTA = 19
+MSG_MOVE_REJECTED = 20
+MSG_ERROR = 21
+
+RESULTS = ("ongoing", "white_win", "black_win", "draw")
+RESULT_CODES = {r: i for i, r in enumerate(RESULTS)}
+COLORS = ("white", "black")
+COLOR_CODES = {c: i for i, c in enumerate(COLORS)}
+
+_HEADER = struct.Struct(">IB")
+_U8 = struct.Struct(">B")
+_U16 = struct.Struct(">H")
+_JOINED = struct.Struct(">BB")
+_MOVE = struct.Struct(">H")
+# seq, turn, result, last_move, time_white_ms, time_black_ms
+_STATE = struct.Struct(">IBBHii")
+# seq, move, result, time_white_ms, time_black_ms
+_DELTA = struct.Struct(">IHBii")
+
+
+class WireError(ValueError):
+    """Frame hỏng / quá lớn: nên đóng kết nối."""
+
+
+# ============================================================
+# 1. MOVE / CLOCK CODES
+# ============================================================
+
+MOVE_NONE = 0xFFFF
+_PROMOS = " nbrq"
+
+
+def encode_move(uci: Optional[str]) -> int:
+    """'e7e8q' -> u16. None -> MOVE_NONE. Raise ValueError nếu không phải UCI."""
+    if uci is None:
+        return MOVE_NONE
+    if len(uci) not in (4, 5):
+        raise ValueError(f"bad uci: {uci!r}")
+    files, ranks = "abcdefgh", "12345678"
+    f1, r1, f2, r2 = files.index(uci[0]), ranks.index(uci[1]), files.index(uci[2]), ranks.index(uci[3])
+    promo = _PROMOS.index(uci[4]) if len(uci) == 5 and uci[4] != " " else 0
+    return (f1 + 8 * r1) | ((f2 + 8 * r2) << 6) | (promo << 12)
+
+
+def decode_move(code: int) -> Optional[str]:
+    if code == MOVE_NONE:
+        return None
+    frm, to, promo = code & 63, (code >> 6) & 63, (code >> 12) & 7
+    uci = "abcdefgh"[frm & 7] + str(frm // 8 + 1) + "abcdefgh"[to & 7] + str(to // 8 + 1)
+    return uci + _PROMOS[promo] if promo else uci
+
+
+def _ms(seconds: float) -> int:
+    return max(-(2 ** 31), min(2 ** 31 - 1, int(round(seconds * 1000))))
+
+
+# ============================================================
+# 2. ENCODE
+# ============================================================
+
+def _str(s: str) -> bytes:
+    data = s.encode("utf-8")
+    return _U16.pack(len(data)) + data
+
+
+def _frame(msg_type: int, body: bytes = b"") -> bytes:
+    return _HEADER.pack(len(body) + 1, msg_type) + body
+
+
+def _json_frame(msg: Dict[str, Any]) -> bytes:
+    return _frame(MSG_JSON, json.dumps(msg, separators=(",", ":")).encode("utf-8"))
+
+
+_EMPTY_TYPES = {"list_rooms": MSG_LIST_ROOMS, "resign": MSG_RESIGN, "offer_draw": MSG_OFFER_DRAW, "resync": MSG_RESYNC}
+_REASON_TYPES = {"join_failed": (MSG_JOIN_FAILED, "reason"), "move_rejected": (MSG_MOVE_REJECTED, "reason"),
+                 "error": (MSG_ERROR, "message")}
+_STATE_KEYS = {"type", "room_id", "seq", "fen", "turn", "result", "last_move", "time_white", "time_black"}
+_DELTA_KEYS = {"type", "seq", "uci", "tw", "tb", "result"}
+
+
+def _pack(msg: Dict[str, Any]) -> Optional[bytes]:
+    """Frame struct-packed cho các message đã biết; None -> dùng JSON frame."""
+    t = msg.get("type")
+    keys = msg.keys()
+    if t in _EMPTY_TYPES and len(keys) == 1:
+        return _frame(_EMPTY_TYPES[t])
+    if t in _REASON_TYPES:
+        code, field = _REASON_TYPES[t]
+        if keys == {"type", field} and isinstance(msg[field], str):
+            return _frame(code, _str(msg[field]))
+        return None
+    if t == "move" and keys == {"type", "uci"} and isinstance(msg["uci"], str):
+        return _frame(MSG_MOVE, _MOVE.pack(encode_move(msg["uci"])))
+    if t == "join" and keys <= {"type", "game_id", "protocol"}:
+        game_id = msg.get("game_id") or ""
+        return _frame(MSG_JOIN, _U8.pack(int(msg.get("protocol", 1))) + _str(str(game_id)))
+    if t == "joined" and keys <= {"type", "room_id", "color", "protocol"}:
+        return _frame(MSG_JOINED, _JOINED.pack(COLOR_CODES[msg["color"]], msg.get("protocol", 1)) + _str(msg["room_id"]))
+    if t == "state" and keys == _STATE_KEYS and isinstance(msg["fen"], str):
+        body = _STATE.pack(
+            msg["seq"], COLOR_CODES[msg["turn"]], RESULT_CODES[msg["result"]], encode_move(msg["last_move"]),
+            _ms(msg["time_white"]), _ms(msg["time_black"]),
+        )
+        return _frame(MSG_STATE, body + _str(msg["room_id"]) + _str(msg["fen"]))
+    if t == "delta" and keys <= _DELTA_KEYS:
+        body = _DELTA.pack(
+            msg["seq"], encode_move(msg.get("uci")), RESULT_CODES[msg.get("result", "ongoing")],
+            _ms(msg["tw"]), _ms(msg["tb"]),
+        )
+        return _frame(MSG_DELTA, body)
+    return None
+
+
+def encode_frame(msg: Dict[str, Any]) -> bytes:
+    """dict -> 1 binary frame (packed nếu được, không thì JSON frame)."""
+    try:
+        frame = _pack(msg)
+    except (KeyError, ValueError, TypeError, struct.error):
+        frame = None
+    return frame if frame is not None else _json_frame(msg)
+
+
+def encode_line(msg: Dict[str, Any]) -> bytes:
+    return (json.dumps(msg) + "\n").encode("utf-8")
+
+
+def encode(msg: Dict[str, Any], framing: str) -> bytes:
+    return encode_frame(msg) if framing == FRAMING_BINARY else encode_line(msg)
+
+
+# ============================================================
+# 3. DECODE
+# ============================================================
+
+def _read_str(mv: memoryview, offset: int):
+    (n,) = _U16.unpack_from(mv, offset)
+    offset += 2
+    return str(mv[offset:offset + n], "utf-8"), offset + n
+
+
+def decode_payload(mv: memoryview) -> Dict[str, Any]:
+    """mv = byte type + body của 1 frame -> dict (cùng dạng message JSON)."""
+    t = mv[0]
+    if t == MSG_JSON:
+        msg = json.loads(str(mv[1:], "utf-8"))
+        if not isinstance(msg, dict):
+            raise WireError("json frame is not an object")
+        return msg
+    if t == MSG_MOVE:
+        return {"type": "move", "uci": decode_move(_MOVE.unpack_from(mv, 1)[0])}
+    if t == MSG_DELTA:
+        seq, move, result, tw, tb = _DELTA.unpack_from(mv, 1)
+        msg = {"type": "delta", "seq": seq, "tw": tw / 1000.0, "tb": tb / 1000.0}
+        uci = decode_move(move)
+        if uci is not None:
+            msg["uci"] = uci
+        if result:
+            msg["result"] = RESULTS[result]
+        return msg
+    if t == MSG_STATE:
+        seq, turn, result, last_move, tw, tb = _STATE.unpack_from(mv, 1)
+        room_id, offset = _read_str(mv, 1 + _STATE.size)
+        fen, _ = _read_str(mv, offset)
+        return {
+            "type": "state", "room_id": room_id, "seq": seq, "fen": fen, "turn": COLORS[turn],
+            "result": RESULTS[result], "last_move": decode_move(last_move),
+            "time_white": tw / 1000.0, "time_black": tb / 1000.0,
+        }
+    if t == MSG_JOIN:
+        (protocol,) = _U8.unpack_from(mv, 1)
+        game_id, _ = _read_str(mv, 2)
+        return {"type": "join", "game_id": game_id, "protocol": protocol}
+    if t == MSG_JOINED:
+        color, protocol = _JOINED.unpack_from(mv, 1)
+        room_id, _ = _read_str(mv, 1 + _JOINED.size)
+        return {"type": "joined", "room_id": room_id, "color": COLORS[color], "protocol": protocol}
+    for name, code in _EMPTY_TYPES.items():
+        if t == code:
+            return {"type": name}
+    for name, (code, field) in _REASON_TYPES.items():
+        if t == code:
+            return {"type": name, field: _read_str(mv, 1)[0]}
+    raise WireError(f"unknown message type {t}")
+
+
+# ============================================================
+# 4. STREAM READERS
+# ============================================================
+
+class _ReaderBase:
+    def __init__(self, initial: bytes = b""):
+        self._buf = bytearray(initial)
+        self._pos = 0    # đầu message chưa xử lý
+        self._last = 0   # đầu message vừa trả về bởi next()
+
+    def feed(self, data: bytes) -> None:
+        if self._pos:
+            # Bỏ phần đã xử lý (chỉ còn phần message dở dang -> rẻ)
+            del self._buf[:self._pos]
+            self._pos = self._last = 0
+        self._buf += data
+
+    def peek_rest(self, include_current: bool = False) -> bytes:
+        """Các byte chưa xử lý (include_current: tính từ đầu message vừa trả về bởi next())."""
+        return bytes(self._buf[self._last if include_current else self._pos:])
+
+    def take_rest(self, include_current: bool = False) -> bytes:
+        """Lấy (và xoá) các byte chưa xử lý, để chuyển sang reader / process khác."""
+        rest = self.peek_rest(include_current)
+        self._buf.clear()
+        self._pos = self._last = 0
+        return rest
+
+    @property
+    def pending_bytes(self) -> int:
+        return len(self._buf) - self._pos
+
+
+class JsonLineReader(_ReaderBase):
+    """next() -> dòng (str, chưa parse JSON) hoặc None nếu chưa đủ dòng."""
+
+    framing = FRAMING_JSON
+
+    def next(self) -> Optional[str]:
+        end = self._buf.find(b"\n", self._pos)
+        if end < 0:
+            return None
+        line = self._buf[self._pos:end].decode("utf-8", errors="replace")
+        self._last, self._pos = self._pos, end + 1
+        return line
+
+
+class BinaryFrameReader(_ReaderBase):
+    """next() -> dict đã decode hoặc None nếu frame chưa nhận đủ. Raise WireError nếu frame hỏng."""
+
+    framing = FRAMING_BINARY
+
+    def next(self) -> Optional[Dict[str, Any]]:
+        buf, pos = self._buf, self._pos
+        if len(buf) - pos < 4:
+            return None
+        (length,) = struct.unpack_from(">I", buf, pos)
+        if length == 0 or length > MAX_FRAME_BYTES:
+            raise WireError(f"bad frame length {length}")
+        end = pos + 4 + length
+        if len(buf) < end:
+            return None
+        # memoryview trên chính buffer (không copy); hết tham chiếu khi return nên
+        # feed() sau đó vẫn resize bytearray được
+        try:
+            msg = decode_payload(memoryview(buf)[pos + 4:end])
+        except (struct.error, IndexError, UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise WireError(f"bad frame: {e}") from None
+        self._last, self._pos = pos, end
+        return msg
+
+
+def make_reader(framing: str, initial: bytes = b"") -> Union[JsonLineReader, BinaryFrameReader]:
+    return BinaryFrameReader(initial) if framing == FRAMING_BINARY else JsonLineReader(initial)
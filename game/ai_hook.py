@@ -18,11 +18,8 @@ except ImportError:
     class Board:
         def export_fen(self): return "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
 
-from ai.api import (
-    choose_move_from_fen, 
-    get_available_agents,
-    create_ai_for_difficulty
-)
+# ai.api được import lười trong từng hàm: game khởi động không phải load AI
+# (minimax, và torch nếu chọn transformer) cho tới khi thật sự cần bot.
 
 # =============================================================================
 # MAIN FUNCTION
@@ -58,6 +55,7 @@ def choose_move_for_game(
     # 2. Gọi AI qua API
     try:
         # Đây là hàm chúng ta đã viết trong ai/api.py
+        from ai.api import choose_move_from_fen
         result = choose_move_from_fen(fen, agent_spec)
     except Exception as e:
         print(f"[AI HOOK] ❌ LỖI GỌI AI: {e}")
@@ -100,6 +98,7 @@ def create_ai_config(difficulty: str = "medium") -> dict:
         return {"type": "minimax", "level": "hard", "use_advanced_eval": True}
         
     if diff in ["easy", "medium", "hard", "expert", "master"]:
+        from ai.api import create_ai_for_difficulty
         return create_ai_for_difficulty(diff)
     
     # Mặc định
@@ -74,3 +74,8 @@ CHESS_TIME_LIMIT_SEC = 300
 # Online server config (sửa IP này sang IP / domain server của bạn khi cần)
 ONLINE_SERVER_HOST = "127.0.0.1"
 ONLINE_SERVER_PORT = 5000
+# Framing với server: "binary" (gọn, parse nhanh) hoặc "json" (JSON lines, dễ debug)
+ONLINE_WIRE_FRAMING = "binary"
+# Time control khi tạo phòng online (server quản lý clock):
+# initial / increment (cộng sau mỗi nước) / delay (giây đầu mỗi lượt không bị trừ), đơn vị giây
+ONLINE_TIME_CONTROL = {"initial": CHESS_TIME_LIMIT_SEC, "increment": 0, "delay": 0}
@@ -3,6 +3,11 @@ import threading
 import json
 from typing import Optional, List, Dict, Any
 
+from core.wire import FRAMING_JSON, JsonLineReader, WireError, encode, encode_line, make_reader
+
+# Protocol client hỗ trợ (gửi kèm "join"); server trả về version thực dùng trong "joined"
+PROTOCOL_VERSION = 2
+
 
 class NetworkClient:
     """
@@ -10,12 +15,17 @@ class NetworkClient:
     - connect(host, port)
     - send_message(dict)
     - poll_messages() -> list[dict]
+
+    framing="binary": lúc connect gửi "hello" để chuyển sang binary frame (core/wire.py);
+    server không hỗ trợ thì giữ JSON lines.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, framing: str = FRAMING_JSON) -> None:
         self._sock: Optional[socket.socket] = None
         self._recv_thread: Optional[threading.Thread] = None
-        self._recv_buffer = ""
+        self._requested_framing = framing
+        self.framing = FRAMING_JSON  # framing đang dùng (sau thương lượng)
+        self._reader = JsonLineReader()
         self._incoming_lock = threading.Lock()
         self._incoming: List[Dict[str, Any]] = []
         self.connected: bool = False
@@ -28,6 +38,8 @@ class NetworkClient:
         s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         s.settimeout(timeout)
         s.connect((host, port))
+        if self._requested_framing != FRAMING_JSON:
+            self._negotiate_framing(s, self._requested_framing)
         s.settimeout(None)  # để thread recv block bình thường
 
         self._sock = s
@@ -38,6 +50,27 @@ class NetworkClient:
         )
         self._recv_thread.start()
 
+    def _negotiate_framing(self, s: socket.socket, framing: str) -> None:
+        """Gửi hello (JSON line), chờ trả lời rồi mới đổi framing (vẫn trong timeout của connect)."""
+        s.sendall(encode_line({"type": "hello", "framing": framing}))
+        line = self._reader.next()
+        while line is None:
+            data = s.recv(4096)
+            if not data:
+                raise ConnectionError("socket closed during hello")
+            self._reader.feed(data)
+            line = self._reader.next()
+
+        try:
+            reply = json.loads(line)
+        except json.JSONDecodeError:
+            reply = {}
+        if reply.get("type") == "hello" and reply.get("framing") == framing:
+            self.framing = framing
+            self._reader = make_reader(framing, self._reader.take_rest())
+        else:
+            print(f"[NET] server does not support {framing} framing, using json")
+
     def close(self) -> None:
         self.connected = False
         if self._sock is not None:
@@ -56,9 +89,9 @@ class NetworkClient:
         if not self.connected or self._sock is None:
             raise RuntimeError("Not connected")
 
-        data = json.dumps(msg) + "\n"
+        data = encode(msg, self.framing)
         try:
-            self._sock.sendall(data.encode("utf-8"))
+            self._sock.sendall(data)
         except OSError:
             self.close()
             raise
@@ -81,31 +114,37 @@ class NetworkClient:
 
         try:
             while self.connected:
-                data = s.recv(4096)
+                data = s.recv(65536)
                 if not data:
                     print("[NET] socket closed by server")
                     break
 
-                chunk = data.decode("utf-8")
-                # print("[NET] raw recv:", repr(chunk))      # DEBUG
-                self._recv_buffer += chunk
-
-                while "\n" in self._recv_buffer:
-                    line, self._recv_buffer = self._recv_buffer.split("\n", 1)
-                    line = line.strip()
-                    if not line:
-                        continue
-                    print("[NET] line:", repr(line))       # DEBUG
-                    try:
-                        msg = json.loads(line)
-                    except json.JSONDecodeError as e:
-                        print("[NET] json error:", e, "line=", repr(line))
-                        continue
+                # print("[NET] raw recv:", repr(data))      # DEBUG
+                self._reader.feed(data)
+
+                while True:
+                    item = self._reader.next()
+                    if item is None:
+                        break
+                    if isinstance(item, str):
+                        line = item.strip()
+                        if not line:
+                            continue
+                        print("[NET] line:", repr(line))       # DEBUG
+                        try:
+                            msg = json.loads(line)
+                        except json.JSONDecodeError as e:
+                            print("[NET] json error:", e, "line=", repr(line))
+                            continue
+                    else:
+                        msg = item  # binary frame đã decode
 
                     # print("[NET] msg:", msg)              # DEBUG
                     with self._incoming_lock:
                         self._incoming.append(msg)
 
+        except WireError as e:
+            print("[NET] protocol error:", e)
         except OSError:
             pass
         finally:
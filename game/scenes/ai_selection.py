@@ -3,7 +3,6 @@ import pygame
 from .base import SceneBase
 from game.ui.widgets import Button
 from game.config import SCREEN_WIDTH, SCREEN_HEIGHT, COLOR_BG, COLOR_TEXT
-from ai.api import get_available_agents
 
 
 class AISelectionScene(SceneBase):
@@ -19,6 +18,8 @@ class AISelectionScene(SceneBase):
         start_y = 180
         gap = 75
 
+        # Import lười: chỉ load ai.api khi người chơi mở màn chọn bot
+        from ai.api import get_available_agents
         agents = get_available_agents()
 
         for key, info in agents.items():
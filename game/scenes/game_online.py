@@ -64,10 +64,12 @@ class GameOnlineScene(SceneBase):
          # Chưa nhận state nào từ server
         self._has_initial_state: bool = False
 
+        # Protocol v2: seq của state đã apply; mất delta -> gửi resync, bỏ qua delta tới khi có snapshot
+        self._seq: int = -1
+        self._awaiting_resync: bool = False
 
-        self.legal_moves_uci: List[str] = []  # chỉ dùng để highlight / client-side UX
-
-        self.legal_moves_uci: List[str] = generate_legal_moves(self.board)
+        # Legal moves chỉ dùng để highlight / client-side UX -> tính lười khi cần (click)
+        self._legal_moves_cache: Optional[List[str]] = None
 
         # Trạng thái game
         self.game_over = False
@@ -105,6 +107,12 @@ class GameOnlineScene(SceneBase):
         rank_to = int(uci[3]) - 1
         return (file_from, rank_from), (file_to, rank_to)
 
+    @property
+    def legal_moves_uci(self) -> List[str]:
+        if self._legal_moves_cache is None:
+            self._legal_moves_cache = generate_legal_moves(self.board)
+        return self._legal_moves_cache
+
     def _legal_moves_from_square(self, file: int, rank: int) -> List[str]:
         res: List[str] = []
         for uci in self.legal_moves_uci:
@@ -303,65 +311,106 @@ class GameOnlineScene(SceneBase):
 
     # ---------- Networking ----------
 
+    def _sync_clock(self, tw: Any, tb: Any) -> None:
+        """Lấy clock từ server + set mốc sync để nội suy."""
+        if isinstance(tw, (int, float)):
+            self._server_white_time = float(tw)
+        if isinstance(tb, (int, float)):
+            self._server_black_time = float(tb)
+        self._last_clock_sync = pygame.time.get_ticks() / 1000.0
+
+        # Giá trị hiển thị ban đầu = giá trị server
+        self.white_time_sec = self._server_white_time
+        self.black_time_sec = self._server_black_time
+
+    def _set_last_move(self, last_uci: Any) -> None:
+        self.last_move_squares = []
+        if isinstance(last_uci, str):
+            (sf, sr), (tf, tr) = self._uci_to_from_to(last_uci)
+            self.last_move_squares = [(sf, sr), (tf, tr)]
+
+    def _update_turn_info(self, turn: str) -> None:
+        self.info_text = (
+            f"Room {self.room_id}\n"
+            f"You are {self.player_color}\n"
+            f"Turn: {turn}"
+        )
+
+    def _request_resync(self, reason: str) -> None:
+        print(f"[NET] resync requested: {reason}")
+        self._awaiting_resync = True
+        try:
+            self.client.send_message({"type": "resync"})
+        except Exception:
+            self.status_text = "Failed to resync"
+
+    def _apply_state(self, msg: Dict[str, Any]) -> None:
+        """Full snapshot: v1 mỗi nước, v2 khi join / resync."""
+        fen = msg.get("fen")
+        if isinstance(fen, str):
+            self.board.import_fen(fen)
+
+        self._has_initial_state = True
+        self._awaiting_resync = False
+        seq = msg.get("seq")
+        if isinstance(seq, int):
+            self._seq = seq
+
+        self._set_last_move(msg.get("last_move"))
+        turn = msg.get("turn", "white")
+        self._sync_clock(msg.get("time_white"), msg.get("time_black"))
+        self._update_turn_info(turn)
+
+        if isinstance(fen, str):
+            parts = fen.split()
+            if len(parts) >= 6:
+                try:
+                    fullmove = int(parts[5])
+                except ValueError:
+                    fullmove = 1
+                # fullmove: 1,2,3...
+                base_ply = (fullmove - 1) * 2
+                # nếu tới lượt đen thì đã có thêm 1 ply
+                self.ply_count = base_ply + (0 if turn == "white" else 1)
+            else:
+                self.ply_count = 0
+
+        self._update_game_status_from_server(msg.get("result", "ongoing"))
+        self._legal_moves_cache = None
+
+    def _apply_delta(self, msg: Dict[str, Any]) -> None:
+        """Delta v2: apply nước đi lên board hiện có, không import FEN."""
+        if not self._has_initial_state or self._awaiting_resync:
+            return  # snapshot sẽ tới sau
+
+        seq = msg.get("seq")
+        if not isinstance(seq, int) or seq != self._seq + 1:
+            self._request_resync(f"seq gap {self._seq} -> {seq}")
+            return
+
+        uci = msg.get("uci")
+        if isinstance(uci, str):
+            try:
+                self.board.apply_uci(uci)
+            except ValueError:
+                self._request_resync(f"cannot apply {uci}")
+                return
+            self._set_last_move(uci)
+            self.ply_count += 1
+            self._legal_moves_cache = None
+
+        self._seq = seq
+        self._sync_clock(msg.get("tw"), msg.get("tb"))
+        self._update_turn_info("white" if self.board.turn_white else "black")
+        self._update_game_status_from_server(msg.get("result", "ongoing"))
+
     def _handle_server_message(self, msg: Dict[str, Any]) -> None:
         mtype = msg.get("type")
         if mtype == "state":
-            print("Received state from server")
-            fen = msg.get("fen")
-            if isinstance(fen, str):
-                self.board.import_fen(fen)
-
-            self._has_initial_state = True
-
-            self.last_move_squares = []
-            last_uci = msg.get("last_move")
-            if isinstance(last_uci, str):
-                (sf, sr), (tf, tr) = self._uci_to_from_to(last_uci)
-                self.last_move_squares = [(sf, sr), (tf, tr)]
-
-            turn = msg.get("turn", "white")
-
-            # ====== CLOCK: lấy từ server + set mốc sync ======
-            tw = msg.get("time_white")
-            tb = msg.get("time_black")
-            if isinstance(tw, (int, float)):
-                self._server_white_time = float(tw)
-            if isinstance(tb, (int, float)):
-                self._server_black_time = float(tb)
-            self._last_clock_sync = pygame.time.get_ticks() / 1000.0
-
-            # Giá trị hiển thị ban đầu = giá trị server
-            self.white_time_sec = self._server_white_time
-            self.black_time_sec = self._server_black_time
-
-            #!
-            # self.status_text = f"Your color: {self.player_color}\n" f"Turn: {turn}"
-
-            self.info_text = (
-                f"Room {self.room_id}\n"
-                f"You are {self.player_color}\n"
-                f"Turn: {turn}"
-            )
+            self._apply_state(msg)
 
-            if isinstance(fen, str):
-                parts = fen.split()
-                if len(parts) >= 6:
-                    try:
-                        fullmove = int(parts[5])
-                    except ValueError:
-                        fullmove = 1
-                    # fullmove: 1,2,3...
-                    base_ply = (fullmove - 1) * 2
-                    # nếu tới lượt đen thì đã có thêm 1 ply
-                    self.ply_count = base_ply + (0 if turn == "white" else 1)
-                else:
-                    self.ply_count = 0
-
-            result = msg.get("result", "ongoing")
-            self._update_game_status_from_server(result)
-
-            # Cập nhật legal moves client-side (chỉ để highlight)
-            self.legal_moves_uci = generate_legal_moves(self.board)
+        elif mtype == "delta":
+            self._apply_delta(msg)
 
         elif mtype == "move_rejected":
             reason = msg.get("reason", "unknown")
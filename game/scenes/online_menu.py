@@ -13,8 +13,10 @@ from game.config import (
     COLOR_TEXT,
     ONLINE_SERVER_HOST,
     ONLINE_SERVER_PORT,
+    ONLINE_WIRE_FRAMING,
+    ONLINE_TIME_CONTROL,
 )
-from game.network_client import NetworkClient
+from game.network_client import NetworkClient, PROTOCOL_VERSION
 from .game_online import GameOnlineScene
 
 
@@ -89,7 +91,7 @@ class OnlineMenuScene(SceneBase):
         Tạo connection dùng tạm trong menu (host/list/join).
         Mỗi lần gọi tạo mới, xong việc thì hoặc đóng hoặc chuyển qua GameOnlineScene.
         """
-        client = NetworkClient()
+        client = NetworkClient(framing=ONLINE_WIRE_FRAMING)
         try:
             client.connect(ONLINE_SERVER_HOST, ONLINE_SERVER_PORT)
         except Exception as e:
@@ -128,7 +130,12 @@ class OnlineMenuScene(SceneBase):
         if client is None:
             return
 
-        client.send_message({"type": "join", "game_id": None})
+        client.send_message({
+            "type": "join",
+            "game_id": None,
+            "protocol": PROTOCOL_VERSION,
+            "time_control": ONLINE_TIME_CONTROL,
+        })
 
         msg = self._wait_for_message(client, ["joined"])
         if msg is None:
@@ -229,7 +236,7 @@ class OnlineMenuScene(SceneBase):
         if client is None:
             return
 
-        client.send_message({"type": "join", "game_id": room_id})
+        client.send_message({"type": "join", "game_id": room_id, "protocol": PROTOCOL_VERSION})
 
         msg = self._wait_for_message(client, ["joined", "join_failed"])
         if msg is None:
@@ -0,0 +1,68 @@
+# scripts/analyze_positions.py
+"""
+Phân tích hàng loạt thế cờ (ai.api.analyze_positions) -> JSON-lines.
+
+Input: file FEN (mỗi dòng 1 FEN) hoặc PGN (--pgn: mọi thế cờ trước mỗi nước đi
+của mọi ván). Kết quả được ghi ngay khi từng thế cờ xong (thứ tự hoàn thành,
+mỗi dòng có "index").
+
+Usage:
+    python -m scripts.analyze_positions positions.fen --out analysis.jsonl --workers 8 \\
+        --spec '{"type": "minimax", "depth": 4}'
+    python -m scripts.analyze_positions archive.pgn.gz --pgn --out analysis.jsonl
+"""
+import argparse
+import io
+import json
+import os
+import time
+from typing import Iterator
+
+from ai.api import analyze_positions
+
+
+def iter_fens(path: str, pgn: bool) -> Iterator[str]:
+    from ai.ml.pgn_shards import iter_game_texts, open_text
+
+    if not pgn:
+        with open_text(path) as f:
+            for line in f:
+                if line.strip():
+                    yield line.strip()
+        return
+
+    import chess.pgn
+
+    for text in iter_game_texts(path):
+        game = chess.pgn.read_game(io.StringIO(text))
+        if game is None:
+            continue
+        board = game.board()
+        for move in game.mainline_moves():
+            yield board.fen()
+            board.push(move)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk position analysis")
+    parser.add_argument("input", help="File FEN hoặc PGN (.gz / .bz2 được)")
+    parser.add_argument("--pgn", action="store_true", help="Input là PGN")
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--spec", default='{"type": "minimax", "level": "hard"}', help="agent_spec JSON")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    start = time.time()
+    count = 0
+    results = analyze_positions(iter_fens(args.input, args.pgn), json.loads(args.spec), args.workers, stream=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        for result in results:
+            f.write(json.dumps(result) + "\n")
+            count += 1
+            if count % 1000 == 0:
+                print(f"[ANALYZE] {count} positions ({count / (time.time() - start):.1f}/s)")
+    print(f"[ANALYZE] Done: {count} positions in {time.time() - start:.1f}s -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# scripts/bench_batching.py
+"""
+Benchmark: N game đồng thời gọi TransformerAgent.
+So sánh forward batch-1 riêng lẻ với hàng đợi gom batch (ai.api.get_transformer_service).
+
+Usage:
+    python -m scripts.bench_batching --games 32 --plies 20
+"""
+import argparse
+import random
+import threading
+import time
+
+import chess
+
+from ai.api import _create_agent, shutdown_batch_queues
+
+
+def _play(agent, plies: int, seed: int, counter: list, lock: threading.Lock):
+    rng = random.Random(seed)
+    board = chess.Board()
+    for _ in range(plies):
+        if board.is_game_over():
+            break
+        move, _ = agent.choose_move(board)
+        # Đi random xen kẽ để các game không trùng lịch sử
+        if rng.random() < 0.5:
+            move = rng.choice(list(board.legal_moves))
+        board.push(move)
+        with lock:
+            counter[0] += 1
+
+
+def run(games: int, plies: int, spec: dict) -> float:
+    # Chế độ batched: các agent dùng chung 1 model + 1 queue
+    agents = [_create_agent(spec) for _ in range(games)]
+
+    counter = [0]
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=_play, args=(agents[i], plies, i, counter, lock))
+        for i in range(games)
+    ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return counter[0] / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=32)
+    parser.add_argument("--plies", type=int, default=20)
+    parser.add_argument("--model", default="models/transformer_chess.pth")
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    base = {"type": "transformer", "model_path": args.model}
+    for n in sorted({1, 8, args.games}):
+        single = run(n, args.plies, base)
+        batched = run(n, args.plies, {
+            **base, "batched": True, "max_batch": args.max_batch, "max_wait_ms": args.max_wait_ms,
+        })
+        print(f"games={n:3d} | batch-1: {single:8.1f} moves/s | batched: {batched:8.1f} moves/s")
+    shutdown_batch_queues()
+
+
+if __name__ == "__main__":
+    main()
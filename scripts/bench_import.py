@@ -0,0 +1,86 @@
+# scripts/bench_import.py
+"""
+Benchmark thời gian import lúc khởi động (mỗi module chạy trong 1 process mới).
+
+Kiểm tra luôn các module "nhẹ" KHÔNG kéo theo torch: game / server / minimax chỉ
+được load torch khi thật sự tạo TransformerAgent. Exit code 1 nếu có module vi
+phạm hoặc vượt --budget-ms -> dùng được trong CI / trước khi build bản kiosk.
+
+Usage:
+    python -m scripts.bench_import
+    python -m scripts.bench_import --budget-ms 400 --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# module -> các module nặng không được phép có trong sys.modules sau khi import
+LIGHT_MODULES = {
+    "ai.api": ["torch"],
+    "ai.ml": ["torch", "joblib"],
+    "ai.ml.utils": ["torch", "joblib"],
+    "ai.ml.pgn_shards": ["torch"],
+    "game.ai_hook": ["torch", "ai.api"],
+    "scripts.run_game": ["torch", "ai.api"],
+    "main": ["torch", "ai.api"],
+}
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t0
+print(json.dumps({{"ms": elapsed * 1000, "loaded": [m for m in {forbidden!r} if m in sys.modules]}}))
+"""
+
+
+def probe(module: str, forbidden, cwd: str) -> dict:
+    proc = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(module=module, forbidden=list(forbidden))],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        last = (proc.stderr.strip().splitlines() or ["?"])[-1]
+        return {"error": last}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup import-time benchmark")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--budget-ms", type=float, default=None, help="Fail nếu median vượt ngưỡng")
+    parser.add_argument("modules", nargs="*", help="Mặc định: LIGHT_MODULES")
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    modules = {m: LIGHT_MODULES.get(m, ["torch"]) for m in args.modules} or LIGHT_MODULES
+
+    failed = False
+    print(f"{'module':<20} {'median ms':>10}  status")
+    for module, forbidden in modules.items():
+        runs = [probe(module, forbidden, root) for _ in range(max(1, args.repeat))]
+        errors = [r["error"] for r in runs if "error" in r]
+        if errors:
+            # VD thiếu pygame trên máy build: báo nhưng không tính là lỗi lazy import
+            print(f"{module:<20} {'-':>10}  SKIP ({errors[0]})")
+            continue
+
+        median = statistics.median(r["ms"] for r in runs)
+        loaded = sorted({m for r in runs for m in r["loaded"]})
+        status = "OK"
+        if loaded:
+            status, failed = f"FAIL: loaded {', '.join(loaded)}", True
+        elif args.budget_ms is not None and median > args.budget_ms:
+            status, failed = f"FAIL: > {args.budget_ms:.0f} ms", True
+        print(f"{module:<20} {median:>10.1f}  {status}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
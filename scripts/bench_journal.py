@@ -0,0 +1,118 @@
+# scripts/bench_journal.py
+"""
+Benchmark write-ahead journal của server (server/journal.py), không cần mở socket:
+- ghi: --games ván ngẫu nhiên hợp lệ (tổng ~--moves nước) qua GameRoom.make_move có / không
+  có journal, xen kẽ --rounds lượt (máy ồn: so median, không so 1 lần chạy)
+  -> độ trễ thêm mỗi nước đi + CPU của writer thread mỗi record (encode / write; trên máy
+  ít core phần này cũng lấy từ thread server)
+- khôi phục: load_journal + recover_rooms từ journal vừa ghi (không snapshot -> replay toàn bộ)
+
+Usage:
+    python -m scripts.bench_journal --moves 100000 --games 1000 --rounds 3
+"""
+import argparse
+import contextlib
+import io
+import random
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+import chess
+
+from server import main as core
+from server.journal import Journal, load_journal
+
+
+def random_games(games: int, plies: int, rng: random.Random) -> list:
+    """Ván ngẫu nhiên chưa kết thúc, mỗi ván tối đa `plies` nước (UCI)."""
+    result = []
+    for _ in range(games):
+        board, moves = chess.Board(), []
+        while len(moves) < plies:
+            legal = list(board.legal_moves)
+            move = rng.choice(legal)
+            board.push(move)
+            if board.is_game_over():
+                board.pop()
+                break
+            moves.append(move.uci())
+        result.append(moves)
+    return result
+
+
+def play(games: list) -> tuple:
+    """Đi lại các ván qua GameRoom.make_move (xen kẽ giữa các phòng). Trả về (số nước, giây)."""
+    rooms = []
+    with contextlib.redirect_stdout(io.StringIO()):  # bỏ log [ROOM] của từng phòng
+        for _ in games:
+            room = core.create_room(core.TimeControl(3600.0, 0.0, 0.0))
+            room.ensure_started()
+            rooms.append(room)
+    total, elapsed = 0, 0.0
+    for ply in range(max(len(g) for g in games)):
+        for room, moves in zip(rooms, games):
+            if ply < len(moves):
+                color = "white" if ply % 2 == 0 else "black"
+                t0 = time.perf_counter()
+                room.make_move(color, moves[ply])
+                elapsed += time.perf_counter() - t0
+                total += 1
+    for room in rooms:
+        core.clock_wheel.cancel(room.flag_timer)
+    core.rooms.clear()
+    return total, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server journal benchmark")
+    parser.add_argument("--moves", type=int, default=100000)
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    games = random_games(args.games, max(1, args.moves // args.games), rng)
+    directory = tempfile.mkdtemp(prefix="chess-journal-")
+    try:
+        base, journaled, writer_cpu, drains = [], [], [], []
+        for round_no in range(args.rounds):
+            total, elapsed = play(games)
+            base.append(elapsed / total)
+
+            round_dir = os.path.join(directory, f"round-{round_no}")
+            journal = core.journal = Journal(round_dir)
+            total, elapsed = play(games)
+            t0 = time.perf_counter()
+            core.stop_journal()
+            drains.append(time.perf_counter() - t0)
+            journaled.append(elapsed / total)
+            # Đọc stats sau close: gồm cả phần writer ghi nốt lúc đóng
+            stats = journal.stats()
+            writer_cpu.append(stats["journal_writer_cpu_us"] / stats["journal_records"])
+            print(f"[JOURNAL] round {round_no + 1}: {base[-1] * 1e6:.1f} us/move without, "
+                  f"{journaled[-1] * 1e6:.1f} us/move with journal, "
+                  f"writer {writer_cpu[-1]:.1f} us/record, {stats['journal_commits']} fsyncs")
+
+        base_us = statistics.median(base) * 1e6
+        journal_us = statistics.median(journaled) * 1e6
+        print(f"[JOURNAL] median of {args.rounds}: {total} moves, {base_us:.1f} -> {journal_us:.1f} us/move "
+              f"({journal_us - base_us:+.1f} us), writer thread {statistics.median(writer_cpu):.1f} us CPU/record, "
+              f"drain on close {max(drains) * 1000:.0f} ms")
+
+        t0 = time.perf_counter()
+        states, replayed = load_journal(round_dir)
+        t1 = time.perf_counter()
+        restored, moves = core.recover_rooms(states)
+        t2 = time.perf_counter()
+        print(f"[JOURNAL] recovery: {replayed} records -> {restored} rooms / {moves} moves in {t2 - t0:.2f}s "
+              f"(load {t1 - t0:.2f}s, rebuild {t2 - t1:.2f}s)")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
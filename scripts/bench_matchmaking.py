@@ -0,0 +1,56 @@
+# scripts/bench_matchmaking.py
+"""
+Benchmark hàng đợi ghép cặp (server/matchmaking.py), chạy trong 1 process, không cần server:
+- throughput: seek liên tục (rating ~ N(1500, 300), vài time control), đo seek/s và tỉ lệ ghép được
+- hàng đợi lớn: giữ sẵn --waiting người chờ với rating_range hẹp không ai khớp, đo chi phí
+  mỗi seek mới -> phải gần như không đổi theo số người đang chờ
+
+Usage:
+    python -m scripts.bench_matchmaking --seeks 200000 --waiting 100000
+"""
+import argparse
+import random
+import time
+
+from server.matchmaking import Matchmaker, Seek
+
+TIME_CONTROLS = [(60.0, 0.0, 0.0), (180.0, 2.0, 0.0), (300.0, 0.0, 0.0), (600.0, 5.0, 0.0)]
+
+
+def run_seeks(mm: Matchmaker, n: int, rng: random.Random, now: float) -> tuple:
+    paired = 0
+    t0 = time.perf_counter()
+    for i in range(n):
+        rating = min(3000.0, max(100.0, rng.gauss(1500, 300)))
+        seek = Seek(i, rating, rng.choice(TIME_CONTROLS), now)
+        if mm.add(seek, now) is not None:
+            paired += 2
+        now += 0.0005  # ~2000 seek/s theo đồng hồ ảo -> cửa sổ mở rộng dần
+    return time.perf_counter() - t0, paired
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Matchmaking queue benchmark")
+    parser.add_argument("--seeks", type=int, default=200000)
+    parser.add_argument("--waiting", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    mm = Matchmaker()
+    elapsed, paired = run_seeks(mm, args.seeks, rng, 0.0)
+    print(f"[MATCH] {args.seeks} seeks in {elapsed:.2f}s ({args.seeks / elapsed:,.0f} seek/s), "
+          f"paired {paired}, still waiting {len(mm)}")
+
+    # Người chờ chỉ nhận đối thủ ngoài [0, 4000] thực tế -> không bao giờ khớp, nằm lại hàng đợi
+    mm = Matchmaker()
+    for i in range(args.waiting):
+        rating = min(3000.0, max(100.0, rng.gauss(1500, 300)))
+        mm.add(Seek(-i - 1, rating, rng.choice(TIME_CONTROLS), 0.0, lo=3999.0, hi=4000.0), 0.0)
+    elapsed, paired = run_seeks(mm, args.seeks, rng, 0.0)
+    print(f"[MATCH] with {args.waiting} unmatchable waiting: {args.seeks / elapsed:,.0f} seek/s, "
+          f"paired {paired}")
+
+
+if __name__ == "__main__":
+    main()
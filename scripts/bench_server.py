@@ -0,0 +1,164 @@
+# scripts/bench_server.py
+"""
+Load test cho server online: mở N kết nối idle + một số cặp đang chơi, đo độ
+trễ round-trip (list_rooms / move) khi server đang giữ nhiều kết nối.
+
+Chạy server trước (VD: python -m server.main --mode async), rồi:
+    python -m scripts.bench_server --connections 10000 --pairs 50 --moves 20
+    python -m scripts.bench_server --server-pid <pid>   # in thêm RSS của server
+    python -m scripts.bench_server --connections 0 --pairs 5 --spectators 500  # phòng đông khán giả
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import List, Optional
+
+OPENING = ["e2e4", "e7e5", "g1f3", "b8c6", "f1c4", "g8f6", "d2d3", "f8c5", "c2c3", "d7d6"]
+
+
+async def _read_msg(reader: asyncio.StreamReader, wanted: str) -> dict:
+    while True:
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("server closed connection")
+        msg = json.loads(line)
+        if msg.get("type") == wanted:
+            return msg
+
+
+async def _send(writer: asyncio.StreamWriter, msg: dict) -> None:
+    writer.write((json.dumps(msg) + "\n").encode("utf-8"))
+    await writer.drain()
+
+
+async def open_idle(host: str, port: int, n: int, batch: int = 500) -> List[asyncio.StreamWriter]:
+    writers = []
+    for start in range(0, n, batch):
+        conns = await asyncio.gather(
+            *(asyncio.open_connection(host, port) for _ in range(min(batch, n - start))),
+            return_exceptions=True,
+        )
+        for c in conns:
+            if isinstance(c, Exception):
+                print(f"[BENCH] connect failed: {c}")
+                continue
+            writers.append(c[1])
+    return writers
+
+
+async def _drain(reader: asyncio.StreamReader) -> None:
+    while await reader.readline():
+        pass
+
+
+async def open_spectators(host: str, port: int, room_id: str, n: int) -> list:
+    """n khán giả (protocol 2) xem room_id; mỗi khán giả có 1 task đọc bỏ mọi update."""
+    out = []
+    for _ in range(n):
+        reader, writer = await asyncio.open_connection(host, port)
+        await _send(writer, {"type": "watch", "game_id": room_id, "protocol": 2})
+        await _read_msg(reader, "watching")
+        out.append((writer, asyncio.ensure_future(_drain(reader))))
+    return out
+
+
+async def play_pair(host: str, port: int, moves: int, latencies: List[float], spectators: int = 0) -> None:
+    r1, w1 = await asyncio.open_connection(host, port)
+    await _send(w1, {"type": "join", "game_id": ""})
+    joined = await _read_msg(r1, "joined")
+    r2, w2 = await asyncio.open_connection(host, port)
+    await _send(w2, {"type": "join", "game_id": joined["room_id"]})
+    await _read_msg(r2, "joined")
+    await _read_msg(r1, "state")
+    await _read_msg(r2, "state")
+    watchers = await open_spectators(host, port, joined["room_id"], spectators)
+
+    players = [(r1, w1), (r2, w2)]
+    for i in range(min(moves, len(OPENING))):
+        reader, writer = players[i % 2]
+        t0 = time.perf_counter()
+        await _send(writer, {"type": "move", "uci": OPENING[i]})
+        await _read_msg(reader, "state")
+        latencies.append((time.perf_counter() - t0) * 1000)
+        await _read_msg(players[(i + 1) % 2][0], "state")
+
+    for _, w in players:
+        w.close()
+    for w, task in watchers:
+        w.close()
+        task.cancel()
+
+
+async def list_rooms_latency(host: str, port: int, samples: int) -> List[float]:
+    reader, writer = await asyncio.open_connection(host, port)
+    out = []
+    for _ in range(samples):
+        t0 = time.perf_counter()
+        await _send(writer, {"type": "list_rooms"})
+        await _read_msg(reader, "rooms")
+        out.append((time.perf_counter() - t0) * 1000)
+    writer.close()
+    return out
+
+
+def _rss_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def _summary(name: str, values: List[float]) -> str:
+    if not values:
+        return f"{name}: -"
+    values = sorted(values)
+    p99 = values[min(len(values) - 1, int(len(values) * 0.99))]
+    return f"{name}: median {statistics.median(values):.2f} ms, p99 {p99:.2f} ms (n={len(values)})"
+
+
+async def main_async(args) -> None:
+    t0 = time.time()
+    idle = await open_idle(args.host, args.port, args.connections)
+    print(f"[BENCH] {len(idle)} idle connections open in {time.time() - t0:.1f}s")
+    if args.server_pid:
+        print(f"[BENCH] server RSS {_rss_mb(args.server_pid):.1f} MB")
+
+    move_latencies: List[float] = []
+    t0 = time.time()
+    await asyncio.gather(*(
+        play_pair(args.host, args.port, args.moves, move_latencies, args.spectators) for _ in range(args.pairs)
+    ))
+    print(f"[BENCH] {args.pairs} games x {args.moves} moves ({args.spectators} spectators/game) "
+          f"in {time.time() - t0:.1f}s")
+    print(_summary("move round-trip", move_latencies))
+    print(_summary("list_rooms round-trip", await list_rooms_latency(args.host, args.port, 20)))
+
+    for w in idle:
+        w.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server connection / latency load test")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--connections", type=int, default=10000)
+    parser.add_argument("--pairs", type=int, default=50)
+    parser.add_argument("--moves", type=int, default=10)
+    parser.add_argument("--spectators", type=int, default=0, help="Số khán giả mỗi ván")
+    parser.add_argument("--server-pid", type=int, default=None)
+    args = parser.parse_args()
+
+    from server.async_server import _raise_fd_limit
+
+    _raise_fd_limit()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
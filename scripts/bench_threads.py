@@ -0,0 +1,89 @@
+# scripts/bench_threads.py
+"""
+Benchmark: throughput inference TransformerAgent theo số thread intra-op.
+
+Với mỗi số agent chạy song song (mỗi agent 1 thread Python, dùng chung model)
+và mỗi thread budget, đo số thế cờ/giây. Khi agents * threads vượt số core,
+throughput tụt (oversubscription) -> chọn "threads" trong agent_spec sao cho
+agents * threads <= số core.
+
+Usage:
+    python -m scripts.bench_threads --agents 1 4 --threads 1 2 4 --batch 1 --seconds 3
+"""
+import argparse
+import copy
+import random
+import threading
+import time
+
+import chess
+
+from ai.ml.agent import TransformerAgent
+from ai.ml.threads import available_cpus
+
+
+def _random_boards(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    boards = []
+    for _ in range(n):
+        board = chess.Board()
+        for _ in range(rng.randint(0, 40)):
+            moves = list(board.legal_moves)
+            if not moves:
+                break
+            board.push(rng.choice(moves))
+        boards.append(board)
+    return boards
+
+
+def run(backend: TransformerAgent, n_agents: int, threads: int, batch: int, seconds: float) -> float:
+    boards = _random_boards(64)
+    encoded = [backend.encode_board(b) for b in boards]
+    counts = [0] * n_agents
+    stop = time.monotonic() + seconds
+
+    def worker(i: int):
+        agent = copy.copy(backend)
+        agent.threads = threads
+        rng = random.Random(i)
+        agent.predict_batch(rng.sample(encoded, batch))  # warm-up
+        while time.monotonic() < stop:
+            agent.predict_batch(rng.sample(encoded, batch))
+            counts[i] += batch
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(n_agents)]
+    start = time.monotonic()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return sum(counts) / (time.monotonic() - start)
+
+
+def main():
+    cpus = available_cpus()
+    parser = argparse.ArgumentParser(description="Throughput vs intra-op thread count")
+    parser.add_argument("--model", default="models/transformer_chess.pth")
+    parser.add_argument("--vocab", default="models/vocab.pkl")
+    parser.add_argument("--quantized", action="store_true", help="Dùng bản int8 TorchScript nếu có")
+    parser.add_argument("--agents", type=int, nargs="+", default=[1, cpus])
+    parser.add_argument("--threads", type=int, nargs="+", default=sorted({1, 2, 4, cpus}))
+    parser.add_argument("--batch", type=int, default=1)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    backend = TransformerAgent(model_path=args.model, vocab_path=args.vocab, use_quantized=args.quantized)
+    if not backend.is_ready:
+        raise SystemExit("[BENCH] Không load được model.")
+
+    print(f"[BENCH] {cpus} CPU khả dụng, batch {args.batch}, {args.seconds:.0f}s mỗi cấu hình")
+    print(f"{'agents':>6} {'threads':>7} {'total thr':>9} {'pos/s':>10}")
+    for n_agents in args.agents:
+        for threads in args.threads:
+            rate = run(backend, n_agents, threads, args.batch, args.seconds)
+            flag = "  (oversubscribed)" if n_agents * threads > cpus else ""
+            print(f"{n_agents:>6} {threads:>7} {n_agents * threads:>9} {rate:>10.1f}{flag}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# scripts/bench_wire.py
+"""
+So sánh framing JSON lines vs binary (core/wire.py): byte / message và thời gian
+parse 1 burst lớn (VD client nhận lại nhiều delta sau khi lag).
+
+Usage:
+    python -m scripts.bench_wire --messages 50000 --chunk 4096
+"""
+import argparse
+import json
+import time
+
+from core.wire import BinaryFrameReader, JsonLineReader, encode_frame, encode_line
+
+UCI = ["e2e4", "e7e5", "g1f3", "b8c6", "f1c4", "g8f6", "d2d3", "f8c5", "e1g1", "e8g8"]
+
+
+def sample_messages(n: int):
+    msgs = []
+    for i in range(n):
+        if i % 50 == 0:
+            msgs.append({
+                "type": "state", "room_id": "0a1b2c3d", "seq": i,
+                "fen": "r1bqk2r/pppp1ppp/2n2n2/2b1p3/2B1P3/3P1N2/PPP2PPP/RNBQK2R w KQkq - 1 5",
+                "turn": "white", "result": "ongoing", "last_move": "f8c5",
+                "time_white": 287.512, "time_black": 290.004,
+            })
+        else:
+            msgs.append({"type": "delta", "seq": i, "uci": UCI[i % len(UCI)], "tw": 287.512, "tb": 290.004})
+    return msgs
+
+
+def parse_str_split(blob: bytes, chunk: int) -> int:
+    """Cách cũ: nối str + split("\\n", 1) trong vòng lặp."""
+    buffer, count = "", 0
+    for i in range(0, len(blob), chunk):
+        buffer += blob[i:i + chunk].decode("utf-8")
+        while "\n" in buffer:
+            line, buffer = buffer.split("\n", 1)
+            if line.strip():
+                json.loads(line)
+                count += 1
+    return count
+
+
+def parse_reader(reader, blob: bytes, chunk: int) -> int:
+    count = 0
+    for i in range(0, len(blob), chunk):
+        reader.feed(blob[i:i + chunk])
+        while True:
+            item = reader.next()
+            if item is None:
+                break
+            if isinstance(item, str):
+                json.loads(item)
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Wire framing benchmark")
+    parser.add_argument("--messages", type=int, default=50000)
+    parser.add_argument("--chunk", type=int, default=65536, help="Kích thước mỗi lần recv()")
+    args = parser.parse_args()
+
+    msgs = sample_messages(args.messages)
+    json_blob = b"".join(encode_line(m) for m in msgs)
+    t0 = time.perf_counter()
+    bin_blob = b"".join(encode_frame(m) for m in msgs)
+    encode_s = time.perf_counter() - t0
+    print(f"[WIRE] {len(msgs)} messages: json {len(json_blob) / len(msgs):.1f} B/msg, "
+          f"binary {len(bin_blob) / len(msgs):.1f} B/msg (encode {encode_s * 1e6 / len(msgs):.2f} us/msg)")
+
+    for name, fn in [
+        ("json str.split", lambda: parse_str_split(json_blob, args.chunk)),
+        ("json reader", lambda: parse_reader(JsonLineReader(), json_blob, args.chunk)),
+        ("binary reader", lambda: parse_reader(BinaryFrameReader(), bin_blob, args.chunk)),
+    ]:
+        t0 = time.perf_counter()
+        count = fn()
+        elapsed = time.perf_counter() - t0
+        print(f"[WIRE] {name:15s}: {elapsed * 1000:8.1f} ms ({elapsed * 1e6 / count:.2f} us/msg)")
+
+
+if __name__ == "__main__":
+    main()
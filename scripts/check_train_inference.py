@@ -0,0 +1,119 @@
+# scripts/check_train_inference.py
+"""
+Kiểm tra train khớp inference: cùng 1 lịch sử nước đi phải cho cùng log-xác suất khi đi qua
+đường train (ShardSampleDataset + LengthBucketBatchSampler + collate_left_pad, pad theo batch)
+và qua TransformerAgent (encode_history pad đủ max_len).
+
+Model: --model (checkpoint có sẵn) hoặc model nhỏ khởi tạo ngẫu nhiên (không cần train).
+Shard: --games ván ngẫu nhiên, dài tới --max-plies nước (vượt max_len để thử cả cắt lịch sử).
+Exit code 1 nếu chênh lệch vượt --tol.
+
+Usage:
+    python -m scripts.check_train_inference
+    python -m scripts.check_train_inference --model models/transformer_chess.pth --games 20
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+import chess
+import numpy as np
+import torch
+
+from ai.ml.agent import TransformerAgent
+from ai.ml.checkpoint import load_checkpoint, save_checkpoint
+from ai.ml.model import ChessTransformer
+from ai.ml.pgn_shards import TOKEN_DTYPE, ShardWriter
+from ai.ml.train import PLY_STRIDE, LengthBucketBatchSampler, ShardSampleDataset, collate_left_pad
+from ai.ml.utils import ChessVocabulary
+
+
+def random_games(vocab: ChessVocabulary, games: int, max_plies: int, rng: random.Random) -> list:
+    result = []
+    for _ in range(games):
+        board, moves = chess.Board(), []
+        for _ in range(rng.randint(1, max_plies)):
+            legal = list(board.legal_moves)
+            if not legal:
+                break
+            move = rng.choice(legal)
+            if vocab.encode(move.uci()) == vocab.stoi[vocab.UNK_TOKEN]:
+                break
+            board.push(move)
+            moves.append(move.uci())
+        if moves:
+            result.append(moves)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check training collate vs TransformerAgent logits")
+    parser.add_argument("--model", default=None, help="checkpoint (mặc định: model nhỏ ngẫu nhiên)")
+    parser.add_argument("--vocab", default="models/vocab.pkl")
+    parser.add_argument("--games", type=int, default=8)
+    parser.add_argument("--max-plies", type=int, default=120)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--tol", type=float, default=1e-4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    torch.manual_seed(args.seed)
+    rng = random.Random(args.seed)
+    vocab = ChessVocabulary.load(args.vocab)
+    directory = tempfile.mkdtemp(prefix="chess-check-")
+    try:
+        model_path = os.path.join(directory, "model.pth")
+        if args.model:
+            model = load_checkpoint(args.model, vocab_size=vocab.vocab_size)
+        else:
+            model = ChessTransformer(vocab_size=vocab.vocab_size, d_model=64, nhead=4, num_layers=2,
+                                     dim_feedforward=128, max_seq_len=vocab.max_len)
+        if model.input_mode != "moves":
+            print(f"[CHECK] input_mode {model.input_mode!r}: input luôn dài cố định, không cần kiểm tra")
+            return
+        save_checkpoint(model, model_path)
+        model.eval()
+
+        games = random_games(vocab, args.games, args.max_plies, rng)
+        writer = ShardWriter(os.path.join(directory, "shards"), vocab.vocab_size)
+        for moves in games:
+            writer.add(np.asarray([vocab.encode(m) for m in moves], dtype=TOKEN_DTYPE).tobytes(), 0)
+        writer.close()
+
+        shard_dir = os.path.join(directory, "shards")
+        dataset = ShardSampleDataset(shard_dir, vocab, max_len=vocab.max_len)
+        sampler = LengthBucketBatchSampler(shard_dir, args.batch_size, max_len=vocab.max_len, seed=args.seed)
+        agent = TransformerAgent(model_path=model_path, vocab_path=args.vocab, use_quantized=False)
+        if not agent.is_ready:
+            print("[CHECK] TransformerAgent failed to load the model")
+            sys.exit(1)
+
+        worst, samples, widths = 0.0, 0, set()
+        for keys in sampler:
+            inputs, mask, _, _ = collate_left_pad([dataset[k] for k in keys])
+            widths.add(inputs.size(1))
+            with torch.no_grad():
+                train_logp = torch.log_softmax(model(inputs, mask), dim=1)
+            for row, key in enumerate(keys):
+                game_idx, ply = divmod(int(key), PLY_STRIDE)
+                board = chess.Board()
+                for uci in games[game_idx][:ply]:
+                    board.push_uci(uci)
+                agent_probs = agent.predict_batch([agent.encode_board(board)])[0]
+                worst = max(worst, (train_logp[row] - agent_probs.log()).abs().max().item())
+                samples += 1
+
+        print(f"[CHECK] {samples} samples, batch widths {min(widths)}..{max(widths)} "
+              f"vs inference {vocab.max_len}: max |d log p| = {worst:.2e} (tol {args.tol:.0e})")
+        if worst > args.tol:
+            print("[CHECK] FAILED: training input does not match inference")
+            sys.exit(1)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+# server/async_server.py
+"""
+Server asyncio (1 thread, 1 event loop) thay cho thread-per-connection.
+
+- Dùng asyncio.Protocol: mỗi kết nối chỉ là 1 object Protocol + transport,
+  không có thread / task / stack riêng -> 10k+ kết nối idle trên 1 core.
+- Giữ nguyên protocol (JSON lines / binary frame, core/wire.py) và GameRoom: dữ liệu
+  nhận được tách message bằng session.reader rồi đưa vào server.main như server thread.
+- Mọi handler chạy tuần tự trên event loop nên room logic không có race;
+  use_thread_locks(False) thay threading.Lock bằng lock giả.
+- Gửi: frame xếp hàng trong AsyncConnection, cuối tick gộp thành 1 transport.write();
+  client đọc chậm vượt HIGH_WATER_BYTES bị ngắt (server/outbound.py).
+
+Usage:
+    python -m server.main --mode async --port 5000
+"""
+import asyncio
+import socket
+from typing import Optional
+
+from core.wire import FRAMING_JSON, WireError
+from server import main as core
+from server.outbound import (
+    HIGH_WATER_BYTES,
+    OutboundMetrics,
+    record_slow_disconnect,
+    register,
+)
+
+
+class AsyncConnection:
+    """
+    Bọc transport asyncio, có sendall()/close() như socket cho send_json.
+    Frame gửi trong cùng 1 tick được gộp, flush 1 lần bằng loop.call_soon.
+    """
+
+    __slots__ = ("transport", "framing", "metrics", "_loop", "_pending", "_flush_scheduled", "__weakref__")
+
+    def __init__(self, transport: asyncio.Transport):
+        self.transport = transport
+        self.framing = FRAMING_JSON
+        self.metrics = OutboundMetrics()
+        self._loop = asyncio.get_running_loop()
+        self._pending: list = []
+        self._flush_scheduled = False
+        register(self)
+
+    def queue_depth(self) -> int:
+        return self.metrics.queued_bytes + self.transport.get_write_buffer_size()
+
+    def is_closing(self) -> bool:
+        return self.transport.is_closing()
+
+    def sendall(self, data: bytes) -> None:
+        if self.transport.is_closing():
+            raise OSError("connection closed")
+        m = self.metrics
+        m.queued_bytes += len(data)
+        m.queued_frames += 1
+        depth = self.queue_depth()
+        if depth > HIGH_WATER_BYTES:
+            record_slow_disconnect(depth)
+            self._pending = []
+            self.transport.abort()
+            raise OSError("slow consumer disconnected")
+        if depth > m.max_queued_bytes:
+            m.max_queued_bytes = depth
+        self._pending.append(data)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            self._loop.call_soon(self.flush)
+
+    def flush(self) -> None:
+        self._flush_scheduled = False
+        if not self._pending:
+            return
+        chunks, self._pending = self._pending, []
+        m = self.metrics
+        m.queued_bytes = 0
+        m.queued_frames = 0
+        if self.transport.is_closing():
+            return
+        data = chunks[0] if len(chunks) == 1 else b"".join(chunks)
+        # Không block: transport tự buffer phần kernel chưa nhận và ghi khi socket sẵn sàng
+        self.transport.write(data)
+        m.frames += len(chunks)
+        m.writes += 1
+        m.bytes_sent += len(data)
+
+    def close(self) -> None:
+        self.flush()
+        self.transport.close()
+
+
+class ChessServerProtocol(asyncio.Protocol):
+    def __init__(self):
+        self.session: Optional[core.ClientSession] = None
+        self.transport: Optional[asyncio.Transport] = None
+        # True khi kết nối đã được chuyển đi nơi khác (cluster handoff): ngừng xử lý message
+        self.detached = False
+
+    def connection_made(self, transport: asyncio.Transport) -> None:
+        addr = transport.get_extra_info("peername")
+        sock = transport.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.transport = transport
+        self.session = core.ClientSession(AsyncConnection(transport), addr)
+        print(f"[INFO] New connection from {addr}")
+
+    def message_received(self, msg: dict) -> None:
+        core.dispatch_message(self.session, msg)
+
+    def data_received(self, data: bytes) -> None:
+        session = self.session
+        session.reader.feed(data)
+        try:
+            # session.reader đọc lại mỗi vòng: "hello" có thể đổi framing giữa chừng
+            while not self.detached and not session.conn.is_closing():
+                item = session.reader.next()
+                if item is None:
+                    break
+                if isinstance(item, str):
+                    item = core.parse_line(session, item)
+                    if item is None:
+                        continue
+                self.message_received(item)
+            if not self.detached and not session.conn.is_closing():
+                core.check_pending(session)
+        except WireError as e:
+            print(f"[WARN] Protocol error from {session.addr}: {e}, closing")
+            session.conn.close()
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        if self.session is None:
+            return
+        core.close_session(self.session)
+        print(f"[INFO] Connection handler for {self.session.addr} terminated")
+        self.session = None
+
+
+def _raise_fd_limit() -> None:
+    """Nâng giới hạn file descriptor (soft -> hard) để nhận được hàng chục nghìn kết nối."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        target = hard if hard != resource.RLIM_INFINITY else 1_048_576
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+        except (ValueError, OSError):
+            return
+    print(f"[INFO] File descriptor limit: {resource.getrlimit(resource.RLIMIT_NOFILE)[0]}")
+
+
+async def serve(
+    host: str = core.HOST,
+    port: int = core.PORT,
+    backlog: int = 4096,
+    protocol_factory=ChessServerProtocol,
+    reuse_port: bool = False,
+    stats_interval: float = 0.0,
+    bot_workers: Optional[int] = None,
+    journal_dir: Optional[str] = None,
+) -> None:
+    core.use_thread_locks(False)
+    loop = asyncio.get_running_loop()
+    core.start_clock_service(loop)
+    core.start_bot_service(bot_workers)
+    core.start_journal(journal_dir)
+    if stats_interval > 0:
+        _schedule_stats(loop, stats_interval)
+    server = await loop.create_server(
+        protocol_factory, host, port, backlog=backlog, reuse_address=True, reuse_port=reuse_port or None
+    )
+    print(f"[INFO] Async server listening on {host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        core.stop_journal()
+        core.stop_bot_service()
+
+
+def _schedule_stats(loop: asyncio.AbstractEventLoop, interval: float) -> None:
+    def tick():
+        print(f"[STATS] {core.server_stats()}")
+        loop.call_later(interval, tick)
+
+    loop.call_later(interval, tick)
+
+
+def run(
+    host: str = core.HOST,
+    port: int = core.PORT,
+    stats_interval: float = 0.0,
+    bot_workers: Optional[int] = None,
+    journal_dir: Optional[str] = None,
+) -> None:
+    _raise_fd_limit()
+    try:
+        asyncio.run(serve(host, port, stats_interval=stats_interval, bot_workers=bot_workers, journal_dir=journal_dir))
+    except KeyboardInterrupt:
+        print("\n[INFO] Server shutting down...")
@@ -0,0 +1,317 @@
+# server/bots.py
+"""
+Bot phía server: phòng chơi với agent của ai/api (agent_spec), nước đi tính trên process pool.
+
+- Pool riêng (forkserver, không fork từ server nhiều thread); mỗi worker giữ agent "ấm"
+  (ai.api.get_cached_agent, tạo sẵn WARM_SPECS lúc khởi động) và chạy với nice BOT_NICE
+  -> engine không bao giờ chạy trên thread / event loop mạng, và nhường CPU cho server.
+- Time budget mỗi nước lấy từ clock của phòng (move_budget_ms): minimax dùng iterative
+  deepening dừng trước độ sâu dự đoán vượt budget; agent có time_limit_ms (MCTS) nhận thẳng budget.
+- Admission control: tối đa max_games ván bot cùng lúc (vượt -> join_failed "bots_busy"),
+  tối đa max_inflight job trong pool, phần dư xếp hàng FIFO. Ván người với người không đi
+  qua pool nên tải bot không làm chậm chúng; bot quá tải thì chính bot bị trừ giờ.
+- Worker chết (OOM, segfault trong engine) làm hỏng cả pool (BrokenProcessPool): pool được
+  dựng lại, job đang chạy và đang chờ đều trả về lỗi (bot trong các ván đó đầu hàng).
+"""
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+# Số ván bot tối đa cho mỗi worker process của pool
+GAMES_PER_WORKER = 50
+# Số job tối đa đang nằm trong pool cho mỗi worker (còn lại chờ ở hàng đợi của BotService)
+INFLIGHT_PER_WORKER = 2
+BOT_NICE = 10
+
+# Budget mỗi nước: thời gian còn lại / MOVES_TO_GO + phần lớn increment (+ delay, không bị trừ)
+MOVES_TO_GO = 30
+MIN_BUDGET_MS = 50
+MAX_BUDGET_MS = 5000
+# Ước lượng hệ số rẽ nhánh hiệu dụng: độ sâu d+1 tốn ~EBF lần độ sâu d
+EBF = 4.0
+
+# Key agent_spec client được phép truyền (không nhận đường dẫn model / file tuỳ ý).
+# Không nhận "seed": mỗi seed là 1 key cache agent mới trong worker (ai.api.get_cached_agent)
+ALLOWED_SPEC_KEYS = {"type", "level", "depth", "use_advanced_eval", "nodes", "value", "c_puct"}
+ALLOWED_TYPES = {"random", "minimax", "transformer", "mcts"}
+ALLOWED_LEVELS = {"easy", "medium", "hard", "expert", "master"}
+ALLOWED_VALUES = {"material"}
+MAX_DEPTH = 5
+MAX_NODES = 10000
+MIN_C_PUCT = 0.1
+MAX_C_PUCT = 10.0
+
+WARM_SPECS: List[Dict[str, Any]] = [
+    {"type": "random"},
+    {"type": "minimax", "level": "easy"},
+    {"type": "minimax", "level": "medium"},
+    {"type": "minimax", "level": "hard"},
+]
+
+
+def parse_agent_spec(value: Any) -> Dict[str, Any]:
+    """
+    "bot" trong join: tên độ khó / agent (VD "easy", "minimax_hard") hoặc dict agent_spec.
+    Trả về agent_spec; raise ValueError nếu không hợp lệ.
+    Tên -> config do server định nghĩa (ai.api), giữ nguyên kể cả model_path / quantized_path;
+    chỉ dict từ client mới đi qua whitelist.
+    """
+    if isinstance(value, str):
+        from ai.api import DIFFICULTY_CONFIGS, get_available_agents, model_files_available
+
+        named = get_available_agents().get(value)
+        if named is not None:
+            return dict(named["config"])
+        if value in DIFFICULTY_CONFIGS and model_files_available(DIFFICULTY_CONFIGS[value]):
+            return dict(DIFFICULTY_CONFIGS[value])
+        raise ValueError(f"unknown or unavailable bot: {value}")
+    if not isinstance(value, dict):
+        raise ValueError("bot must be a name or an agent_spec dict")
+    spec = {k: v for k, v in value.items() if k in ALLOWED_SPEC_KEYS}
+    # Kiểm tra kiểu trước khi so với set: giá trị unhashable (list / dict) không được raise TypeError
+    agent_type = spec.get("type", "random")
+    if not isinstance(agent_type, str) or agent_type not in ALLOWED_TYPES:
+        raise ValueError(f"unsupported agent type: {agent_type!r}")
+    if "level" in spec and not (isinstance(spec["level"], str) and spec["level"] in ALLOWED_LEVELS):
+        raise ValueError(f"level must be one of {sorted(ALLOWED_LEVELS)}")
+    if "value" in spec and not (isinstance(spec["value"], str) and spec["value"] in ALLOWED_VALUES):
+        raise ValueError(f"value must be one of {sorted(ALLOWED_VALUES)}")
+    if "use_advanced_eval" in spec and not isinstance(spec["use_advanced_eval"], bool):
+        raise ValueError("use_advanced_eval must be a boolean")
+    # bool là lớp con của int: loại riêng để True không thành depth 1
+    if "depth" in spec and not (_is_int(spec["depth"]) and 1 <= spec["depth"] <= MAX_DEPTH):
+        raise ValueError(f"depth must be 1..{MAX_DEPTH}")
+    if "nodes" in spec and not (_is_int(spec["nodes"]) and 1 <= spec["nodes"] <= MAX_NODES):
+        raise ValueError(f"nodes must be 1..{MAX_NODES}")
+    if "c_puct" in spec:
+        c_puct = spec["c_puct"]
+        if not (isinstance(c_puct, (int, float)) and not isinstance(c_puct, bool)
+                and MIN_C_PUCT <= c_puct <= MAX_C_PUCT):
+            raise ValueError(f"c_puct must be a number in {MIN_C_PUCT}..{MAX_C_PUCT}")
+        spec["c_puct"] = float(c_puct)
+    return spec
+
+
+def _is_int(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def move_budget_ms(time_left: float, increment: float = 0.0, delay: float = 0.0) -> int:
+    budget = time_left / MOVES_TO_GO + 0.8 * increment + delay
+    # Không bao giờ tiêu quá nửa thời gian còn lại cho 1 nước
+    budget = min(budget, time_left / 2 + delay)
+    return int(max(MIN_BUDGET_MS, min(MAX_BUDGET_MS, budget * 1000)))
+
+
+# ============================================================
+# 1. WORKER PROCESS
+# ============================================================
+
+def _init_worker(warm_specs: List[Dict[str, Any]]) -> None:
+    os.environ.setdefault("CHESS_AI_THREADS", "1")
+    try:
+        os.nice(BOT_NICE)
+    except (AttributeError, OSError):
+        pass
+    from ai.api import get_cached_agent
+
+    for spec in warm_specs:
+        try:
+            get_cached_agent({"verbose": False, **spec})
+        except Exception as e:
+            print(f"[BOT] Warm-up of {spec} failed: {type(e).__name__}: {e}")
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def compute_move(moves: List[str], spec: Dict[str, Any], budget_ms: int) -> Tuple[Optional[str], Dict[str, Any]]:
+    """Chạy trong worker: (uci | None, info) cho thế cờ sau `moves` từ đầu ván."""
+    import chess
+
+    from ai.api import get_cached_agent
+
+    start = time.perf_counter()
+    board = chess.Board()
+    for uci in moves:
+        board.push_uci(uci)
+    if board.is_game_over():
+        return None, {"error": "game_over"}
+
+    agent = get_cached_agent({"verbose": False, **spec})
+    if hasattr(agent, "time_limit_ms"):
+        agent.time_limit_ms = budget_ms
+        move, info = agent.choose_move(board)
+    elif isinstance(getattr(agent, "depth", None), int):
+        # Iterative deepening: dừng khi độ sâu tiếp theo dự đoán vượt budget
+        max_depth, move, info = agent.depth, None, {}
+        try:
+            for depth in range(1, max_depth + 1):
+                agent.depth = depth
+                t0 = time.perf_counter()
+                move, info = agent.choose_move(board)
+                spent_ms = (time.perf_counter() - start) * 1000
+                if spent_ms + (time.perf_counter() - t0) * 1000 * EBF > budget_ms:
+                    break
+        finally:
+            agent.depth = max_depth
+    else:
+        move, info = agent.choose_move(board)
+
+    info = dict(info or {})
+    info["budget_ms"] = budget_ms
+    info["elapsed_ms"] = int((time.perf_counter() - start) * 1000)
+    if move is None or move == chess.Move.null() or move not in board.legal_moves:
+        return None, info
+    return move.uci(), info
+
+
+# ============================================================
+# 2. SERVICE (PROCESS SERVER)
+# ============================================================
+
+class BotService:
+    """
+    Pool + admission control. Callback kết quả chạy ở thread nội bộ của pool;
+    server truyền `deliver` để chuyển nó về thread / event loop của mình.
+    """
+
+    def __init__(self, workers: int, deliver: Callable[..., None], warm_specs: Optional[List[Dict[str, Any]]] = None):
+        self.workers = workers
+        self.max_games = workers * GAMES_PER_WORKER
+        self.max_inflight = workers * INFLIGHT_PER_WORKER
+        self.deliver = deliver
+        self.warm_specs = WARM_SPECS if warm_specs is None else warm_specs
+        self.games = 0
+        self.inflight = 0
+        self.moves = 0
+        self.rejected = 0
+        self.restarts = 0
+        self._queue: Deque[tuple] = deque()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._pool = self._new_pool()
+        print(f"[BOT] Bot pool started: {workers} workers, max {self.max_games} games")
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        try:
+            ctx = multiprocessing.get_context("forkserver")
+        except ValueError:  # Windows
+            ctx = multiprocessing.get_context("spawn")
+        pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=ctx,
+            initializer=_init_worker,
+            initargs=(self.warm_specs,),
+        )
+        # Khởi động + làm ấm mọi worker ngay, không để ván bot đầu tiên chịu độ trễ load agent
+        for _ in range(self.workers):
+            pool.submit(_ping)
+        return pool
+
+    def admit(self) -> bool:
+        with self._lock:
+            if self.games >= self.max_games:
+                self.rejected += 1
+                return False
+            self.games += 1
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            self.games = max(0, self.games - 1)
+
+    def submit(self, moves: List[str], spec: Dict[str, Any], budget_ms: int, callback: Callable, *args: Any) -> None:
+        """
+        Tính nước cho thế cờ sau `moves`; xong gọi deliver(callback, *args, uci, info).
+        Không bao giờ raise: pool hỏng / đã tắt -> deliver(..., None, {"error": ...}).
+        """
+        job = (moves, spec, budget_ms, callback, args)
+        with self._lock:
+            if self.inflight >= self.max_inflight:
+                self._queue.append(job)
+                return
+            self.inflight += 1
+        self._start(job)
+
+    def _start(self, job: tuple) -> None:
+        moves, spec, budget_ms, _, _ = job
+        pool = self._pool
+        try:
+            future = pool.submit(compute_move, moves, spec, budget_ms)
+        except Exception as e:  # BrokenProcessPool, RuntimeError (pool đã shutdown)
+            future = Future()
+            future.set_exception(e)
+        # Future đã xong (submit lỗi) -> _done chạy ngay tại đây
+        future.add_done_callback(lambda f: self._done(f, pool, job))
+
+    def _done(self, future: Future, pool: ProcessPoolExecutor, job: tuple) -> None:
+        try:
+            uci, info = future.result()
+        except (Exception, CancelledError) as e:
+            uci, info = None, {"error": f"{type(e).__name__}: {e}"}
+            if isinstance(e, BrokenProcessPool):
+                self._replace_pool(pool, info["error"])
+        failed: List[tuple] = []
+        with self._lock:
+            self.moves += 1
+            if self._closed:  # đang tắt: không đưa job mới vào pool
+                failed = list(self._queue)
+                self._queue.clear()
+            next_job = self._queue.popleft() if self._queue else None
+            if next_job is None:
+                self.inflight -= 1
+        # Trả kết quả trước: _start(next_job) lỗi cũng không làm mất nước vừa tính
+        self._deliver(job, uci, info)
+        for failed_job in failed:
+            self._deliver(failed_job, None, {"error": "bot service stopped"})
+        if next_job is not None:
+            self._start(next_job)
+
+    def _deliver(self, job: tuple, uci: Optional[str], info: Dict[str, Any]) -> None:
+        _, _, _, callback, args = job
+        try:
+            self.deliver(callback, *args, uci, info)
+        except Exception as e:
+            print(f"[BOT] Delivering bot result failed: {type(e).__name__}: {e}")
+
+    def _replace_pool(self, broken: ProcessPoolExecutor, error: str) -> None:
+        """Pool `broken` hỏng: dựng pool mới (1 lần cho mỗi pool hỏng), job đang chờ trả về lỗi."""
+        with self._lock:
+            if self._pool is not broken:
+                return  # job khác của cùng pool đã dựng lại rồi
+            failed = list(self._queue)
+            self._queue.clear()
+            restart = not self._closed
+            if restart:
+                self._pool = self._new_pool()
+                self.restarts += 1
+        print(f"[BOT] Bot pool broken ({error}), {'restarted' if restart else 'not restarted (shutting down)'}; "
+              f"failing {len(failed)} queued jobs")
+        broken.shutdown(wait=False, cancel_futures=True)
+        for job in failed:
+            self._deliver(job, None, {"error": error})
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "bot_games": self.games,
+                "bot_inflight": self.inflight,
+                "bot_queued": len(self._queue),
+                "bot_moves": self.moves,
+                "bot_rejected": self.rejected,
+                "bot_pool_restarts": self.restarts,
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._closed = True
+        # Chờ job đang chạy (tối đa ~MAX_BUDGET_MS): shutdown không chờ làm process con
+        # của multiprocessing (worker cluster) treo lúc thoát vì pool không nhận được lệnh dừng
+        self._pool.shutdown(wait=True, cancel_futures=True)
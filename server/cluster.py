@@ -0,0 +1,548 @@
+# server/cluster.py
+"""
+Cluster mode: supervisor + N worker process, mỗi worker là 1 server asyncio
+(server/async_server.py) -> vượt giới hạn GIL, throughput nước đi tăng theo số core.
+
+- Các worker cùng bind 1 cổng với SO_REUSEPORT, kernel chia kết nối mới cho các worker.
+- Phòng được ghim vào 1 worker: room id = 2 ký tự hex số worker + 6 ký tự random
+  (VD "03a1b2c3" thuộc worker 3). Mọi trạng thái phòng chỉ nằm ở worker sở hữu.
+- Client join / watch phòng của worker khác -> handoff: socket (fd, qua SCM_RIGHTS) cùng message
+  đó, framing hiện tại và các byte đã đọc nhưng chưa xử lý được gửi sang worker sở hữu qua bus
+  Unix socket (SOCK_SEQPACKET); từ đó client nói chuyện trực tiếp với worker đó.
+- seek: chuyển (handoff) về worker phụ trách time control đó (crc32 của time control),
+  hàng đợi ghép cặp của 1 time control chỉ nằm ở 1 worker; phòng tạo ra thuộc worker đó.
+- list_rooms: worker nhận request hỏi các worker còn lại qua bus rồi gộp kết quả
+  (worker không trả lời trong LIST_ROOMS_TIMEOUT giây thì bỏ qua).
+
+Usage:
+    python -m server.main --mode cluster --workers 4 --port 5000
+"""
+import asyncio
+import base64
+import itertools
+import json
+import os
+import shutil
+import socket
+import tempfile
+import time
+import zlib
+from collections import deque
+from multiprocessing import Process
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from core.wire import FRAMING_JSON, make_reader
+from server import main as core
+from server.async_server import ChessServerProtocol, _raise_fd_limit, serve
+
+ROOM_PREFIX_LEN = 2  # -> tối đa 256 worker
+MAX_WORKERS = 16 ** ROOM_PREFIX_LEN
+BUS_MAX_MESSAGE = 256 * 1024
+# Message chờ gửi tối đa cho mỗi worker đích (worker đó chậm / treo -> message mới bị từ chối)
+BUS_MAX_QUEUE = 1024
+BUS_CONNECT_TIMEOUT = 1.0
+ROOMS_PER_MESSAGE = 500
+LIST_ROOMS_TIMEOUT = 0.5
+
+# Worker của process hiện tại (gán trong worker_main)
+_worker: Optional["ClusterWorker"] = None
+
+
+def room_prefix(index: int) -> str:
+    return f"{index:0{ROOM_PREFIX_LEN}x}"
+
+
+def room_owner(room_id: Any, workers: int) -> Optional[int]:
+    """Worker sở hữu room_id, None nếu room_id không đúng định dạng cluster."""
+    if not isinstance(room_id, str) or len(room_id) <= ROOM_PREFIX_LEN:
+        return None
+    try:
+        index = int(room_id[:ROOM_PREFIX_LEN], 16)
+    except ValueError:
+        return None
+    return index if index < workers else None
+
+
+def bus_path(bus_dir: str, index: int) -> str:
+    return os.path.join(bus_dir, f"worker-{index}.sock")
+
+
+# ============================================================
+# 1. BUS GIỮA CÁC WORKER
+# ============================================================
+
+class _BusPeer:
+    """Kết nối gửi tới 1 worker + hàng đợi message chưa gửi được (buffer kernel đầy / đang connect)."""
+
+    def __init__(self, target: int):
+        self.target = target
+        self.sock: Optional[socket.socket] = None
+        self.connected = False
+        self.writing = False
+        self.full = False  # đã log "queue full" (chỉ log 1 lần cho tới khi hàng đợi vơi)
+        # [data, fds, on_done, số lần đã thử]
+        self.queue: Deque[list] = deque()
+
+
+class WorkerBus:
+    """
+    Kênh Unix SOCK_SEQPACKET giữa các worker: mỗi message là 1 JSON, có thể kèm fd.
+    Mỗi worker listen trên bus_path(index); kết nối gửi tới worker khác mở lazily.
+    Không bao giờ block event loop: connect bằng loop.sock_connect, message chờ trong hàng đợi
+    riêng từng worker đích (tối đa BUS_MAX_QUEUE) và được gửi khi socket ghi được (add_writer);
+    worker đích chậm / treo chỉ làm đầy hàng đợi của chính nó, message vượt quá bị từ chối.
+    """
+
+    def __init__(self, index: int, bus_dir: str, loop: asyncio.AbstractEventLoop, on_message):
+        self.index = index
+        self.bus_dir = bus_dir
+        self.loop = loop
+        self.on_message = on_message  # on_message(msg: dict, fds: list[int])
+        self._listener: Optional[socket.socket] = None
+        self._peers: Dict[int, _BusPeer] = {}
+
+    def start(self) -> None:
+        path = bus_path(self.bus_dir, self.index)
+        if os.path.exists(path):
+            os.unlink(path)  # còn lại từ worker cũ (đã bị restart)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        sock.bind(path)
+        sock.listen(256)
+        sock.setblocking(False)
+        self._listener = sock
+        self.loop.add_reader(sock.fileno(), self._accept)
+
+    def _accept(self) -> None:
+        try:
+            conn, _ = self._listener.accept()
+        except BlockingIOError:
+            return
+        conn.setblocking(False)
+        self.loop.add_reader(conn.fileno(), self._readable, conn)
+
+    def _readable(self, conn: socket.socket) -> None:
+        while True:
+            try:
+                data, fds, _, _ = socket.recv_fds(conn, BUS_MAX_MESSAGE, 4)
+            except BlockingIOError:
+                return
+            except OSError:
+                data, fds = b"", []
+            if not data:
+                self.loop.remove_reader(conn.fileno())
+                conn.close()
+                return
+            try:
+                msg = json.loads(data)
+            except json.JSONDecodeError:
+                print(f"[CLUSTER] Invalid bus message on worker {self.index}")
+                for fd in fds:
+                    os.close(fd)
+                continue
+            self.on_message(msg, fds)
+
+    # ----- gửi -----
+
+    def send(
+        self,
+        target: int,
+        msg: dict,
+        fds: List[int] = (),
+        on_done: Optional[Callable[[Optional[Exception]], None]] = None,
+    ) -> None:
+        """
+        Xếp msg (kèm fds) để gửi tới worker target; không block, không raise.
+        Bus giữ quyền sở hữu fds (đóng sau khi gửi xong / lỗi). on_done(None | lỗi) được gọi
+        trên event loop (không bao giờ ngay trong lời gọi send).
+        """
+        data = json.dumps(msg, separators=(",", ":")).encode("utf-8")
+        peer = self._peers.get(target)
+        if peer is None:
+            peer = self._peers[target] = _BusPeer(target)
+        if len(data) > BUS_MAX_MESSAGE:
+            self._finish([data, list(fds), on_done, 0], OSError(f"bus to worker {target}: message too large"))
+            return
+        if len(peer.queue) >= BUS_MAX_QUEUE:
+            if not peer.full:
+                print(f"[CLUSTER] Bus queue to worker {target} full (worker stalled?), rejecting messages")
+                peer.full = True
+            self._finish([data, list(fds), on_done, 0], OSError(f"bus to worker {target}: queue full"))
+            return
+        peer.queue.append([data, list(fds), on_done, 0])
+        if peer.sock is None:
+            self._connect(peer)
+        elif peer.connected and not peer.writing:
+            self._flush(peer)
+
+    def _connect(self, peer: _BusPeer) -> None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        sock.setblocking(False)
+        peer.sock, peer.connected = sock, False
+        connect = self.loop.sock_connect(sock, bus_path(self.bus_dir, peer.target))
+        task = self.loop.create_task(asyncio.wait_for(connect, BUS_CONNECT_TIMEOUT))
+        task.add_done_callback(lambda t: self._connected(peer, sock, t))
+
+    def _connected(self, peer: _BusPeer, sock: socket.socket, task: asyncio.Task) -> None:
+        if peer.sock is not sock:
+            return
+        error = None if task.cancelled() else task.exception()
+        if task.cancelled() or error is not None:
+            # Worker đích không chạy / không nhận kết nối: mọi message đang chờ đều lỗi
+            self._close_peer(peer)
+            error = error if isinstance(error, OSError) else OSError(f"connect to worker {peer.target}: {error!r}")
+            while peer.queue:
+                self._finish(peer.queue.popleft(), error)
+            return
+        peer.connected = True
+        self._flush(peer)
+
+    def _flush(self, peer: _BusPeer) -> None:
+        while peer.queue:
+            item = peer.queue[0]
+            data, fds = item[0], item[1]
+            try:
+                if fds:
+                    socket.send_fds(peer.sock, [data], fds)
+                else:
+                    peer.sock.send(data)
+            except (BlockingIOError, InterruptedError):
+                # Buffer kernel đầy (worker đích chậm): gửi tiếp khi ghi được
+                if not peer.writing:
+                    self.loop.add_writer(peer.sock.fileno(), self._flush, peer)
+                    peer.writing = True
+                return
+            except OSError as e:
+                # Worker đích có thể vừa restart -> kết nối lại, mỗi message thử tối đa 2 lần
+                self._close_peer(peer)
+                item[3] += 1
+                if item[3] >= 2:
+                    self._finish(peer.queue.popleft(), e)
+                if peer.queue:
+                    self._connect(peer)
+                return
+            self._finish(peer.queue.popleft(), None)
+        peer.full = False
+        if peer.writing:
+            self.loop.remove_writer(peer.sock.fileno())
+            peer.writing = False
+
+    def _close_peer(self, peer: _BusPeer) -> None:
+        if peer.sock is None:
+            return
+        if peer.writing:
+            self.loop.remove_writer(peer.sock.fileno())
+            peer.writing = False
+        peer.sock.close()
+        peer.sock, peer.connected = None, False
+
+    def _finish(self, item: list, error: Optional[Exception]) -> None:
+        for fd in item[1]:
+            os.close(fd)
+        if item[2] is not None:
+            self.loop.call_soon(item[2], error)
+
+
+# ============================================================
+# 2. WORKER
+# ============================================================
+
+class ClusterWorker:
+    def __init__(self, index: int, workers: int, bus_dir: str, loop: asyncio.AbstractEventLoop):
+        self.index = index
+        self.workers = workers
+        self.loop = loop
+        self.bus = WorkerBus(index, bus_dir, loop, self._on_bus_message)
+        self._req_ids = itertools.count(1)
+        self._pending_lists: Dict[int, Dict[str, Any]] = {}
+
+    def start(self) -> None:
+        self.bus.start()
+
+    def owner_of(self, room_id: Any) -> Optional[int]:
+        return room_owner(room_id, self.workers)
+
+    def seek_owner(self, time_control: Any) -> Optional[int]:
+        """Mọi seek cùng time control về 1 worker (hash ổn định giữa các process) để ghép được với nhau."""
+        try:
+            tc = core.parse_time_control(time_control)
+        except (TypeError, ValueError):
+            return None  # worker hiện tại tự trả seek_failed
+        return zlib.crc32(repr(tuple(tc)).encode("ascii")) % self.workers
+
+    # ----- handoff -----
+
+    def handoff(self, proto: "ClusterProtocol", target: int, failed_type: str = "join_failed") -> None:
+        """
+        Chuyển kết nối của proto sang worker target. Gọi khi message join / watch vừa đọc xong:
+        target nhận lại chính byte của message đó + phần chưa xử lý, rồi xử lý như thường.
+        Bus gửi bất đồng bộ: tới khi gửi xong kết nối ngừng đọc / xử lý message (detached).
+        """
+        transport = proto.transport
+        sock = transport.get_extra_info("socket")
+        conn = proto.session.conn
+        conn.flush()  # frame đã xếp hàng ở worker này phải tới client trước frame của worker đích
+        pending = proto.session.reader.peek_rest(include_current=True)
+        proto.detached = True
+        transport.pause_reading()
+        # Bus đóng bản dup của fd sau khi gửi (worker đích đã nhận bản của nó) hoặc khi lỗi
+        self.bus.send(target, {
+            "kind": "handoff",
+            "framing": conn.framing,
+            "data": base64.b64encode(pending).decode("ascii"),
+        }, [os.dup(sock.fileno())], lambda error: self._handoff_done(proto, target, failed_type, error))
+
+    def _handoff_done(self, proto: "ClusterProtocol", target: int, failed_type: str, error: Optional[Exception]) -> None:
+        session = proto.session
+        if session is None:
+            return  # client ngắt trong lúc chờ bus; worker đích (nếu đã nhận) tự thấy EOF
+        if error is not None:
+            print(f"[CLUSTER] Handoff to worker {target} failed: {error}")
+            proto.detached = False
+            core.send_json(session.conn, {"type": failed_type, "reason": "worker_unavailable"})
+            proto.transport.resume_reading()
+            proto.data_received(b"")  # message đã đọc sau message bị handoff
+            return
+        print(f"[CLUSTER] Handed off {session.addr} to worker {target}")
+        session.reader.take_rest()
+        # Chỉ đóng fd phía worker này; kết nối TCP vẫn sống ở worker đích
+        proto.transport.close()
+
+    def _adopt(self, fd: int, pending: bytes, framing: str) -> None:
+        sock = socket.socket(fileno=fd)
+        sock.setblocking(False)
+        task = self.loop.create_task(
+            self.loop.connect_accepted_socket(lambda: ClusterProtocol(pending, framing), sock)
+        )
+        task.add_done_callback(self._adopt_done)
+
+    @staticmethod
+    def _adopt_done(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            print(f"[CLUSTER] Failed to adopt connection: {task.exception()}")
+
+    # ----- list_rooms -----
+
+    def request_rooms(self, session: core.ClientSession) -> None:
+        req = next(self._req_ids)
+        entry = {"session": session, "rooms": core.list_rooms_info(), "waiting": set(), "timer": None}
+        self._pending_lists[req] = entry
+        for i in range(self.workers):
+            if i == self.index:
+                continue
+            entry["waiting"].add(i)
+            self.bus.send(
+                i, {"kind": "list_rooms", "req": req, "from": self.index},
+                on_done=lambda error, i=i: self._list_sent(req, i, error),
+            )
+        if entry["waiting"]:
+            entry["timer"] = self.loop.call_later(LIST_ROOMS_TIMEOUT, self._finish_rooms, req)
+        else:
+            self._finish_rooms(req)
+
+    def _list_sent(self, req: int, target: int, error: Optional[Exception]) -> None:
+        # Lỗi đã được bus log (1 lần cho mỗi worker đích treo): không chờ worker đó nữa
+        if error is None:
+            return
+        entry = self._pending_lists.get(req)
+        if entry is not None:
+            entry["waiting"].discard(target)
+            if not entry["waiting"]:
+                self._finish_rooms(req)
+
+    def _reply_rooms(self, msg: dict) -> None:
+        rooms = core.list_rooms_info()
+        chunks = [rooms[i:i + ROOMS_PER_MESSAGE] for i in range(0, len(rooms), ROOMS_PER_MESSAGE)] or [[]]
+        for k, chunk in enumerate(chunks):
+            self.bus.send(msg["from"], {
+                "kind": "rooms",
+                "req": msg["req"],
+                "from": self.index,
+                "rooms": chunk,
+                "done": k == len(chunks) - 1,
+            })  # gửi lỗi (bus đã log): worker hỏi hết LIST_ROOMS_TIMEOUT thì bỏ qua worker này
+
+    def _collect_rooms(self, msg: dict) -> None:
+        entry = self._pending_lists.get(msg["req"])
+        if entry is None:
+            return  # đã timeout
+        entry["rooms"].extend(msg["rooms"])
+        if msg["done"]:
+            entry["waiting"].discard(msg["from"])
+            if not entry["waiting"]:
+                self._finish_rooms(msg["req"])
+
+    def _finish_rooms(self, req: int) -> None:
+        entry = self._pending_lists.pop(req, None)
+        if entry is None:
+            return
+        if entry["timer"] is not None:
+            entry["timer"].cancel()
+        core.send_json(entry["session"].conn, {"type": "rooms", "rooms": entry["rooms"]})
+
+    # ----- bus dispatch -----
+
+    def _on_bus_message(self, msg: dict, fds: List[int]) -> None:
+        kind = msg.get("kind")
+        if kind == "handoff" and len(fds) == 1:
+            self._adopt(fds[0], base64.b64decode(msg["data"]), msg.get("framing", FRAMING_JSON))
+            return
+        for fd in fds:
+            os.close(fd)
+        if kind == "list_rooms":
+            self._reply_rooms(msg)
+        elif kind == "rooms":
+            self._collect_rooms(msg)
+        else:
+            print(f"[CLUSTER] Unknown bus message on worker {self.index}: {kind}")
+
+
+class ClusterProtocol(ChessServerProtocol):
+    """
+    ChessServerProtocol + định tuyến theo phòng: join / watch phòng của worker khác -> handoff,
+    seek -> handoff về worker của time control,
+    list_rooms -> gộp qua bus. `pending` / `framing`: byte và framing nhận từ worker trước (handoff).
+    """
+
+    def __init__(self, pending: bytes = b"", framing: str = FRAMING_JSON):
+        super().__init__()
+        self._pending = pending
+        self._framing = framing
+
+    def connection_made(self, transport: asyncio.Transport) -> None:
+        super().connection_made(transport)
+        if self._framing != FRAMING_JSON:
+            self.session.conn.framing = self._framing
+            self.session.reader = make_reader(self._framing)
+        if self._pending:
+            pending, self._pending = self._pending, b""
+            self.data_received(pending)
+
+    def message_received(self, msg: dict) -> None:
+        msg_type = msg.get("type") if isinstance(msg, dict) else None
+        if msg_type in ("join", "watch"):
+            owner = _worker.owner_of(msg.get("game_id"))
+            if owner is not None and owner != _worker.index:
+                _worker.handoff(self, owner, f"{msg_type}_failed")
+                return
+        elif msg_type == "seek":
+            # Đang chơi dở thì không handoff: worker hiện tại trả seek_failed already_in_room
+            room = self.session.room
+            in_game = room is not None and self.session.color is not None and room.result == "ongoing"
+            owner = _worker.seek_owner(msg.get("time_control"))
+            if owner is not None and owner != _worker.index and not in_game:
+                _worker.handoff(self, owner, "seek_failed")
+                return
+        elif msg_type == "list_rooms":
+            _worker.request_rooms(self.session)
+            return
+        core.dispatch_message(self.session, msg)
+
+
+# ============================================================
+# 3. PROCESS: WORKER + SUPERVISOR
+# ============================================================
+
+async def _worker_async(
+    index: int,
+    workers: int,
+    host: str,
+    port: int,
+    bus_dir: str,
+    stats_interval: float,
+    bot_workers: int,
+    journal_dir: Optional[str],
+) -> None:
+    global _worker
+    _worker = ClusterWorker(index, workers, bus_dir, asyncio.get_running_loop())
+    _worker.start()
+    await serve(
+        host, port, protocol_factory=ClusterProtocol, reuse_port=True, stats_interval=stats_interval,
+        bot_workers=bot_workers, journal_dir=journal_dir,
+    )
+
+
+def worker_main(
+    index: int,
+    workers: int,
+    host: str,
+    port: int,
+    bus_dir: str,
+    stats_interval: float = 0.0,
+    bot_workers: int = 0,
+    journal_dir: Optional[str] = None,
+) -> None:
+    core.set_room_id_prefix(room_prefix(index))
+    _raise_fd_limit()
+    print(f"[CLUSTER] Worker {index} (pid {os.getpid()}) starting")
+    try:
+        asyncio.run(_worker_async(index, workers, host, port, bus_dir, stats_interval, bot_workers, journal_dir))
+    except KeyboardInterrupt:
+        pass
+
+
+def _spawn(
+    index: int,
+    workers: int,
+    host: str,
+    port: int,
+    bus_dir: str,
+    stats_interval: float,
+    bot_workers: int,
+    journal_dir: Optional[str],
+) -> Process:
+    # Journal riêng từng worker, theo số worker (= tiền tố room id) -> worker restart khôi phục đúng phòng của nó
+    worker_journal = os.path.join(journal_dir, f"worker-{room_prefix(index)}") if journal_dir else None
+    # Không daemon: worker cần tạo được pool bot (process con); supervisor tự terminate khi tắt
+    proc = Process(
+        target=worker_main,
+        args=(index, workers, host, port, bus_dir, stats_interval, bot_workers, worker_journal),
+    )
+    proc.start()
+    return proc
+
+
+def run_cluster(
+    host: str = core.HOST,
+    port: int = core.PORT,
+    workers: Optional[int] = None,
+    stats_interval: float = 0.0,
+    bot_workers: Optional[int] = None,
+    journal_dir: Optional[str] = None,
+) -> None:
+    """
+    Supervisor: chạy `workers` worker, restart worker nào chết (phòng của nó bị mất,
+    trừ khi có journal_dir: worker mới khôi phục phòng từ journal của worker cũ).
+    bot_workers: tổng số process bot, chia đều cho các worker (mỗi worker 1 pool riêng).
+    journal_dir: mỗi worker ghi vào thư mục con worker-<tiền tố>; khởi động lại phải cùng số worker
+    mới khôi phục được hết phòng.
+    """
+    if not hasattr(socket, "SO_REUSEPORT") or not hasattr(socket, "send_fds"):
+        raise SystemExit("[ERROR] Cluster mode cần SO_REUSEPORT và Unix socket (Linux / BSD)")
+    workers = workers or os.cpu_count() or 1
+    if not 1 <= workers <= MAX_WORKERS:
+        raise SystemExit(f"[ERROR] --workers phải trong khoảng 1..{MAX_WORKERS}")
+
+    if bot_workers is None:
+        per_worker_bots = core.default_bot_workers(workers)
+    else:
+        per_worker_bots = max(1, bot_workers // workers) if bot_workers > 0 else 0
+
+    bus_dir = tempfile.mkdtemp(prefix="chess-bus-")
+    print(f"[CLUSTER] Starting {workers} workers on {host}:{port} (bus {bus_dir})")
+    spawn_args = (workers, host, port, bus_dir, stats_interval, per_worker_bots, journal_dir)
+    procs = {i: _spawn(i, *spawn_args) for i in range(workers)}
+    try:
+        while True:
+            time.sleep(1.0)
+            for i, proc in list(procs.items()):
+                if not proc.is_alive():
+                    print(f"[CLUSTER] Worker {i} exited (code {proc.exitcode}), restarting")
+                    procs[i] = _spawn(i, *spawn_args)
+    except KeyboardInterrupt:
+        print("\n[INFO] Server shutting down...")
+    finally:
+        for proc in procs.values():
+            proc.terminate()
+        for proc in procs.values():
+            proc.join(timeout=5)
+        shutil.rmtree(bus_dir, ignore_errors=True)
@@ -0,0 +1,291 @@
+# server/journal.py
+"""
+Write-ahead journal của các phòng: ván đang chơi sống sót qua restart / crash server.
+
+- Mỗi thay đổi của phòng (create / join / start / move / result / delete) là 1 dòng JSON
+  append vào segment hiện tại (journal-00000001.log, ...).
+- append() chỉ đưa record vào hàng đợi rồi trả về ngay (không I/O trên đường đi của nước đi);
+  1 writer thread gom mọi record đang chờ thành 1 lần write + 1 fsync (group commit),
+  tối đa ~1 / COMMIT_INTERVAL_SEC lần fsync mỗi giây. Crash chỉ mất các record chưa kịp
+  fsync (vài chục ms cuối), không bao giờ làm hỏng phần đã ghi.
+  Chi phí không bằng 0: JSON encode vẫn tốn CPU (và GIL) ở writer thread, xem
+  scripts/bench_journal.py và stats()["journal_writer_cpu_us"].
+- Snapshot (compaction) định kỳ: chuyển sang segment mới, ghi trạng thái mọi phòng vào
+  snapshot.json (file tạm + fsync + rename), rồi xoá các segment cũ hơn.
+  Snapshot được chụp SAU khi đã chuyển segment nên có thể chứa cả vài record đầu của
+  segment mới -> replay phải idempotent (nước đi có số thứ tự "n", create / start lặp thì bỏ qua).
+- load_journal(): snapshot + replay các segment sau nó -> trạng thái từng phòng (dict thuần),
+  server/main.py dựng lại GameRoom + clock từ đó. Module không phụ thuộc server/main.py.
+"""
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+SEGMENT_PREFIX = "journal-"
+SEGMENT_SUFFIX = ".log"
+SNAPSHOT_NAME = "snapshot.json"
+SNAPSHOT_VERSION = 1
+
+# Cửa sổ group commit: sau mỗi lần fsync, writer chờ chừng này để gom batch tiếp theo
+COMMIT_INTERVAL_SEC = 0.01
+# Chu kỳ chụp snapshot (chỉ khi có record mới từ lần trước)
+SNAPSHOT_INTERVAL_SEC = 60.0
+# Writer encode từng nhóm chừng này record rồi nhả GIL (batch lớn không chặn thread server lâu)
+ENCODE_CHUNK = 64
+
+# json.dumps(..., separators=...) tạo JSONEncoder mới mỗi lần gọi: dùng chung 1 encoder
+_encode = json.JSONEncoder(separators=(",", ":")).encode
+
+
+def _segment_path(directory: str, segment: int) -> str:
+    return os.path.join(directory, f"{SEGMENT_PREFIX}{segment:08d}{SEGMENT_SUFFIX}")
+
+
+def _list_segments(directory: str) -> List[int]:
+    segments = []
+    for name in os.listdir(directory):
+        if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+            try:
+                segments.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+            except ValueError:
+                continue
+    return sorted(segments)
+
+
+def _fsync_dir(directory: str) -> None:
+    """fsync thư mục để file mới tạo / rename cũng bền vững (không hỗ trợ trên Windows)."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except (AttributeError, OSError):
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class Journal:
+    """
+    Journal của 1 process server (cluster: mỗi worker 1 thư mục riêng).
+    Thread-safe; append / rotate / write_snapshot không block, mọi I/O ở writer thread.
+    """
+
+    def __init__(self, directory: str, commit_interval: float = COMMIT_INTERVAL_SEC):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.commit_interval = commit_interval
+        # Luôn mở segment mới: segment cũ có thể kết thúc bằng 1 dòng ghi dở lúc crash
+        self.segment = (_list_segments(directory) or [0])[-1] + 1
+        self._file = open(_segment_path(directory, self.segment), "ab")
+        _fsync_dir(directory)
+        # Lock thường (không RLock): append nằm trên đường đi của nước đi
+        self._cond = threading.Condition(threading.Lock())
+        self._queue: List[Any] = []
+        self._closed = False
+        self.records = 0
+        self.records_since_snapshot = 0
+        self.commits = 0
+        self.bytes_written = 0
+        self.max_batch = 0
+        self.snapshots = 0
+        self.writer_cpu = 0.0
+        self._thread = threading.Thread(target=self._writer_loop, name="journal-writer", daemon=True)
+        self._thread.start()
+
+    # ----- API (gọi từ server) -----
+
+    def append(self, record: Dict[str, Any]) -> None:
+        """Xếp hàng 1 record; encode + ghi + fsync ở writer thread."""
+        with self._cond:
+            if self._closed:
+                return
+            # Writer chỉ wait() khi hàng đợi rỗng: chỉ cần đánh thức lúc rỗng -> có record
+            if not self._queue:
+                self._cond.notify()
+            self._queue.append(record)
+            self.records += 1
+            self.records_since_snapshot += 1
+
+    def rotate(self) -> int:
+        """Bắt đầu segment mới cho các record sau lời gọi này; trả về số segment mới."""
+        with self._cond:
+            self.segment += 1
+            self.records_since_snapshot = 0
+            self._queue.append(("rotate", self.segment))
+            self._cond.notify()
+            return self.segment
+
+    def write_snapshot(self, segment: int, rooms: List[Dict[str, Any]]) -> None:
+        """
+        Ghi snapshot: trạng thái `rooms` + replay từ `segment` trở đi (gọi rotate() TRƯỚC khi chụp rooms).
+        Segment cũ hơn bị xoá sau khi snapshot đã nằm trên đĩa.
+        """
+        with self._cond:
+            self._queue.append(("snapshot", segment, rooms))
+            self._cond.notify()
+
+    def close(self) -> None:
+        """Ghi + fsync nốt mọi record đang chờ rồi đóng file."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                "journal_records": self.records,
+                "journal_queued": len(self._queue),
+                "journal_commits": self.commits,
+                "journal_max_batch": self.max_batch,
+                "journal_snapshots": self.snapshots,
+                "journal_writer_cpu_us": int(self.writer_cpu * 1e6),
+            }
+
+    # ----- writer thread -----
+
+    def _writer_loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:  # đã đóng và ghi hết
+                    break
+                items, self._queue = self._queue, []
+                closed = self._closed
+            started = time.thread_time()
+            try:
+                self._process(items)
+            except OSError as e:
+                print(f"[JOURNAL] Write failed: {type(e).__name__}: {e}")
+            self.writer_cpu += time.thread_time() - started
+            if not closed and self.commit_interval > 0:
+                time.sleep(self.commit_interval)
+        self._file.close()
+
+    def _process(self, items: List[Any]) -> None:
+        lines: List[str] = []
+        encoded = 0
+        for item in items:
+            if isinstance(item, dict):
+                lines.append(_encode(item))
+                encoded += 1
+                if encoded % ENCODE_CHUNK == 0:
+                    time.sleep(0)  # nhả GIL cho thread server giữa các nhóm
+                continue
+            # Lệnh điều khiển: record phía trước phải nằm trong segment hiện tại
+            self._commit(lines)
+            lines = []
+            if item[0] == "rotate":
+                self._file.close()
+                self._file = open(_segment_path(self.directory, item[1]), "ab")
+                _fsync_dir(self.directory)
+            elif item[0] == "snapshot":
+                self._write_snapshot(item[1], item[2])
+        self._commit(lines)
+
+    def _commit(self, lines: List[str]) -> None:
+        if not lines:
+            return
+        data = ("\n".join(lines) + "\n").encode("utf-8")
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.commits += 1
+        self.bytes_written += len(data)
+        self.max_batch = max(self.max_batch, len(lines))
+
+    def _write_snapshot(self, segment: int, rooms: List[Dict[str, Any]]) -> None:
+        path = os.path.join(self.directory, SNAPSHOT_NAME)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": SNAPSHOT_VERSION, "segment": segment, "rooms": rooms}, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        _fsync_dir(self.directory)
+        for old in _list_segments(self.directory):
+            if old < segment:
+                os.remove(_segment_path(self.directory, old))
+        self.snapshots += 1
+
+
+# ============================================================
+# RECOVERY
+# ============================================================
+
+def _apply(rooms: Dict[str, Dict[str, Any]], rec: Dict[str, Any]) -> None:
+    """Áp 1 record lên trạng thái phòng (idempotent, xem docstring module)."""
+    event, room_id = rec.get("e"), rec.get("r")
+    if event == "create":
+        tc = rec["tc"]
+        rooms.setdefault(room_id, {
+            "r": room_id, "tc": tc, "bot": None, "bc": None, "started": False,
+            "moves": [], "res": "ongoing", "tw": tc[0], "tb": tc[0],
+        })
+        return
+    room = rooms.get(room_id)
+    if room is None:
+        return
+    if event == "join":
+        if rec.get("bot") is not None:
+            room["bot"], room["bc"] = rec["bot"], rec["c"]
+    elif event == "start":
+        if not room["started"]:
+            room.update(started=True, moves=[], res="ongoing", tw=room["tc"][0], tb=room["tc"][0])
+    elif event == "move":
+        n, moves = rec["n"], room["moves"]
+        if n == len(moves) + 1:
+            moves.append(rec["u"])
+            room.update(tw=rec["tw"], tb=rec["tb"], res=rec.get("res", "ongoing"))
+        elif n > len(moves) + 1 and room["res"] != "aborted":
+            print(f"[JOURNAL] Room {room_id}: missing moves before #{n}, ignoring the rest of this game")
+            room["res"] = "aborted"
+    elif event == "result":
+        room.update(res=rec["res"], tw=rec["tw"], tb=rec["tb"])
+    elif event == "delete":
+        del rooms[room_id]
+
+
+def load_journal(directory: str) -> Tuple[Dict[str, Dict[str, Any]], int]:
+    """
+    Đọc snapshot + các segment sau nó.
+    Trả về ({room_id: trạng thái phòng}, số record đã replay). Thư mục chưa có -> ({}, 0).
+    Trạng thái phòng: {"r", "tc": [initial, increment, delay], "bot", "bc" (màu của bot),
+    "started", "moves", "res", "tw", "tb" (thời gian "gửi ngân hàng" tới đầu lượt hiện tại)}.
+    """
+    if not os.path.isdir(directory):
+        return {}, 0
+    rooms: Dict[str, Dict[str, Any]] = {}
+    first_segment = 0
+    snapshot_path = os.path.join(directory, SNAPSHOT_NAME)
+    if os.path.exists(snapshot_path):
+        with open(snapshot_path, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"unsupported snapshot version: {snapshot.get('version')}")
+        rooms = {room["r"]: room for room in snapshot["rooms"]}
+        first_segment = snapshot["segment"]
+
+    replayed = 0
+    for segment in _list_segments(directory):
+        if segment < first_segment:
+            continue
+        path = _segment_path(directory, segment)
+        with open(path, "rb") as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.endswith(b"\n"):
+                    print(f"[JOURNAL] {path}:{line_no}: truncated record (crash while writing), skipped")
+                    break
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    print(f"[JOURNAL] {path}:{line_no}: corrupt record, skipping rest of segment")
+                    break
+                _apply(rooms, rec)
+                replayed += 1
+    return rooms, replayed
@@ -1,17 +1,128 @@
+import argparse
+import os
+import random
+import signal
 import socket
 import threading
 import json
 import uuid
 import time
-from typing import Dict, Optional
+from typing import Any, Dict, NamedTuple, Optional
 
 # Import core chess logic
 from core.board import Board
 from core.rules import generate_legal_moves, get_game_result
+from core.wire import FRAMING_BINARY, FRAMING_JSON, WireError, encode, make_reader
+from server.matchmaking import DEFAULT_RATING, MAX_RATING, MIN_RATING, WIDEN_STEP_SEC, MAX_WINDOW, Matchmaker, Seek
+from server.outbound import SocketConnection, format_stats, outbound_stats
+from server.timer_wheel import TimerWheel
 
 HOST = "0.0.0.0"
 PORT = 5000
 
+# Protocol v1: mỗi thay đổi gửi full "state" (FEN).
+# Protocol v2 (client gửi "protocol": 2 khi join): chỉ gửi "delta" {seq, uci, clock},
+# full "state" (có seq) chỉ khi join / resync / ván kết thúc ngoài nước đi đã gửi lại.
+PROTOCOL_VERSION = 2
+
+# Byte đã nhận nhưng chưa thành message (dòng / frame dở) vượt mức này -> client lỗi, đóng kết nối
+MAX_PENDING_BYTES = 64 * 1024
+
+
+class TimeControl(NamedTuple):
+    """
+    Time control của 1 phòng (giây):
+    - initial: thời gian ban đầu mỗi bên
+    - increment: cộng thêm sau mỗi nước đi (Fischer)
+    - delay: mỗi lượt, `delay` giây đầu không bị trừ giờ (Bronstein/US delay)
+    """
+
+    initial: float = 300.0
+    increment: float = 0.0
+    delay: float = 0.0
+
+
+DEFAULT_TIME_CONTROL = TimeControl()
+
+# Số khán giả tối đa mỗi phòng
+MAX_SPECTATORS = 2000
+MAX_TIME_CONTROL_SEC = 24 * 3600
+
+
+def parse_time_control(value: Any) -> TimeControl:
+    """
+    "time_control" trong join tạo phòng: None -> mặc định,
+    dict {"initial", "increment", "delay"} (giây) hoặc chuỗi "M+S" (phút + giây increment).
+    Raise ValueError nếu không hợp lệ.
+    """
+    if value is None:
+        return DEFAULT_TIME_CONTROL
+    if isinstance(value, str):
+        minutes, _, increment = value.partition("+")
+        tc = TimeControl(float(minutes) * 60, float(increment or 0))
+    elif isinstance(value, dict):
+        tc = TimeControl(
+            float(value.get("initial", DEFAULT_TIME_CONTROL.initial)),
+            float(value.get("increment", 0)),
+            float(value.get("delay", 0)),
+        )
+    else:
+        raise ValueError("time_control must be a dict or 'M+S' string")
+    if not 0 < tc.initial <= MAX_TIME_CONTROL_SEC:
+        raise ValueError(f"initial out of range: {tc.initial}")
+    if not (0 <= tc.increment <= 600 and 0 <= tc.delay <= 600):
+        raise ValueError(f"increment/delay out of range: {tc.increment}/{tc.delay}")
+    return tc
+
+
+class _NoLock:
+    """
+    Lock giả cho chế độ 1 thread (asyncio): mọi handler chạy tuần tự trên event
+    loop nên room logic vốn đã không có race, không cần threading.Lock.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+# True = server thread-per-connection (mặc định); asyncio gọi use_thread_locks(False)
+_thread_locks = True
+
+
+def _new_lock():
+    return threading.Lock() if _thread_locks else _NoLock()
+
+
+def use_thread_locks(enabled: bool) -> None:
+    """Bật/tắt lock thật cho room registry và các GameRoom tạo sau đó."""
+    global _thread_locks, rooms_lock, seeks_lock
+    _thread_locks = enabled
+    rooms_lock = _new_lock()
+    seeks_lock = _new_lock()
+
+
+class BotSeat:
+    """
+    Ghế của bot server trong GameRoom (thay cho conn của người chơi).
+    Không nhận message: nước đi của bot được yêu cầu qua request_bot_move.
+    """
+
+    __slots__ = ("spec", "color")
+    framing = FRAMING_JSON
+
+    def __init__(self, spec: dict, color: str):
+        self.spec = spec
+        self.color = color
+
+    def sendall(self, data: bytes) -> None:
+        pass
+
+    def is_closing(self) -> bool:
+        return False
+
 
 class GameRoom:
     """
@@ -19,11 +130,24 @@ class GameRoom:
     Server giữ Board là source of truth.
     """
 
-    def __init__(self, room_id: str):
+    def __init__(self, room_id: str, time_control: TimeControl = DEFAULT_TIME_CONTROL):
         self.room_id = room_id
-        self.lock = threading.Lock()
+        self.lock = _new_lock()
+        # Khoá board / clock / result: nước đi (thread của người chơi) và timer hết giờ
+        # (thread của clock_wheel) có thể chạy đồng thời
+        self.state_lock = _new_lock()
         self.white_conn: Optional[socket.socket] = None
         self.black_conn: Optional[socket.socket] = None
+        # conn -> protocol version đã thương lượng lúc join
+        self.protocols: Dict[Any, int] = {}
+        # Khán giả (message "watch"): conn -> protocol version
+        self.spectators: Dict[Any, int] = {}
+        # Bot server (nếu phòng tạo với "bot"), ngồi ở white_conn / black_conn
+        self.bot: Optional[BotSeat] = None
+
+        # seq tăng 1 mỗi thay đổi state (nước đi, kết quả) -> client v2 phát hiện mất delta
+        self.seq: int = 0
+        self.moves: list = []  # các nước UCI đã đi
 
         # Chess board & state
         self.board: Optional[Board] = None
@@ -33,27 +157,41 @@ class GameRoom:
         # "ongoing" | "white_win" | "black_win" | "draw"
         self.result: str = "ongoing"
 
-        # Clock (seconds)
-        self.initial_time_sec: float = 300.0  # 5 phút, tuỳ bạn chỉnh
-        self.white_time_left: float = self.initial_time_sec
-        self.black_time_left: float = self.initial_time_sec
-        self.last_update_ts: float = time.time()
-        self.turn_color: str = "white"
+        # Clock (seconds, time.monotonic): *_time_left là thời gian "gửi ngân hàng" tới đầu
+        # lượt hiện tại; bên đang tới lượt bị trừ dần kể từ turn_started_at (sau delay).
+        self.time_control = time_control
+        self.white_time_left: float = time_control.initial
+        self.black_time_left: float = time_control.initial
+        self.turn_started_at: float = time.monotonic()
+        # Timer hết giờ của bên đang tới lượt trên clock_wheel, re-arm sau mỗi nước đi
+        self.flag_timer = None
 
-    def add_player(self, conn: socket.socket) -> Optional[str]:
+    def add_player(self, conn: socket.socket, protocol: int = 1, preferred: Optional[str] = None) -> Optional[str]:
         """
-        Thêm player vào phòng.
+        Thêm player vào phòng (ghế `preferred` nếu còn trống, mặc định trắng trước).
         Trả về 'white' hoặc 'black' nếu join thành công, None nếu phòng đã full.
         """
         with self.lock:
-            if self.white_conn is None:
+            if self.white_conn is None and (preferred != "black" or self.black_conn is not None):
                 self.white_conn = conn
-                return "white"
+                color = "white"
             elif self.black_conn is None:
                 self.black_conn = conn
-                return "black"
+                color = "black"
             else:
                 return None
+            self.protocols[conn] = protocol
+        journal_event({"e": "join", "r": self.room_id, "c": color})
+        return color
+
+    def add_bot(self, seat: BotSeat) -> None:
+        with self.lock:
+            if seat.color == "white":
+                self.white_conn = seat
+            else:
+                self.black_conn = seat
+            self.bot = seat
+        journal_event({"e": "join", "r": self.room_id, "c": seat.color, "bot": seat.spec})
 
     def other_conn(self, conn: socket.socket) -> Optional[socket.socket]:
         with self.lock:
@@ -69,6 +207,34 @@ class GameRoom:
                 self.white_conn = None
             elif conn is self.black_conn:
                 self.black_conn = None
+            self.protocols.pop(conn, None)
+            self.spectators.pop(conn, None)
+            # Người chơi rời phòng bot -> bot cũng rời, phòng trống sẽ bị xoá
+            if self.bot is not None and conn is not self.bot and self.white_conn in (None, self.bot) \
+                    and self.black_conn in (None, self.bot):
+                self.white_conn = self.black_conn = None
+
+    def add_spectator(self, conn: Any, protocol: int = 1) -> bool:
+        with self.lock:
+            if len(self.spectators) >= MAX_SPECTATORS:
+                return False
+            self.spectators[conn] = protocol
+            return True
+
+    def spectator_count(self) -> int:
+        with self.lock:
+            return len(self.spectators)
+
+    def recipients(self) -> list:
+        """[(conn, protocol)] của người chơi + khán giả, để broadcast (không gồm bot)."""
+        with self.lock:
+            targets = [
+                (c, self.protocols.get(c, 1))
+                for c in (self.white_conn, self.black_conn)
+                if c is not None and c is not self.bot
+            ]
+            targets.extend(self.spectators.items())
+        return targets
 
     def is_empty(self) -> bool:
         with self.lock:
@@ -98,51 +264,60 @@ class GameRoom:
                 self.board = Board()  # new game
                 self.started = True
                 self.result = "ongoing"
-                self.white_time_left = self.initial_time_sec
-                self.black_time_left = self.initial_time_sec
-                self.last_update_ts = time.time()
-                self.turn_color = "white"
+                self.white_time_left = self.time_control.initial
+                self.black_time_left = self.time_control.initial
+                self.turn_started_at = time.monotonic()
+                self.seq = 0
+                self.moves = []
+                self._arm_flag_timer()
+                journal_event({"e": "start", "r": self.room_id})
                 print(f"[ROOM] Board created for room {self.room_id}, game started")
 
-    def _update_clock(self):
-        """
-        Cập nhật clock dựa trên thời gian thực cho bên đang tới lượt.
-        Gọi mỗi lần trước khi xử lý nước đi mới.
-        """
-        if not self.started or self.board is None:
-            return
-
-        now = time.time()
-        dt = now - self.last_update_ts
-        self.last_update_ts = now
-
-        # turn_color dựa trên board.turn_white
-        self.turn_color = "white" if self.board.turn_white else "black"
-
-        if self.turn_color == "white":
-            self.white_time_left -= dt
-        else:
-            self.black_time_left -= dt
-
-        # clamp
-        if self.white_time_left < 0:
-            self.white_time_left = 0
-        if self.black_time_left < 0:
-            self.black_time_left = 0
+    # ----- Clock -----
+
+    def time_left(self, color: str, now: Optional[float] = None) -> float:
+        """Thời gian còn lại thực tế của `color` (đã trừ lượt đang chạy nếu tới lượt nó)."""
+        banked = self.white_time_left if color == "white" else self.black_time_left
+        if self.result != "ongoing" or not self.started or color != self.current_turn_color():
+            return banked
+        now = time.monotonic() if now is None else now
+        used = max(0.0, now - self.turn_started_at - self.time_control.delay)
+        return max(0.0, banked - used)
+
+    def _arm_flag_timer(self) -> None:
+        """Đặt (lại) deadline hết giờ cho bên đang tới lượt."""
+        clock_wheel.cancel(self.flag_timer)
+        color = self.current_turn_color()
+        banked = self.white_time_left if color == "white" else self.black_time_left
+        deadline = self.turn_started_at + self.time_control.delay + banked
+        self.flag_timer = clock_wheel.schedule_at(deadline, flag_room, self)
+
+    def stop_clock(self) -> None:
+        """Ván kết thúc: chốt thời gian của bên đang tới lượt, huỷ timer hết giờ."""
+        if self.started and self.board is not None:
+            left = self.time_left(self.current_turn_color())
+            if self.board.turn_white:
+                self.white_time_left = left
+            else:
+                self.black_time_left = left
+        clock_wheel.cancel(self.flag_timer)
+        self.flag_timer = None
 
-    def _check_flag(self) -> Optional[str]:
+    def check_flag(self) -> Optional[dict]:
         """
-        Kiểm tra hết giờ: trả về 'white_win', 'black_win' hoặc None
-        (có thể trả 'draw' nếu cả 2 hết giờ).
+        Bên đang tới lượt đã hết giờ -> kết thúc ván, trả về state mới; chưa hết -> None.
+        Gọi bởi timer hết giờ (flag_room) và bởi make_move.
         """
-        if self.white_time_left <= 0 and self.black_time_left <= 0:
-            # hoà do cả 2 hết giờ, tuỳ bạn muốn xử lý
-            return "draw"
-        if self.white_time_left <= 0:
-            return "black_win"
-        if self.black_time_left <= 0:
-            return "white_win"
-        return None
+        if self.result != "ongoing" or not self.started or self.board is None:
+            return None
+        color = self.current_turn_color()
+        if self.time_left(color) > 0:
+            return None
+        self.stop_clock()
+        self.result = "black_win" if color == "white" else "white_win"
+        self.seq += 1
+        self._journal_result()
+        return self.state_message()
 
     def current_turn_color(self) -> str:
         """
@@ -153,12 +328,51 @@ class GameRoom:
             return "white"
         return "white" if self.board.turn_white else "black"
 
+    def state_message(self, last_move: Optional[str] = None) -> dict:
+        """Full snapshot (message 'state') của ván hiện tại."""
+        return {
+            "type": "state",
+            "room_id": self.room_id,
+            "seq": self.seq,
+            "fen": self.board.export_fen() if self.board is not None else None,
+            "turn": self.current_turn_color(),
+            "result": self.result,
+            "last_move": last_move,
+            "time_white": self.time_left("white"),
+            "time_black": self.time_left("black"),
+        }
+
+    def snapshot_message(self) -> dict:
+        """State hiện tại + toàn bộ nước đi (catch-up cho khán giả vào giữa ván)."""
+        with self.state_lock:
+            msg = self.state_message(self.moves[-1] if self.moves else None)
+            msg["moves"] = list(self.moves)
+        return msg
+
+    def set_result(self, result: str) -> None:
+        """Kết thúc ván không qua nước đi (resign / draw): cũng là 1 thay đổi state."""
+        with self.state_lock:
+            self.stop_clock()
+            self.result = result
+            self.seq += 1
+            self._journal_result()
+
+    def _journal_result(self) -> None:
+        journal_event({
+            "e": "result", "r": self.room_id, "res": self.result,
+            "tw": self.white_time_left, "tb": self.black_time_left,
+        })
+
     def make_move(self, color: str, uci: str) -> dict:
         """
         Thực hiện nước đi nếu hợp lệ & đúng lượt.
         Trả về dict state trả cho client.
         Có thể raise ValueError nếu illegal move hoặc game đã kết thúc.
         """
+        with self.state_lock:
+            return self._make_move_locked(color, uci)
+
+    def _make_move_locked(self, color: str, uci: str) -> dict:
         # Nếu game đã kết thúc rồi thì không cho đi nữa
         if self.result != "ongoing":
             raise ValueError("game_already_over")
@@ -168,21 +382,18 @@ class GameRoom:
             print(f"[DEBUG] make_move called but game not started: board={self.board}, started={self.started}")
             raise ValueError("game_not_started")
 
-        # Cập nhật clock cho lượt hiện tại trước khi xử lý move
-        self._update_clock()
-
-        # Kiểm tra hết giờ trước khi cho đi
-        flag_result = self._check_flag()
-        if flag_result is not None:
-            # game đã hết giờ, không cho đi nữa
-            self.result = flag_result
-            raise ValueError("time_over")
-
         # Check đúng lượt
         expected_color = self.current_turn_color()
         if color != expected_color:
             raise ValueError("not_your_turn")
 
+        # Nước đi tới sau deadline (timer hết giờ chưa kịp chạy): không cho đi,
+        # handle_move gọi flag_room để kết thúc ván
+        now = time.monotonic()
+        left = self.time_left(color, now)
+        if left <= 0:
+            raise ValueError("time_over")
+
         legal_moves = generate_legal_moves(self.board)
         if uci not in legal_moves:
             raise ValueError("illegal_move")
@@ -190,41 +401,253 @@ class GameRoom:
         # Apply move
         self.board.apply_uci(uci)
 
+        self.moves.append(uci)
+        self.seq += 1
+
+        # Chốt clock của người vừa đi (+ increment), lượt mới bắt đầu từ now
+        left += self.time_control.increment
+        if color == "white":
+            self.white_time_left = left
+        else:
+            self.black_time_left = left
+        self.turn_started_at = now
+
         # Sau khi đi xong, cập nhật lượt & check kết quả (chiếu hết, hoà...)
-        fen = self.board.export_fen()
-        result = get_game_result(self.board)
+        self.result = get_game_result(self.board)
+        if self.result == "ongoing":
+            self._arm_flag_timer()
+        else:
+            self.stop_clock()
+        # Gọi dưới state_lock: thứ tự record trong journal = thứ tự nước đi của phòng
+        record = {
+            "e": "move", "r": self.room_id, "n": len(self.moves), "u": uci,
+            "tw": self.white_time_left, "tb": self.black_time_left,
+        }
+        if self.result != "ongoing":
+            record["res"] = self.result
+        journal_event(record)
+        return self.state_message(uci)
+
+    def journal_record(self) -> dict:
+        """Trạng thái phòng cho snapshot của journal (cùng dạng với server/journal.load_journal)."""
+        with self.state_lock:
+            bot = self.bot
+            return {
+                "r": self.room_id,
+                "tc": list(self.time_control),
+                "bot": bot.spec if bot is not None else None,
+                "bc": bot.color if bot is not None else None,
+                "started": self.started,
+                "moves": list(self.moves),
+                "res": self.result,
+                "tw": self.white_time_left,
+                "tb": self.black_time_left,
+            }
 
-        # Nếu game chưa kết thúc do nước cờ, vẫn cần check flag 1 lần nữa
-        if result == "ongoing":
-            flag_result = self._check_flag()
-            if flag_result is not None:
-                result = flag_result
 
-        self.result = result
+# Timer wheel dùng chung cho cả server: deadline hết giờ của các phòng, mở rộng cửa sổ seek
+clock_wheel = TimerWheel()
+
+
+def flag_room(room: GameRoom) -> None:
+    """Timer hết giờ của phòng: nếu bên đang tới lượt thật sự hết giờ -> broadcast kết quả."""
+    with room.state_lock:
+        state = room.check_flag()
+    if state is not None:
+        print(f"[GAME] Flag fall in room {room.room_id}, result={state['result']}")
+        notify_update(room, state)
+
+
+# Event loop của server asyncio (None = server thread): kết quả từ thread khác phải quay về đây
+_event_loop = None
+
+
+def start_clock_service(loop=None) -> None:
+    """Chạy clock_wheel: trên event loop (asyncio) hoặc bằng 1 thread riêng (server thread)."""
+    global _event_loop
+    _event_loop = loop
+    if loop is not None:
+        clock_wheel.attach_to_loop(loop)
+    else:
+        clock_wheel.run_in_thread()
+
+
+# Pool bot (server/bots.py); None = tắt bot (--bot-workers 0)
+bot_service = None
+
+
+def default_bot_workers(processes: int = 1) -> int:
+    """Chừa 1 core cho phần mạng, chia phần còn lại cho `processes` process server (cluster)."""
+    return max(1, ((os.cpu_count() or 1) - 1) // processes)
+
+
+def start_bot_service(workers: Optional[int] = None) -> None:
+    global bot_service
+    workers = default_bot_workers() if workers is None else workers
+    if workers > 0:
+        from server.bots import BotService
+
+        bot_service = BotService(workers, call_in_server)
 
-        state = {
-            "type": "state",
-            "room_id": self.room_id,
-            "fen": fen,
-            "turn": self.current_turn_color(),   # dựa trên board.turn_white
-            "result": self.result,
-            "last_move": uci,
-            "time_white": self.white_time_left,
-            "time_black": self.black_time_left,
-        }
-        return state
+
+def stop_bot_service() -> None:
+    """Gọi khi tắt server: process con của multiprocessing (worker cluster) không tự dừng pool lúc thoát."""
+    global bot_service
+    if bot_service is not None:
+        bot_service.shutdown()
+        bot_service = None
+
+
+# Write-ahead journal (server/journal.py); None = tắt (không có --journal-dir)
+journal = None
+
+# Phòng khôi phục từ journal mà không người chơi nào quay lại sau chừng này giây -> xoá
+RECOVERY_GRACE_SEC = 300.0
+
+
+def journal_event(record: dict) -> None:
+    if journal is not None:
+        journal.append(record)
+
+
+def start_journal(directory: Optional[str]) -> None:
+    """
+    Khôi phục phòng từ journal trong `directory` rồi bật ghi journal + snapshot định kỳ.
+    Gọi sau start_clock_service / start_bot_service, trước khi nhận kết nối.
+    """
+    global journal
+    if not directory:
+        return
+    from server.journal import Journal, load_journal
+
+    t0 = time.perf_counter()
+    states, replayed = load_journal(directory)
+    restored, moves = recover_rooms(states)
+    journal = Journal(directory)
+    # Trạng thái vừa khôi phục thành snapshot mới -> journal cũ được dọn ngay
+    journal.write_snapshot(journal.segment, _room_records())
+    print(f"[JOURNAL] Recovered {restored} rooms ({moves} moves, {replayed} records replayed) "
+          f"from {directory} in {time.perf_counter() - t0:.2f}s")
+    _schedule_snapshot()
+
+
+def stop_journal() -> None:
+    """Ghi nốt record đang chờ; sau đó thay đổi của phòng (VD người chơi bị ngắt lúc tắt) không vào journal."""
+    global journal
+    if journal is not None:
+        journal.close()
+        journal = None
+
+
+def _room_records() -> list:
+    with rooms_lock:
+        room_list = list(rooms.values())
+    return [room.journal_record() for room in room_list]
+
+
+def _schedule_snapshot() -> None:
+    from server.journal import SNAPSHOT_INTERVAL_SEC
+
+    clock_wheel.schedule(SNAPSHOT_INTERVAL_SEC, take_snapshot)
+
+
+def take_snapshot() -> None:
+    """Timer trên clock_wheel: compaction journal nếu có thay đổi kể từ snapshot trước."""
+    if journal is None:
+        return
+    if journal.records_since_snapshot:
+        # Chuyển segment TRƯỚC khi chụp: record nào không có trong snapshot chắc chắn nằm ở segment mới
+        segment = journal.rotate()
+        journal.write_snapshot(segment, _room_records())
+    _schedule_snapshot()
+
+
+def recover_rooms(states: Dict[str, dict]) -> tuple:
+    """
+    Dựng lại GameRoom từ trạng thái trong journal: chỉ ván đã bắt đầu và chưa kết thúc.
+    Clock: thời gian "gửi ngân hàng" tới đầu lượt hiện tại, lượt tính lại từ lúc khôi phục
+    (thời gian server chết không bị trừ). Người chơi join lại bằng game_id (+ "color").
+    Trả về (số phòng, số nước đi đã replay).
+    """
+    restored = moves = 0
+    for state in states.values():
+        if not state["started"] or state["res"] != "ongoing":
+            continue
+        room = GameRoom(state["r"], TimeControl(*state["tc"]))
+        if state["bot"] is not None:
+            if bot_service is None or not bot_service.admit():
+                print(f"[JOURNAL] Bot room {room.room_id} not recovered: bots disabled or busy")
+                continue
+            room.add_bot(BotSeat(state["bot"], state["bc"]))
+        board = Board()
+        board.replay_uci(state["moves"])
+        with room.state_lock:
+            room.board = board
+            room.started = True
+            room.moves = list(state["moves"])
+            room.seq = len(room.moves)
+            room.white_time_left = state["tw"]
+            room.black_time_left = state["tb"]
+            room.turn_started_at = time.monotonic()
+            room._arm_flag_timer()
+        with rooms_lock:
+            rooms[room.room_id] = room
+        clock_wheel.schedule(RECOVERY_GRACE_SEC, _expire_recovered, room)
+        if room.bot is not None:
+            request_bot_move(room)
+        restored += 1
+        moves += len(room.moves)
+    return restored, moves
+
+
+def _expire_recovered(room: GameRoom) -> None:
+    """Hết RECOVERY_GRACE_SEC mà phòng khôi phục vẫn không có người chơi nào -> xoá."""
+    with room.lock:
+        if all(c is None or c is room.bot for c in (room.white_conn, room.black_conn)):
+            room.white_conn = room.black_conn = None
+    delete_room_if_empty(room)
+
+
+def server_stats() -> str:
+    """Dòng [STATS] chung cho server thread / asyncio / cluster worker."""
+    parts = [f"rooms={len(rooms)} seeks={len(matchmaker)}", format_stats(outbound_stats())]
+    if bot_service is not None:
+        parts.append(format_stats(bot_service.stats()))
+    if journal is not None:
+        parts.append(format_stats(journal.stats()))
+    return " ".join(parts)
+
+
+def call_in_server(fn, *args) -> None:
+    """Gọi fn(*args) từ thread ngoài (VD pool bot): asyncio -> chuyển về event loop; thread -> gọi luôn."""
+    if _event_loop is not None:
+        try:
+            _event_loop.call_soon_threadsafe(fn, *args)
+        except RuntimeError:
+            pass  # loop đã đóng (server đang tắt): bỏ kết quả
+    else:
+        fn(*args)
 
 
 # Global room registry
 rooms: Dict[str, GameRoom] = {}
 rooms_lock = threading.Lock()
 
+# Tiền tố room id (cluster mode: mã hoá worker sở hữu phòng, xem server/cluster.py)
+_room_id_prefix = ""
 
-def create_room() -> GameRoom:
-    room_id = uuid.uuid4().hex[:8]  # short id
-    room = GameRoom(room_id)
+
+def set_room_id_prefix(prefix: str) -> None:
+    global _room_id_prefix
+    _room_id_prefix = prefix
+
+
+def create_room(time_control: TimeControl = DEFAULT_TIME_CONTROL) -> GameRoom:
+    room_id = _room_id_prefix + uuid.uuid4().hex[: 8 - len(_room_id_prefix)]  # short id
+    room = GameRoom(room_id, time_control)
     with rooms_lock:
         rooms[room_id] = room
+    journal_event({"e": "create", "r": room_id, "tc": list(time_control)})
     print(f"[ROOM] Created room {room_id}")
     return room
 
@@ -239,96 +662,215 @@ def delete_room_if_empty(room: GameRoom):
         if room.is_empty() and room.room_id in rooms:
             print(f"[ROOM] Deleting empty room {room.room_id}")
             del rooms[room.room_id]
+            clock_wheel.cancel(room.flag_timer)
+            journal_event({"e": "delete", "r": room.room_id})
+            if room.bot is not None and bot_service is not None:
+                bot_service.release()
 
 
 # ----- Networking helpers -----
 
 def send_json(conn: socket.socket, msg: dict):
+    """Gửi msg theo framing của kết nối (JSON line mặc định, binary nếu đã thương lượng)."""
+    send_bytes(conn, encode(msg, getattr(conn, "framing", FRAMING_JSON)))
+
+
+def send_bytes(conn: socket.socket, data: bytes) -> None:
+    """Gửi frame đã encode sẵn (broadcast: encode 1 lần, gửi cùng bytes cho nhiều kết nối)."""
     try:
-        data = json.dumps(msg) + "\n"
-        conn.sendall(data.encode("utf-8"))
+        conn.sendall(data)
     except OSError as e:
         print(f"[WARN] send_json error: {e}")
-        pass
 
 
 # ----- Per-connection handler -----
 
+class ClientSession:
+    """
+    Trạng thái của 1 kết nối, dùng chung cho server thread và asyncio.
+    conn chỉ cần có sendall(bytes) / close() / framing (SocketConnection hoặc AsyncConnection);
+    sendall chỉ xếp hàng frame (server/outbound.py), không block handler.
+    reader: JsonLineReader hoặc BinaryFrameReader (đổi khi client gửi "hello").
+    """
+
+    __slots__ = ("conn", "addr", "room", "color", "reader", "seek")
+
+    def __init__(self, conn: Any, addr):
+        self.conn = conn
+        self.addr = addr
+        self.room: Optional[GameRoom] = None
+        self.color: Optional[str] = None  # 'white' hoặc 'black'
+        self.reader = make_reader(getattr(conn, "framing", FRAMING_JSON))
+        self.seek: Optional[Seek] = None  # đang chờ ghép cặp
+
+
+def parse_line(session: ClientSession, line: str) -> Optional[dict]:
+    """1 dòng JSON -> dict; None nếu dòng trống hoặc JSON lỗi (đã báo lỗi cho client)."""
+    line = line.strip()
+    if not line:
+        return None
+
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError:
+        print(f"[WARN] Invalid JSON from {session.addr}: {line}")
+        send_json(session.conn, {"type": "error", "message": "invalid_json"})
+        return None
+
+
+def handle_line(session: ClientSession, line: str) -> None:
+    """Xử lý 1 dòng JSON nhận từ client."""
+    msg = parse_line(session, line)
+    if msg is not None:
+        dispatch_message(session, msg)
+
+
+def handle_data(session: ClientSession, data: bytes) -> None:
+    """
+    Xử lý byte nhận từ socket: tách message theo framing hiện tại rồi dispatch.
+    Đọc lại session.reader mỗi vòng vì "hello" có thể đổi framing giữa chừng.
+    Raise WireError nếu frame hỏng / dữ liệu dở dang quá lớn.
+    """
+    session.reader.feed(data)
+    while not session.conn.is_closing():
+        item = session.reader.next()
+        if item is None:
+            break
+        if isinstance(item, str):
+            handle_line(session, item)
+        else:
+            dispatch_message(session, item)
+    if not session.conn.is_closing():
+        check_pending(session)
+
+
+def check_pending(session: ClientSession) -> None:
+    if session.reader.pending_bytes > MAX_PENDING_BYTES:
+        raise WireError(f"{session.reader.pending_bytes} bytes without a complete message")
+
+
+def dispatch_message(session: ClientSession, msg: dict) -> None:
+    conn, addr = session.conn, session.addr
+    current_room, player_color = session.room, session.color
+    msg_type = msg.get("type") if isinstance(msg, dict) else None
+
+    if msg_type == "hello":
+        handle_hello(session, msg)
+    elif msg_type == "join":
+        # Rời phòng đang ngồi / đang xem (+ huỷ seek) trước, như handle_seek:
+        # không để lại ghế trỏ tới kết nối không còn thuộc phòng đó
+        close_session(session)
+        session.room, session.color = handle_join(conn, addr, msg)
+    elif msg_type == "watch":
+        close_session(session)
+        session.room, session.color = handle_watch(conn, addr, msg), None
+    elif msg_type == "seek":
+        handle_seek(session, msg)
+    elif msg_type == "cancel_seek":
+        if cancel_seek(session):
+            send_json(conn, {"type": "seek_cancelled"})
+        else:
+            send_json(conn, {"type": "error", "message": "not_seeking"})
+    elif msg_type == "move":
+        if current_room is None or player_color is None:
+            send_json(conn, {"type": "error", "message": "not_in_room"})
+        else:
+            handle_move(conn, addr, current_room, player_color, msg)
+    elif msg_type == "list_rooms":
+        handle_list_rooms(conn)
+    elif msg_type == "resign":
+        if current_room is None or player_color is None:
+            send_json(conn, {"type": "error", "message": "not_in_room"})
+        else:
+            handle_resign(conn, addr, current_room, player_color)
+    elif msg_type == "offer_draw":
+        if current_room is None or player_color is None:
+            send_json(conn, {"type": "error", "message": "not_in_room"})
+        else:
+            handle_offer_draw(conn, addr, current_room, player_color)
+    elif msg_type == "resync":
+        if current_room is None:
+            send_json(conn, {"type": "error", "message": "not_in_room"})
+        else:
+            handle_resync(conn, current_room)
+    else:
+        send_json(conn, {"type": "error", "message": "unknown_message_type"})
+
+
+def close_session(session: ClientSession) -> None:
+    """Dọn dẹp khi kết nối đóng: huỷ seek, rời phòng, xoá phòng nếu trống."""
+    cancel_seek(session)
+    if session.room is not None:
+        session.room.remove_conn(session.conn)
+        delete_room_if_empty(session.room)
+        session.room, session.color = None, None
+
+
+def handle_hello(session: ClientSession, msg: dict) -> None:
+    """
+    Thương lượng framing: {"type": "hello", "framing": "binary" | "json"}.
+    Trả lời bằng framing cũ, sau đó mọi byte (2 chiều) dùng framing mới.
+    """
+    framing = msg.get("framing", FRAMING_JSON)
+    if framing not in (FRAMING_JSON, FRAMING_BINARY):
+        send_json(session.conn, {"type": "error", "message": "unsupported_framing"})
+        return
+    send_json(session.conn, {"type": "hello", "framing": framing, "protocol": PROTOCOL_VERSION})
+    if framing != session.conn.framing:
+        session.conn.framing = framing
+        session.reader = make_reader(framing, session.reader.take_rest())
+
+
 def handle_client(conn: socket.socket, addr):
     print(f"[INFO] New connection from {addr}")
-    buffer = ""
-    current_room: Optional[GameRoom] = None
-    player_color: Optional[str] = None  # 'white' hoặc 'black'
+    session = ClientSession(SocketConnection(conn), addr)
 
     try:
         while True:
-            data = conn.recv(4096)
+            data = conn.recv(65536)
             if not data:
                 print(f"[INFO] Connection closed by {addr}")
                 break
 
-            buffer += data.decode("utf-8")
-
-            while "\n" in buffer:
-                line, buffer = buffer.split("\n", 1)
-                line = line.strip()
-                if not line:
-                    continue
-
-                try:
-                    msg = json.loads(line)
-                except json.JSONDecodeError:
-                    print(f"[WARN] Invalid JSON from {addr}: {line}")
-                    send_json(conn, {"type": "error", "message": "invalid_json"})
-                    continue
-
-                msg_type = msg.get("type")
-
-                if msg_type == "join":
-                    current_room, player_color = handle_join(conn, addr, msg)
-                elif msg_type == "move":
-                    if current_room is None or player_color is None:
-                        send_json(conn, {"type": "error", "message": "not_in_room"})
-                    else:
-                        handle_move(conn, addr, current_room, player_color, msg)
-                elif msg_type == "list_rooms":
-                    handle_list_rooms(conn)
-                elif msg_type == "resign":
-                    if current_room is None or player_color is None:
-                        send_json(conn, {"type": "error", "message": "not_in_room"})
-                    else:
-                        handle_resign(conn, addr, current_room, player_color)
-                elif msg_type == "offer_draw":
-                    if current_room is None or player_color is None:
-                        send_json(conn, {"type": "error", "message": "not_in_room"})
-                    else:
-                        handle_offer_draw(conn, addr, current_room, player_color)
-                else:
-                    send_json(conn, {"type": "error", "message": "unknown_message_type"})
+            handle_data(session, data)
+            if session.conn.is_closing():
+                break  # bị ngắt phía server (client đọc quá chậm)
 
     except ConnectionResetError:
         print(f"[INFO] Connection reset by {addr}")
+    except WireError as e:
+        print(f"[WARN] Protocol error from {addr}: {e}, closing")
     finally:
         # Cleanup if in room
-        if current_room is not None:
-            current_room.remove_conn(conn)
-            delete_room_if_empty(current_room)
-        conn.close()
+        close_session(session)
+        # Đóng qua SocketConnection: đánh dấu closed + đánh thức writer thread để nó kết thúc
+        # (conn.close() trực tiếp để writer chờ mãi và kết nối vẫn bị tính trong outbound_stats)
+        session.conn.close()
         print(f"[INFO] Connection handler for {addr} terminated")
 
 
 def handle_join(conn: socket.socket, addr, msg: dict) -> tuple[Optional[GameRoom], Optional[str]]:
     game_id = msg.get("game_id")
+    if game_id in ("", None) and msg.get("bot") is not None:
+        return handle_join_bot(conn, addr, msg)
     if game_id in ("", None):
         # create new room
-        room = create_room()
+        try:
+            time_control = parse_time_control(msg.get("time_control"))
+        except (TypeError, ValueError) as e:
+            print(f"[WARN] Invalid time_control from {addr}: {e}")
+            send_json(conn, {"type": "join_failed", "reason": "invalid_time_control"})
+            return None, None
+        room = create_room(time_control)
     else:
         room = get_room(str(game_id))
         if room is None:
             send_json(conn, {"type": "join_failed", "reason": "room_not_found"})
             return None, None
 
-    color = room.add_player(conn)
+    protocol = negotiate_protocol(msg)
+    # Ván đang dở (VD khôi phục từ journal sau restart): người chơi cũ lấy lại ghế bằng "color"
+    color = room.add_player(conn, protocol, msg.get("color") if room.started else None)
     if color is None:
         send_json(conn, {"type": "join_failed", "reason": "room_full"})
         return None, None
@@ -338,6 +880,8 @@ def handle_join(conn: socket.socket, addr, msg: dict) -> tuple[Optional[GameRoom
         "type": "joined",
         "room_id": room.room_id,
         "color": color,
+        "protocol": protocol,
+        "time_control": room.time_control._asdict(),
     })
 
     # Nếu phòng đã đủ 2 người, khởi tạo game và gửi state ban đầu
@@ -345,16 +889,7 @@ def handle_join(conn: socket.socket, addr, msg: dict) -> tuple[Optional[GameRoom
         print(f"[ROOM] Room {room.room_id} is full, starting game")
         room.ensure_started()
         if room.board is not None:
-            initial_state = {
-                "type": "state",
-                "room_id": room.room_id,
-                "fen": room.board.export_fen(),
-                "turn": room.current_turn_color(),
-                "result": get_game_result(room.board),
-                "last_move": None,
-                "time_white": room.white_time_left,
-                "time_black": room.black_time_left,
-            }
+            initial_state = room.state_message()
         else:
             initial_state = {
                 "type": "error",
@@ -363,10 +898,125 @@ def handle_join(conn: socket.socket, addr, msg: dict) -> tuple[Optional[GameRoom
         print(f"[DEBUG] sending initial_state to both: {initial_state}")
 
         notify_both(room, initial_state)
+    elif room.started and room.board is not None:
+        # Vào lại ván đang dở khi đối thủ chưa quay lại: state + toàn bộ nước đi
+        send_json(conn, room.snapshot_message())
 
     return room, color
 
 
+def handle_join_bot(conn: socket.socket, addr, msg: dict) -> tuple[Optional[GameRoom], Optional[str]]:
+    """
+    Tạo phòng chơi với bot server:
+    {"type": "join", "game_id": null, "bot": "medium" | {agent_spec}, "color": "white" | "black",
+     "time_control": ..., "protocol": 2}  (color bỏ trống = ngẫu nhiên)
+    """
+    from server.bots import parse_agent_spec
+
+    def fail(reason: str):
+        send_json(conn, {"type": "join_failed", "reason": reason})
+        return None, None
+
+    if bot_service is None:
+        return fail("bots_disabled")
+    try:
+        time_control = parse_time_control(msg.get("time_control"))
+    except (TypeError, ValueError):
+        return fail("invalid_time_control")
+    try:
+        spec = parse_agent_spec(msg.get("bot"))
+    except (ImportError, TypeError, ValueError) as e:
+        print(f"[WARN] Invalid bot spec from {addr}: {e}")
+        return fail("invalid_agent_spec")
+    color = msg.get("color")
+    if color not in ("white", "black"):
+        color = random.choice(("white", "black"))
+    if not bot_service.admit():
+        return fail("bots_busy")
+
+    room = create_room(time_control)
+    room.add_bot(BotSeat(spec, "black" if color == "white" else "white"))
+    protocol = negotiate_protocol(msg)
+    room.add_player(conn, protocol)
+    print(f"[ROOM] {addr} joined room {room.room_id} as {color} vs bot {spec}")
+    send_json(conn, {
+        "type": "joined",
+        "room_id": room.room_id,
+        "color": color,
+        "protocol": protocol,
+        "time_control": room.time_control._asdict(),
+        "bot": spec,
+    })
+    room.ensure_started()
+    notify_both(room, room.state_message())
+    request_bot_move(room)
+    return room, color
+
+
+def request_bot_move(room: GameRoom) -> None:
+    """Tới lượt bot -> gửi thế cờ sang pool, budget lấy từ clock của bot."""
+    from server.bots import move_budget_ms
+
+    bot = room.bot
+    with room.state_lock:
+        if bot is None or room.result != "ongoing" or room.current_turn_color() != bot.color:
+            return
+        tc = room.time_control
+        budget = move_budget_ms(room.time_left(bot.color), tc.increment, tc.delay)
+        seq, moves = room.seq, list(room.moves)
+    bot_service.submit(moves, bot.spec, budget, apply_bot_move, room, seq)
+
+
+def apply_bot_move(room: GameRoom, seq: int, uci: Optional[str], info: dict) -> None:
+    """Kết quả từ pool (đã về thread / event loop của server)."""
+    bot = room.bot
+    if bot is None or room.seq != seq or room.result != "ongoing" or room.room_id not in rooms:
+        return  # ván đã đổi (hết giờ, đầu hàng, phòng bị xoá...) trong lúc bot tính
+    if uci is None:
+        print(f"[BOT] Bot in room {room.room_id} returned no move ({info.get('error')}), resigning")
+        room.set_result("black_win" if bot.color == "white" else "white_win")
+        notify_update(room, room.state_message())
+        return
+    try:
+        state = room.make_move(bot.color, uci)
+    except ValueError as e:
+        print(f"[BOT] Bot move {uci} rejected in room {room.room_id}: {e}")
+        if str(e) == "time_over":
+            flag_room(room)
+        return
+    print(f"[BOT] Bot ({bot.color}) played {uci} in room {room.room_id} "
+          f"({info.get('elapsed_ms')}/{info.get('budget_ms')} ms)")
+    notify_update(room, state)
+
+
+def handle_watch(conn: socket.socket, addr, msg: dict) -> Optional[GameRoom]:
+    """
+    Vào xem phòng: {"type": "watch", "game_id": ..., "protocol": 1|2}.
+    Trả lời "watching", rồi snapshot (state + "moves") nếu ván đã bắt đầu; sau đó
+    khán giả nhận cùng update với người chơi (v2: delta có seq <= seq của snapshot thì bỏ qua).
+    """
+    room = get_room(str(msg.get("game_id")))
+    if room is None:
+        send_json(conn, {"type": "watch_failed", "reason": "room_not_found"})
+        return None
+
+    protocol = negotiate_protocol(msg)
+    if not room.add_spectator(conn, protocol):
+        send_json(conn, {"type": "watch_failed", "reason": "too_many_spectators"})
+        return None
+
+    print(f"[ROOM] {addr} watching room {room.room_id} ({room.spectator_count()} spectators)")
+    send_json(conn, {
+        "type": "watching",
+        "room_id": room.room_id,
+        "protocol": protocol,
+        "time_control": room.time_control._asdict(),
+    })
+    if room.started and room.board is not None:
+        send_json(conn, room.snapshot_message())
+    return room
+
+
 def handle_move(conn: socket.socket, addr, room: GameRoom, player_color: str, msg: dict):
     """
     Xử lý message move từ client:
@@ -386,11 +1036,15 @@ def handle_move(conn: socket.socket, addr, room: GameRoom, player_color: str, ms
         reason = str(e)
         print(f"[MOVE] Illegal/invalid move ffrom {addr} in room {room.room_id}: {reason}")
         send_json(conn, {"type": "move_rejected", "reason": reason})
+        if reason == "time_over":
+            flag_room(room)
         return
 
     # Move hợp lệ, broadcast state mới cho cả 2
     print(f"[MOVE] {addr} ({player_color}) played {uci} in room {room.room_id}")
-    notify_both(room, state)
+    notify_update(room, state)
+    if room.bot is not None:
+        request_bot_move(room)
 
 
 def handle_resign(conn: socket.socket, addr, room: GameRoom, player_color: str) -> None:
@@ -407,39 +1061,14 @@ def handle_resign(conn: socket.socket, addr, room: GameRoom, player_color: str)
 
     # Nếu game đã kết thúc rồi, chỉ gửi lại state hiện tại
     if room.result != "ongoing":
-        fen = room.board.export_fen()
-        state = {
-            "type": "state",
-            "room_id": room.room_id,
-            "fen": fen,
-            "turn": room.current_turn_color(),
-            "result": room.result,
-            "last_move": None,
-            "time_white": room.white_time_left,
-            "time_black": room.black_time_left,
-        }
-        notify_both(room, state)
+        notify_both(room, room.state_message())
         return
 
     # Đặt kết quả dựa trên người đầu hàng
-    if player_color == "white":
-        room.result = "black_win"
-    else:
-        room.result = "white_win"
+    room.set_result("black_win" if player_color == "white" else "white_win")
 
-    fen = room.board.export_fen()
-    state = {
-        "type": "state",
-        "room_id": room.room_id,
-        "fen": fen,
-        "turn": room.current_turn_color(),
-        "result": room.result,
-        "last_move": None,
-        "time_white": room.white_time_left,
-        "time_black": room.black_time_left,
-    }
     print(f"[GAME] Player {player_color} resigned in room {room.room_id}, result={room.result}")
-    notify_both(room, state)
+    notify_update(room, room.state_message())
 
 
 def handle_offer_draw(conn: socket.socket, addr, room: GameRoom, player_color: str) -> None:
@@ -455,39 +1084,148 @@ def handle_offer_draw(conn: socket.socket, addr, room: GameRoom, player_color: s
 
     if room.result != "ongoing":
         # Game đã kết thúc rồi, gửi lại state hiện tại
-        fen = room.board.export_fen()
-        state = {
-            "type": "state",
-            "room_id": room.room_id,
-            "fen": fen,
-            "turn": room.current_turn_color(),
-            "result": room.result,
-            "last_move": None,
-            "time_white": room.white_time_left,
-            "time_black": room.black_time_left,
-        }
-        notify_both(room, state)
+        notify_both(room, room.state_message())
         return
 
-    room.result = "draw"
-    fen = room.board.export_fen()
-    state = {
-        "type": "state",
-        "room_id": room.room_id,
-        "fen": fen,
-        "turn": room.current_turn_color(),
-        "result": room.result,
-        "last_move": None,
-        "time_white": room.white_time_left,
-        "time_black": room.black_time_left,
-    }
+    room.set_result("draw")
     print(f"[GAME] Draw agreed (auto) in room {room.room_id}")
-    notify_both(room, state)
+    notify_update(room, room.state_message())
 
 
-def handle_list_rooms(conn: socket.socket) -> None:
+# ----- Matchmaking -----
+
+matchmaker = Matchmaker()
+# Khoá session.seek: start_match "nhận" seek của 2 bên + xếp chỗ, cancel_seek (close_session)
+# huỷ seek -> không bao giờ xếp chỗ cho session đã / đang dọn dẹp
+seeks_lock = threading.Lock()
+
+
+def _parse_rating(value: Any, default: Optional[float]) -> Optional[float]:
+    if value is None:
+        return default
+    rating = float(value)
+    if not MIN_RATING <= rating <= MAX_RATING:
+        raise ValueError(f"rating out of range: {rating}")
+    return rating
+
+
+def handle_seek(session: ClientSession, msg: dict) -> None:
     """
-    Gửi về danh sách các phòng hiện tại, với số người chơi trong phòng.
+    Tìm ván tự động:
+    {"type": "seek", "time_control": {...} | "M+S", "rating": 1500, "rd": 80,
+     "rating_range": [lo, hi], "protocol": 2}  (chỉ time_control là nên có, còn lại tuỳ chọn)
+    Trả lời "seeking"; khi ghép được cả 2 nhận "joined" (+ "opponent_rating") rồi state ban đầu
+    như join thường. Seek mới thay seek cũ; "cancel_seek" để huỷ.
+    """
+    conn = session.conn
+    if session.room is not None and session.color is not None and session.room.result == "ongoing":
+        send_json(conn, {"type": "seek_failed", "reason": "already_in_room"})
+        return
+    try:
+        time_control = parse_time_control(msg.get("time_control"))
+    except (TypeError, ValueError):
+        send_json(conn, {"type": "seek_failed", "reason": "invalid_time_control"})
+        return
+    try:
+        rating = _parse_rating(msg.get("rating"), DEFAULT_RATING)
+        rd = min(max(float(msg.get("rd") or 0), 0.0), 350.0)
+        lo, hi = msg.get("rating_range") or (None, None)
+        lo, hi = _parse_rating(lo, None), _parse_rating(hi, None)
+        if lo is not None and hi is not None and lo > hi:
+            raise ValueError("empty rating_range")
+    except (TypeError, ValueError):
+        send_json(conn, {"type": "seek_failed", "reason": "invalid_rating"})
+        return
+
+    # Rời phòng cũ (ván đã xong / đang xem) và thay seek cũ nếu có
+    close_session(session)
+    now = time.monotonic()
+    seek = Seek(session, rating, time_control, now, rd, lo, hi, negotiate_protocol(msg))
+    session.seek = seek
+    send_json(conn, {"type": "seeking", "time_control": time_control._asdict(), "rating": rating})
+    _queue_seek(seek, now)
+
+
+def _queue_seek(seek: Seek, now: float) -> None:
+    other = matchmaker.add(seek, now)
+    if other is not None:
+        start_match(other, seek)
+    else:
+        _arm_seek_timer(seek, now)
+
+
+def _arm_seek_timer(seek: Seek, now: float) -> None:
+    """Hẹn lần mở rộng cửa sổ rating tiếp theo (tới MAX_WINDOW thì thôi, chỉ chờ seek mới)."""
+    if seek.window(now) >= MAX_WINDOW:
+        return
+    steps = int((now - seek.created) // WIDEN_STEP_SEC) + 1
+    seek.timer = clock_wheel.schedule_at(seek.created + steps * WIDEN_STEP_SEC, _retry_seek, seek)
+
+
+def _retry_seek(seek: Seek) -> None:
+    if seek.owner.seek is not seek:
+        matchmaker.remove(seek)  # chủ đã huỷ seek trong lúc nó được xếp lại hàng đợi
+        return
+    now = time.monotonic()
+    other = matchmaker.retry(seek, now)
+    if other is not None:
+        start_match(other, seek)
+    elif seek.bucket is not None:
+        _arm_seek_timer(seek, now)
+
+
+def cancel_seek(session: ClientSession) -> bool:
+    with seeks_lock:
+        seek, session.seek = session.seek, None
+    if seek is None:
+        return False
+    clock_wheel.cancel(seek.timer)
+    return matchmaker.remove(seek)
+
+
+def start_match(first: Seek, second: Seek) -> None:
+    """
+    2 seek đã được lấy khỏi hàng đợi -> tạo phòng mới, xếp màu ngẫu nhiên, bắt đầu ván.
+    1 bên vừa huỷ seek / ngắt kết nối (server thread: song song với lúc ghép) -> seek còn lại
+    quay lại hàng đợi.
+    """
+    with seeks_lock:
+        alive = [seek for seek in (first, second) if seek.owner.seek is seek]
+        if len(alive) == 2:
+            for seek in alive:
+                clock_wheel.cancel(seek.timer)
+                seek.timer = None
+                seek.owner.seek = None
+            room = create_room(first.time_control)
+            white, black = (first, second) if random.random() < 0.5 else (second, first)
+            for seek in (white, black):
+                session = seek.owner
+                session.room, session.color = room, room.add_player(session.conn, seek.protocol)
+    if len(alive) < 2:
+        for seek in alive:
+            clock_wheel.cancel(seek.timer)
+            _queue_seek(seek, time.monotonic())
+        return
+
+    for seek, opponent in ((white, black), (black, white)):
+        session = seek.owner
+        send_json(session.conn, {
+            "type": "joined",
+            "room_id": room.room_id,
+            "color": session.color,
+            "protocol": seek.protocol,
+            "time_control": room.time_control._asdict(),
+            "opponent_rating": opponent.rating,
+        })
+    print(f"[MATCH] Paired {white.owner.addr} ({white.rating:.0f}) vs {black.owner.addr} ({black.rating:.0f}) "
+          f"in room {room.room_id}")
+    room.ensure_started()
+    notify_both(room, room.state_message())
+
+
+def list_rooms_info() -> list:
+    """
+    Danh sách các phòng hiện tại, với số người chơi trong phòng.
     Không leak socket info, chỉ room_id + player_count + started.
     """
     room_list = []
@@ -498,22 +1236,105 @@ def handle_list_rooms(conn: socket.socket) -> None:
                     "room_id": room_id,
                     "players": room.player_count(),
                     "started": room.started,
+                    "spectators": room.spectator_count(),
+                    "time_control": room.time_control._asdict(),
                 }
             )
+    return room_list
+
+
+def handle_list_rooms(conn: socket.socket) -> None:
+    send_json(conn, {"type": "rooms", "rooms": list_rooms_info()})
 
-    send_json(conn, {"type": "rooms", "rooms": room_list})
+
+def handle_resync(conn: socket.socket, room: GameRoom) -> None:
+    """Client v2 phát hiện lệch seq -> gửi lại full snapshot."""
+    if not room.started or room.board is None:
+        send_json(conn, {"type": "error", "message": "game_not_started"})
+        return
+    send_json(conn, room.state_message(room.moves[-1] if room.moves else None))
+
+
+def negotiate_protocol(msg: dict) -> int:
+    try:
+        requested = int(msg.get("protocol", 1))
+    except (TypeError, ValueError):
+        requested = 1
+    return max(1, min(requested, PROTOCOL_VERSION))
+
+
+def make_delta(state: dict) -> dict:
+    """
+    Delta v2 từ state sau thay đổi: chỉ seq + nước đi + đồng hồ (+ result khi kết thúc).
+    Client tự apply nước đi lên board của mình, không cần FEN.
+    """
+    delta = {
+        "type": "delta",
+        "seq": state["seq"],
+        "tw": round(state["time_white"], 3),
+        "tb": round(state["time_black"], 3),
+    }
+    if state.get("last_move"):
+        delta["uci"] = state["last_move"]
+    if state["result"] != "ongoing":
+        delta["result"] = state["result"]
+    return delta
 
 
 def notify_both(room: GameRoom, msg: dict):
-    with room.lock:
-        conns = [c for c in (room.white_conn, room.black_conn) if c is not None]
-    for c in conns:
-        send_json(c, msg)
+    """Gửi msg cho người chơi + khán giả; encode 1 lần cho mỗi framing."""
+    frames: Dict[str, bytes] = {}
+    for c, _ in room.recipients():
+        framing = getattr(c, "framing", FRAMING_JSON)
+        data = frames.get(framing)
+        if data is None:
+            data = frames[framing] = encode(msg, framing)
+        send_bytes(c, data)
+
+
+def notify_update(room: GameRoom, state: dict) -> None:
+    """
+    Broadcast 1 thay đổi state: client v1 nhận full state, client v2 nhận delta.
+    Mỗi tổ hợp (message, framing) chỉ encode 1 lần rồi gửi cùng bytes cho mọi
+    kết nối -> chi phí CPU mỗi nước đi không nhân theo số khán giả.
+    """
+    delta = None
+    frames: Dict[tuple, bytes] = {}
+    for c, protocol in room.recipients():
+        key = (protocol >= 2, getattr(c, "framing", FRAMING_JSON))
+        data = frames.get(key)
+        if data is None:
+            if key[0]:
+                if delta is None:
+                    delta = make_delta(state)
+                data = encode(delta, key[1])
+            else:
+                data = encode(state, key[1])
+            frames[key] = data
+        send_bytes(c, data)
 
 
 # ----- Server loop -----
 
-def start_server(host: str = HOST, port: int = PORT):
+def _stats_loop(interval: float) -> None:
+    while True:
+        time.sleep(interval)
+        print(f"[STATS] {server_stats()}")
+
+
+def start_server(
+    host: str = HOST,
+    port: int = PORT,
+    stats_interval: float = 0.0,
+    bot_workers: Optional[int] = None,
+    journal_dir: Optional[str] = None,
+):
+    start_clock_service()
+    start_bot_service(bot_workers)
+    start_journal(journal_dir)
+    if stats_interval > 0:
+        threading.Thread(target=_stats_loop, args=(stats_interval,), daemon=True).start()
+
     server_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     server_sock.bind((host, port))
@@ -529,7 +1350,52 @@ def start_server(host: str = HOST, port: int = PORT):
         print("\n[INFO] Server shutting down...")
     finally:
         server_sock.close()
+        stop_journal()
+        stop_bot_service()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chess online server")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument(
+        "--mode",
+        choices=["thread", "async", "cluster"],
+        default="thread",
+        help="thread: 1 thread / kết nối (cũ); async: asyncio event loop 1 thread; "
+        "cluster: nhiều process asyncio dùng chung cổng (SO_REUSEPORT)",
+    )
+    parser.add_argument("--workers", type=int, default=None, help="Số worker process (cluster, mặc định = số core)")
+    parser.add_argument("--stats-interval", type=float, default=0.0, help="Log [STATS] hàng đợi gửi mỗi N giây (0 = tắt)")
+    parser.add_argument(
+        "--bot-workers",
+        type=int,
+        default=None,
+        help="Số process tính nước cho bot server (mặc định: số core - 1, chia đều cho worker cluster; 0 = tắt bot)",
+    )
+    parser.add_argument(
+        "--journal-dir",
+        default=None,
+        help="Thư mục write-ahead journal: ván đang chơi được khôi phục khi server khởi động lại "
+        "(cluster: mỗi worker 1 thư mục con; mặc định tắt)",
+    )
+    args = parser.parse_args()
+
+    # SIGTERM (systemd, docker stop, kill) tắt giống Ctrl+C: chạy hết phần dọn dẹp,
+    # dừng cả worker cluster / pool bot thay vì bỏ lại process mồ côi
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    if args.mode == "cluster":
+        from server.cluster import run_cluster
+
+        run_cluster(args.host, args.port, args.workers, args.stats_interval, args.bot_workers, args.journal_dir)
+    elif args.mode == "async":
+        from server.async_server import run
+
+        run(args.host, args.port, args.stats_interval, args.bot_workers, args.journal_dir)
+    else:
+        start_server(args.host, args.port, args.stats_interval, args.bot_workers, args.journal_dir)
 
 
 if __name__ == "__main__":
-    start_server()
+    main()
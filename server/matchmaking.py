@@ -0,0 +1,187 @@
+# server/matchmaking.py
+"""
+Hàng đợi ghép cặp (message "seek") theo time control + rating.
+
+- Mỗi time control 1 MatchQueue; trong đó seek được chia bucket theo rating
+  (BUCKET_WIDTH điểm / bucket, FIFO trong bucket) + danh sách bucket không rỗng đã sort.
+- Seek mới: bisect tìm bucket gần nhất rồi đi dần ra 2 phía trong cửa sổ rating
+  -> O(log số bucket + số ứng viên xét), không quét toàn bộ người đang chờ.
+- Cửa sổ rating mở rộng theo thời gian chờ (WIDEN_STEP / WIDEN_STEP_SEC, tối đa MAX_WINDOW);
+  cửa sổ ban đầu rộng hơn với người có rating deviation (Glicko RD) lớn.
+  Ghép cặp phải được CẢ 2 bên chấp nhận (cửa sổ hiện tại + rating_range nếu có).
+- Module thuần dữ liệu: tạo phòng / gửi message / timer mở rộng cửa sổ nằm ở server/main.py.
+"""
+import bisect
+import itertools
+import threading
+from typing import Any, Dict, List, Optional
+
+DEFAULT_RATING = 1500.0
+MIN_RATING, MAX_RATING = 0.0, 4000.0
+BUCKET_WIDTH = 50
+
+BASE_WINDOW = 100.0      # cửa sổ rating ban đầu (+-)
+WIDEN_STEP = 50.0        # mỗi WIDEN_STEP_SEC chờ thêm -> cửa sổ rộng thêm
+WIDEN_STEP_SEC = 2.0
+MAX_WINDOW = 600.0
+
+# Số ứng viên tối đa xét cho 1 lần tìm (chặn chi phí khi nhiều người có cửa sổ hẹp)
+MAX_CANDIDATES = 64
+
+_ids = itertools.count(1)
+
+
+class Seek:
+    __slots__ = ("id", "owner", "rating", "rd", "lo", "hi", "time_control", "created", "protocol", "bucket", "timer")
+
+    def __init__(
+        self,
+        owner: Any,
+        rating: float,
+        time_control: Any,
+        created: float,
+        rd: float = 0.0,
+        lo: Optional[float] = None,
+        hi: Optional[float] = None,
+        protocol: int = 1,
+    ):
+        self.id = next(_ids)
+        self.owner = owner                # ClientSession
+        self.rating = rating
+        self.rd = rd
+        self.lo = MIN_RATING if lo is None else lo
+        self.hi = MAX_RATING if hi is None else hi
+        self.time_control = time_control  # hashable (TimeControl)
+        self.created = created
+        self.protocol = protocol          # protocol version cho phòng sẽ tạo
+        self.bucket: Optional[int] = None  # != None khi đang nằm trong hàng đợi
+        self.timer = None                  # timer mở rộng cửa sổ (server/main.py)
+
+    def window(self, now: float) -> float:
+        steps = int(max(0.0, now - self.created) // WIDEN_STEP_SEC)
+        return min(MAX_WINDOW, max(BASE_WINDOW, 2 * self.rd) + steps * WIDEN_STEP)
+
+    def accepts(self, other: "Seek", now: float) -> bool:
+        return self.lo <= other.rating <= self.hi and abs(self.rating - other.rating) <= self.window(now)
+
+
+class MatchQueue:
+    """Các seek cùng 1 time control, chia bucket theo rating."""
+
+    def __init__(self):
+        self.buckets: Dict[int, Dict[int, Seek]] = {}
+        self.keys: List[int] = []  # bucket không rỗng, đã sort
+        self.size = 0
+
+    def push(self, seek: Seek) -> None:
+        b = int(seek.rating // BUCKET_WIDTH)
+        bucket = self.buckets.get(b)
+        if bucket is None:
+            bucket = self.buckets[b] = {}
+            bisect.insort(self.keys, b)
+        bucket[seek.id] = seek
+        seek.bucket = b
+        self.size += 1
+
+    def discard(self, seek: Seek) -> bool:
+        bucket = self.buckets.get(seek.bucket) if seek.bucket is not None else None
+        if bucket is None or bucket.pop(seek.id, None) is None:
+            return False
+        if not bucket:
+            del self.buckets[seek.bucket]
+            del self.keys[bisect.bisect_left(self.keys, seek.bucket)]
+        seek.bucket = None
+        self.size -= 1
+        return True
+
+    def find(self, seek: Seek, now: float) -> Optional[Seek]:
+        """Đối thủ chấp nhận được (bucket gần rating nhất trước, trong bucket theo thứ tự chờ), chưa xoá khỏi hàng đợi."""
+        window = seek.window(now)
+        lo = max(seek.lo, seek.rating - window)
+        hi = min(seek.hi, seek.rating + window)
+        lo_b, hi_b = int(lo // BUCKET_WIDTH), int(hi // BUCKET_WIDTH)
+        home = int(seek.rating // BUCKET_WIDTH)
+        keys = self.keys
+        right = bisect.bisect_left(keys, home)
+        left = right - 1
+        checked = 0
+        while checked < MAX_CANDIDATES:
+            # Bucket kế tiếp gần rating nhất ở 1 trong 2 phía
+            r_ok = right < len(keys) and keys[right] <= hi_b
+            l_ok = left >= 0 and keys[left] >= lo_b
+            if not (r_ok or l_ok):
+                return None
+            if r_ok and (not l_ok or keys[right] - home <= home - keys[left]):
+                b = keys[right]
+                right += 1
+            else:
+                b = keys[left]
+                left -= 1
+            bucket = self.buckets[b]
+            found, rejected = None, []
+            for other in bucket.values():
+                if other is not seek and other.owner is not seek.owner and lo <= other.rating <= hi:
+                    if other.accepts(seek, now):
+                        found = other
+                        break
+                    rejected.append(other)
+                checked += 1
+                if checked >= MAX_CANDIDATES:
+                    break
+            # Ứng viên từ chối -> xuống cuối bucket: lần tìm sau xét người khác, không kẹt mãi ở đầu
+            for other in rejected:
+                bucket[other.id] = bucket.pop(other.id)
+            if found is not None:
+                return found
+        return None
+
+
+class Matchmaker:
+    """Mọi MatchQueue của server; thread-safe (server thread gọi từ nhiều thread)."""
+
+    def __init__(self):
+        self.queues: Dict[Any, MatchQueue] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return sum(q.size for q in self.queues.values())
+
+    def add(self, seek: Seek, now: float) -> Optional[Seek]:
+        """Tìm đối thủ cho seek mới: có -> xoá đối thủ khỏi hàng đợi và trả về; không -> xếp hàng seek."""
+        with self._lock:
+            queue = self.queues.get(seek.time_control)
+            if queue is None:
+                queue = self.queues[seek.time_control] = MatchQueue()
+            other = queue.find(seek, now)
+            if other is None:
+                queue.push(seek)
+                return None
+            queue.discard(other)
+            self._drop_if_empty(seek.time_control)
+            return other
+
+    def retry(self, seek: Seek, now: float) -> Optional[Seek]:
+        """Seek đang chờ vừa mở rộng cửa sổ: thử ghép lại, ghép được thì xoá cả 2 khỏi hàng đợi."""
+        with self._lock:
+            queue = self.queues.get(seek.time_control)
+            if queue is None or seek.bucket is None:
+                return None
+            other = queue.find(seek, now)
+            if other is not None:
+                queue.discard(other)
+                queue.discard(seek)
+                self._drop_if_empty(seek.time_control)
+            return other
+
+    def remove(self, seek: Seek) -> bool:
+        with self._lock:
+            queue = self.queues.get(seek.time_control)
+            if queue is None or not queue.discard(seek):
+                return False
+            self._drop_if_empty(seek.time_control)
+            return True
+
+    def _drop_if_empty(self, time_control: Any) -> None:
+        queue = self.queues.get(time_control)
+        if queue is not None and queue.size == 0:
+            del self.queues[time_control]
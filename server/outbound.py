@@ -0,0 +1,164 @@
+# server/outbound.py
+"""
+Hàng đợi gửi (outbound) theo từng kết nối.
+
+- sendall() chỉ đưa frame vào hàng đợi của kết nối rồi trả về ngay: handler của
+  người đi cờ không bao giờ bị block bởi socket chậm của đối thủ.
+- Frame dồn lại trong 1 lượt (server thread: trong lúc writer đang gửi; asyncio:
+  trong 1 tick của event loop) được gộp thành 1 lần ghi (1 syscall).
+- Client đọc chậm: tổng byte chờ gửi vượt HIGH_WATER_BYTES -> ngắt kết nối client đó,
+  không để bộ nhớ server phình ra và không ảnh hưởng client khác.
+- Mỗi kết nối có OutboundMetrics (độ sâu hàng đợi hiện tại / lớn nhất, số frame,
+  số lần ghi); outbound_stats() gộp cho toàn server (log định kỳ bằng --stats-interval).
+"""
+import socket
+import threading
+import weakref
+from typing import Any, Dict, List
+
+from core.wire import FRAMING_JSON
+
+# Mức tối đa byte chờ gửi cho 1 client (gồm cả buffer của transport)
+HIGH_WATER_BYTES = 1 << 20
+
+# Mọi kết nối còn sống (để gộp metrics), không giữ kết nối lại khi đã đóng
+_registry: "weakref.WeakSet[Any]" = weakref.WeakSet()
+_slow_disconnects = 0
+_stats_lock = threading.Lock()
+
+
+class OutboundMetrics:
+    __slots__ = ("queued_bytes", "queued_frames", "max_queued_bytes", "frames", "writes", "bytes_sent")
+
+    def __init__(self):
+        self.queued_bytes = 0      # đang chờ gửi
+        self.queued_frames = 0
+        self.max_queued_bytes = 0
+        self.frames = 0            # đã gửi
+        self.writes = 0            # số lần ghi socket (frames / writes = hệ số gộp)
+        self.bytes_sent = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def register(conn: Any) -> None:
+    _registry.add(conn)
+
+
+def record_slow_disconnect(depth: int) -> None:
+    global _slow_disconnects
+    with _stats_lock:
+        _slow_disconnects += 1
+    print(f"[WARN] Slow client: {depth} bytes queued (> {HIGH_WATER_BYTES}), disconnecting")
+
+
+def outbound_stats() -> Dict[str, Any]:
+    """Tổng hợp metrics của mọi kết nối đang mở."""
+    depths: List[int] = []
+    frames = writes = sent = 0
+    for conn in list(_registry):
+        m = conn.metrics
+        depths.append(conn.queue_depth())
+        frames += m.frames
+        writes += m.writes
+        sent += m.bytes_sent
+    depths.sort()
+    return {
+        "connections": len(depths),
+        "queued_bytes": sum(depths),
+        "max_queue_depth": depths[-1] if depths else 0,
+        "p99_queue_depth": depths[min(len(depths) - 1, int(len(depths) * 0.99))] if depths else 0,
+        "frames": frames,
+        "writes": writes,
+        "frames_per_write": round(frames / writes, 2) if writes else 0.0,
+        "bytes_sent": sent,
+        "slow_disconnects": _slow_disconnects,
+    }
+
+
+def format_stats(stats: Dict[str, Any]) -> str:
+    return " ".join(f"{k}={v}" for k, v in stats.items())
+
+
+class SocketConnection:
+    """
+    Kết nối của server thread: socket + framing + hàng đợi gửi có giới hạn,
+    xả bởi 1 writer thread riêng (gộp mọi frame đang chờ thành 1 sendall).
+    """
+
+    __slots__ = ("sock", "framing", "metrics", "_cond", "_queue", "_closed", "__weakref__")
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.framing = FRAMING_JSON
+        self.metrics = OutboundMetrics()
+        self._cond = threading.Condition()
+        self._queue: List[bytes] = []
+        self._closed = False
+        threading.Thread(target=self._writer_loop, daemon=True).start()
+        register(self)
+
+    def queue_depth(self) -> int:
+        return self.metrics.queued_bytes
+
+    def is_closing(self) -> bool:
+        return self._closed
+
+    def sendall(self, data: bytes) -> None:
+        with self._cond:
+            if self._closed:
+                raise OSError("connection closed")
+            depth = self.metrics.queued_bytes + len(data)
+            slow = depth > HIGH_WATER_BYTES
+            if not slow:
+                self._queue.append(data)
+                m = self.metrics
+                m.queued_bytes = depth
+                m.queued_frames += 1
+                if depth > m.max_queued_bytes:
+                    m.max_queued_bytes = depth
+                self._cond.notify()
+        if slow:
+            record_slow_disconnect(depth)
+            self._abort()
+            raise OSError("slow consumer disconnected")
+
+    def _writer_loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                chunks, self._queue = self._queue, []
+            data = chunks[0] if len(chunks) == 1 else b"".join(chunks)
+            try:
+                self.sock.sendall(data)
+            except OSError:
+                self._abort()
+                return
+            with self._cond:
+                m = self.metrics
+                m.queued_bytes -= len(data)
+                m.queued_frames -= len(chunks)
+                m.frames += len(chunks)
+                m.writes += 1
+                m.bytes_sent += len(data)
+
+    def _abort(self) -> None:
+        """Ngắt kết nối: recv() của handler thread trả về ngay -> dọn phòng như bình thường."""
+        with self._cond:
+            self._closed = True
+            self._queue = []
+            self._cond.notify()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self.sock.close()
@@ -0,0 +1,171 @@
+# server/timer_wheel.py
+"""
+Hierarchical timer wheel (kiểu kernel Linux) chạy trên time.monotonic().
+
+- `levels` tầng, mỗi tầng `slots` ô; ô tầng 0 dài 1 tick, ô tầng L dài slots^L tick.
+  Mặc định tick 10 ms, 256 ô, 4 tầng -> tầm ~497 ngày.
+- schedule / cancel O(1) (mỗi ô là 1 set), advance O(số tick trôi qua + số timer tới hạn);
+  timer tầng cao được "cascade" xuống tầng thấp khi tới chu kỳ của nó. Timer xa hơn
+  tầm của wheel nằm trong tập overflow, được xét lại mỗi khi tầng cao nhất quay hết vòng.
+- 1 wheel cho cả server: hàng trăm nghìn phòng chỉ là hàng trăm nghìn Timer object,
+  không có thread / task riêng cho từng phòng.
+- Thread-safe (1 lock nội bộ); callback chạy ngoài lock, ở thread gọi advance()
+  (thread driver riêng ở server thread, event loop ở server asyncio).
+"""
+import threading
+import time
+from typing import Any, Callable, List, Optional, Set
+
+
+class Timer:
+    __slots__ = ("deadline", "callback", "args", "tick", "_slot")
+
+    def __init__(self, deadline: float, callback: Callable, args: tuple):
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.tick = 0
+        self._slot: Optional[Set["Timer"]] = None
+
+    @property
+    def active(self) -> bool:
+        return self._slot is not None
+
+
+class TimerWheel:
+    def __init__(self, tick: float = 0.01, slots: int = 256, levels: int = 4, clock: Callable[[], float] = time.monotonic):
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self.clock = clock
+        self._wheels: List[List[Set[Timer]]] = [[set() for _ in range(slots)] for _ in range(levels)]
+        self._spans = [slots ** level for level in range(levels + 1)]
+        self._overflow: Set[Timer] = set()
+        self._current = int(clock() / tick)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    # ----- schedule / cancel -----
+
+    def schedule_at(self, deadline: float, callback: Callable, *args: Any) -> Timer:
+        """Gọi callback(*args) khi monotonic clock >= deadline (trễ tối đa ~1 tick)."""
+        timer = Timer(deadline, callback, args)
+        with self._lock:
+            self._place(timer)
+            self._count += 1
+        return timer
+
+    def schedule(self, delay: float, callback: Callable, *args: Any) -> Timer:
+        return self.schedule_at(self.clock() + delay, callback, *args)
+
+    def cancel(self, timer: Optional[Timer]) -> None:
+        if timer is None:
+            return
+        with self._lock:
+            if timer._slot is not None:
+                timer._slot.discard(timer)
+                timer._slot = None
+                self._count -= 1
+
+    def _place(self, timer: Timer) -> None:
+        current = self._current
+        t = max(int(-(-timer.deadline // self.tick)), current + 1)  # ceil, luôn ở tương lai
+        timer.tick = t
+        level = 0
+        # Tầng thấp nhất mà t và current chung mọi "chữ số" phía trên tầng đó
+        while level < self.levels - 1 and t // self._spans[level + 1] != current // self._spans[level + 1]:
+            level += 1
+        if t // self._spans[self.levels] != current // self._spans[self.levels]:
+            slot = self._overflow  # quá tầm của wheel
+        else:
+            slot = self._wheels[level][(t // self._spans[level]) % self.slots]
+        slot.add(timer)
+        timer._slot = slot
+
+    # ----- advance -----
+
+    def advance(self, now: Optional[float] = None) -> int:
+        """Chạy mọi timer tới hạn tính tới `now`. Trả về số callback đã gọi."""
+        now = self.clock() if now is None else now
+        target = int(now / self.tick)
+        due: List[Timer] = []
+        with self._lock:
+            if self._count == 0:
+                self._current = max(self._current, target)
+                return 0
+            while self._current < target:
+                self._current += 1
+                self._cascade()
+                slot = self._wheels[0][self._current % self.slots]
+                if slot:
+                    for timer in slot:
+                        timer._slot = None
+                    due.extend(slot)
+                    self._count -= len(slot)
+                    slot.clear()
+        return self._fire(due)
+
+    def _cascade(self) -> None:
+        current = self._current
+        if current % self._spans[self.levels] == 0 and self._overflow:
+            timers = list(self._overflow)
+            self._overflow.clear()
+            for timer in timers:
+                self._place(timer)
+        # Tầng cao trước: timer rơi xuống có thể cần cascade tiếp ở tầng dưới trong cùng tick
+        for level in range(self.levels - 1, 0, -1):
+            if current % self._spans[level] != 0:
+                continue
+            slot = self._wheels[level][(current // self._spans[level]) % self.slots]
+            if not slot:
+                continue
+            timers = list(slot)
+            slot.clear()
+            for timer in timers:
+                self._place_exact(timer)
+
+    def _place_exact(self, timer: Timer) -> None:
+        deadline_tick = timer.tick
+        if deadline_tick <= self._current:
+            # Tới hạn đúng tick này: đặt vào ô tầng 0 hiện tại (sắp được xử lý)
+            slot = self._wheels[0][self._current % self.slots]
+            slot.add(timer)
+            timer._slot = slot
+            return
+        self._place(timer)
+
+    def _fire(self, due: List[Timer]) -> int:
+        fired = 0
+        for timer in due:
+            try:
+                timer.callback(*timer.args)
+            except Exception as e:
+                print(f"[TIMER] Callback {timer.callback!r} failed: {type(e).__name__}: {e}")
+            fired += 1
+        return fired
+
+    # ----- drivers -----
+
+    def run_in_thread(self, name: str = "timer-wheel") -> threading.Thread:
+        """Driver cho server thread: 1 thread gọi advance() mỗi tick."""
+
+        def loop():
+            while True:
+                time.sleep(self.tick)
+                self.advance()
+
+        thread = threading.Thread(target=loop, name=name, daemon=True)
+        thread.start()
+        return thread
+
+    def attach_to_loop(self, loop) -> None:
+        """Driver cho server asyncio: advance() mỗi tick bằng loop.call_later, không cần thread."""
+
+        def tick():
+            self.advance()
+            loop.call_later(self.tick, tick)
+
+        loop.call_later(self.tick, tick)